@@ -0,0 +1,67 @@
+import time
+import uuid
+
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http.models import PointStruct
+
+# Small vector-less collection holding one point per subsidy collection with its current epoch
+COLLECTION_VERSIONS_COLLECTION = "collection_versions"
+
+
+def _version_point_id(collection_name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"subsidies-dot-io/collection-version/{collection_name}"))
+
+
+def write_collection_epoch(client: QdrantClient, collection_name: str) -> int:
+    """
+    Stamp a new epoch for a collection. Called at ingest once the collection has been rebuilt,
+    so results cached against the previous epoch are no longer served.
+
+    Returns:
+        int: The new epoch (nanoseconds since the Unix epoch)
+    """
+    if not client.collection_exists(collection_name=COLLECTION_VERSIONS_COLLECTION):
+        client.create_collection(collection_name=COLLECTION_VERSIONS_COLLECTION, vectors_config={})
+
+    epoch = time.time_ns()
+    client.upsert(
+        collection_name=COLLECTION_VERSIONS_COLLECTION,
+        points=[
+            PointStruct(
+                id=_version_point_id(collection_name),
+                vector={},
+                payload={"collection_name": collection_name, "epoch": epoch},
+            )
+        ],
+    )
+    return epoch
+
+
+async def aread_collection_epoch(aclient: AsyncQdrantClient, collection_name: str) -> int:
+    """
+    Read the current epoch of a collection, or 0 if it was never stamped.
+    """
+    if not await aclient.collection_exists(collection_name=COLLECTION_VERSIONS_COLLECTION):
+        return 0
+
+    records = await aclient.retrieve(
+        collection_name=COLLECTION_VERSIONS_COLLECTION,
+        ids=[_version_point_id(collection_name)],
+        with_payload=True,
+    )
+    return records[0].payload.get("epoch", 0) if records else 0
+
+
+def read_collection_epoch(client: QdrantClient, collection_name: str) -> int:
+    """
+    Blocking version of aread_collection_epoch().
+    """
+    if not client.collection_exists(collection_name=COLLECTION_VERSIONS_COLLECTION):
+        return 0
+
+    records = client.retrieve(
+        collection_name=COLLECTION_VERSIONS_COLLECTION,
+        ids=[_version_point_id(collection_name)],
+        with_payload=True,
+    )
+    return records[0].payload.get("epoch", 0) if records else 0
@@ -0,0 +1,178 @@
+import os
+import atexit
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_PATH = os.getenv(
+    'EMBEDDING_CACHE_PATH',
+    str(Path.home() / ".cache" / "subsidies-dot-io" / "query_embeddings.sqlite"),
+)
+DEFAULT_MAX_MEMORY_ENTRIES = 4096
+# New entries reach the SQLite file in batches: a background thread commits them at this interval,
+# or sooner once this many are pending, so a miss on the engine loop never waits for a commit
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+DEFAULT_FLUSH_BATCH_SIZE = 64
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a query before keying: unicode NFC and collapsed whitespace.
+    Case is kept because the embedding models are case sensitive.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+
+    Entries are keyed by (model name, input_type, normalized text). Hits are served from a
+    bounded in-memory LRU first and from a SQLite file second, which survives restarts.
+    A disk hit is promoted into the LRU. Vectors are stored on disk as float32; put() only
+    queues them, and a writer thread commits the queue in batches (see flush()).
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+        flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        flush_batch_size: int = DEFAULT_FLUSH_BATCH_SIZE,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_batch_size = flush_batch_size
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        # Entries not written to disk yet, as float32 bytes
+        self._pending: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        # The connection is shared by lookups and the writer thread
+        self._db_lock = threading.Lock()
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._flush_requested = threading.Event()
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def make_key(model_name: str, input_type: Optional[str], text: str) -> str:
+        raw = "\x1f".join((model_name, input_type or "", normalize_text(text)))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            # Evicted from the LRU before the writer got to it
+            blob = self._pending.get(key)
+
+        if blob is None:
+            with self._db_lock:
+                row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            blob = row[0] if row is not None else None
+
+        with self._lock:
+            if blob is None:
+                self.misses += 1
+                return None
+            vector = array("f", blob).tolist()
+            self._remember(key, vector)
+            self.disk_hits += 1
+            return vector
+
+    def put(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._remember(key, vector)
+            self._pending[key] = array("f", vector).tobytes()
+            if len(self._pending) >= self.flush_batch_size:
+                self._flush_requested.set()
+
+    def flush(self) -> None:
+        """
+        Write the pending entries to the SQLite file in one transaction.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+        with self._db_lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", pending.items())
+            self._conn.commit()
+
+    def close(self) -> None:
+        """
+        Stop the writer thread after a last flush.
+        """
+        self._closed.set()
+        self._flush_requested.set()
+        self._writer.join()
+        self.flush()
+
+    def _write_loop(self) -> None:
+        while not self._closed.is_set():
+            self._flush_requested.wait(self.flush_interval_seconds)
+            self._flush_requested.clear()
+            self.flush()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss counters since the cache was created.
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "pending_writes": len(self._pending),
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Return the process-wide query embedding cache.
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+                # Entries still queued at exit would otherwise be lost
+                atexit.register(_embedding_cache.close)
+    return _embedding_cache
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+# All async provider clients (Qdrant, Cohere, OpenAI) are created and used on this one loop.
+# Their connection pools are bound to the loop they were first used on, so sync callers and
+# callers running their own event loop both hand their coroutines over to it.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_engine_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the background event loop used by the retrieval engines, starting it on first use.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="subsidy-engine-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run a coroutine on the engine loop and block until it is done.
+    """
+    loop = get_engine_loop()
+    if _running_loop() is loop:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the engine loop, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def run_on_engine_loop(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Await a coroutine on the engine loop from any event loop.
+    """
+    loop = get_engine_loop()
+    if _running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
@@ -0,0 +1,336 @@
+"""
+Retrieval quality against a golden set, swept across engine configurations so quality can be
+weighed against latency and cost.
+
+A golden set is a JSONL file with one case per line, e.g.
+    {"query": "...", "filters": {"include_national": false, "regions": ["Utrecht"]}, "expected_titles": ["..."]}
+where filters holds retrieve() keyword arguments (include_national, regions, categories, status);
+left out, they take retrieve()'s defaults, which search national subsidies only.
+Every case is retrieved with each configuration (collection, similarity_top_k, rerank top_n and
+hybrid search), and the expected titles are looked up in the reranked and the dense lists to give
+their rank positions, recall@k and reciprocal rank. The configurations on the Pareto front of
+reranked recall, p50 latency and rerank cost are marked in the table.
+
+    python -m agent.retrievers.evaluation golden.jsonl --top-k 50 100 --top-n 5 10 --hybrid off rrf
+    python -m agent.retrievers.evaluation golden.jsonl \
+        --collection vindsub_subsidies_2024_v1_cohere:cohere vindsub_subsidies_2024_v1_openai:openai
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from dataclasses import asdict, dataclass, field
+from typing import AbstractSet, Any, Callable, Dict, FrozenSet, List, Optional, Sequence
+
+from llama_index.core.schema import NodeWithScore
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.hybrid import HybridSearch
+from agent.retrievers.metrics import PROVIDER_UNITS, get_metrics_registry
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.subsidy_retriever import (
+    DEFAULT_COLLECTION_NAME,
+    DEFAULT_EMBED_MODEL,
+    SubsidyRetriever,
+    build_embed_model,
+)
+
+# Cohere rerank list price in USD per search unit (one query with up to 100 documents)
+RERANK_PRICE_PER_SEARCH_UNIT = float(os.getenv('RERANK_PRICE_PER_SEARCH_UNIT', 0.002))
+DEFAULT_EVAL_CONCURRENCY = 8
+DEFAULT_RECALL_KS = (1, 5, 10)
+
+FILTER_KEYS = {"include_national", "regions", "categories", "status"}
+
+
+@dataclass(frozen=True)
+class GoldenCase:
+    query: str
+    expected_titles: FrozenSet[str]
+    filters: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class EvalConfiguration:
+    collection_name: str = DEFAULT_COLLECTION_NAME
+    similarity_top_k: int = 100
+    rerank_top_n: int = 10
+    hybrid: Optional[HybridSearch] = None
+    # The model the collection was embedded with
+    embed_model: str = DEFAULT_EMBED_MODEL
+
+    @property
+    def label(self) -> str:
+        hybrid = self.hybrid.fusion if self.hybrid else "off"
+        return (f"{self.collection_name} ({self.embed_model}) top_k={self.similarity_top_k} "
+                f"top_n={self.rerank_top_n} hybrid={hybrid}")
+
+
+@dataclass
+class EvalReport:
+    """
+    Mean quality of one configuration over the golden set, its latency and rerank cost, and the
+    rank positions of the expected titles per case.
+    """
+    configuration: EvalConfiguration
+    recall: Dict[int, float]
+    mrr: float
+    dense_recall: Dict[int, float]
+    dense_mrr: float
+    p50_ms: float
+    p95_ms: float
+    search_units: float
+    cost_per_1k: float
+    degraded: int
+    cases: List[Dict[str, Any]]
+    pareto: bool = False
+
+
+def load_golden_set(path: str) -> List[GoldenCase]:
+    """
+    Read a golden set from a JSONL file, skipping blank lines.
+    """
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            filters = record.get("filters") or {}
+            unknown = set(filters) - FILTER_KEYS
+            if not record.get("query") or not record.get("expected_titles") or unknown:
+                raise ValueError(f"{path}:{line_number}: a case needs a query, expected_titles and "
+                                 f"filters from {sorted(FILTER_KEYS)}")
+            cases.append(GoldenCase(record["query"], frozenset(record["expected_titles"]), filters))
+    return cases
+
+
+def title_ranks(expected_titles: AbstractSet[str], nodes: List[NodeWithScore]) -> Dict[str, int]:
+    """
+    1-based position of the first node of every expected title found in nodes.
+    """
+    ranks: Dict[str, int] = {}
+    for rank, node in enumerate(nodes, start=1):
+        title = node.node.metadata.get('title')
+        if title in expected_titles and title not in ranks:
+            ranks[title] = rank
+    return ranks
+
+
+def recall_at(ranks: Dict[str, int], expected_count: int, k: int) -> float:
+    return sum(1 for rank in ranks.values() if rank <= k) / expected_count
+
+
+def reciprocal_rank(ranks: Dict[str, int]) -> float:
+    return 1 / min(ranks.values()) if ranks else 0.0
+
+
+def pareto_front(points: Sequence[Sequence[float]]) -> List[bool]:
+    """
+    For points of (quality, latency, cost), whether each is Pareto-optimal: no other point is at
+    least as good on all three (higher quality, lower latency and cost) and better on one.
+    """
+    def dominates(a, b):
+        no_worse = a[0] >= b[0] and a[1] <= b[1] and a[2] <= b[2]
+        return no_worse and (a[0] > b[0] or a[1] < b[1] or a[2] < b[2])
+
+    return [not any(dominates(other, point) for other in points) for point in points]
+
+
+def _search_units() -> float:
+    return sum(
+        entry["value"]
+        for entry in get_metrics_registry().snapshot().get(PROVIDER_UNITS, [])
+        if entry["labels"].get("unit") == "search_units"
+    )
+
+
+async def _abounded(coroutines, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+
+def evaluate_engine(
+    engine: SubsidyRetriever,
+    cases: List[GoldenCase],
+    ks: Sequence[int] = DEFAULT_RECALL_KS,
+    concurrency: int = DEFAULT_EVAL_CONCURRENCY,
+    latency_budget_ms: Optional[float] = None,
+    configuration: Optional[EvalConfiguration] = None,
+) -> EvalReport:
+    """
+    Retrieve every case with the engine, at most concurrency at a time, and score the results.
+    The report is labelled with configuration, or one read from the engine when it is not given.
+
+    The query encodings are computed before timing, so every configuration is measured on its
+    search and rerank with warm embeddings. The result and semantic caches are cleared first.
+    Rerank cost comes from the billed search units the reranker records in the metrics registry.
+    """
+    async def timed(case: GoldenCase):
+        start = time.perf_counter()
+        result = await engine.aretrieve(case.query, latency_budget_ms=latency_budget_ms, **case.filters)
+        return result, (time.perf_counter() - start) * 1000
+
+    run_sync(_abounded([engine._aencode_query(case.query) for case in cases], concurrency))
+    get_result_cache().clear()
+    if engine.semantic_cache is not None:
+        engine.semantic_cache.clear()
+
+    units_before = _search_units()
+    outcomes = run_sync(_abounded([timed(case) for case in cases], concurrency))
+    search_units = _search_units() - units_before
+
+    recall = {k: 0.0 for k in ks}
+    dense_recall = {k: 0.0 for k in ks}
+    mrr = dense_mrr = 0.0
+    scored_cases = []
+    for case, (result, _) in zip(cases, outcomes):
+        ranks = title_ranks(case.expected_titles, result.nodes_reranked)
+        dense_ranks = title_ranks(case.expected_titles, result.nodes_embed)
+        for k in ks:
+            recall[k] += recall_at(ranks, len(case.expected_titles), k)
+            dense_recall[k] += recall_at(dense_ranks, len(case.expected_titles), k)
+        mrr += reciprocal_rank(ranks)
+        dense_mrr += reciprocal_rank(dense_ranks)
+        scored_cases.append({"query": case.query, "ranks": ranks, "dense_ranks": dense_ranks,
+                             "missing": sorted(case.expected_titles - dense_ranks.keys() - ranks.keys())})
+
+    latencies = [elapsed_ms for _, elapsed_ms in outcomes]
+    n = len(cases)
+    return EvalReport(
+        configuration=configuration or EvalConfiguration(
+            engine.collection_name, engine.similarity_top_k, engine.reranker.top_n, engine.hybrid, engine.embed_model_name
+        ),
+        recall={k: total / n for k, total in recall.items()},
+        mrr=mrr / n,
+        dense_recall={k: total / n for k, total in dense_recall.items()},
+        dense_mrr=dense_mrr / n,
+        p50_ms=statistics.median(latencies),
+        p95_ms=statistics.quantiles(latencies, n=20, method="inclusive")[-1] if len(latencies) > 1 else latencies[0],
+        search_units=search_units,
+        cost_per_1k=search_units / n * 1000 * RERANK_PRICE_PER_SEARCH_UNIT,
+        degraded=sum(1 for result, _ in outcomes if result.metadata.get("degraded")),
+        cases=scored_cases,
+    )
+
+
+def sweep(
+    cases: List[GoldenCase],
+    configurations: List[EvalConfiguration],
+    build_engine: Callable[[EvalConfiguration], SubsidyRetriever],
+    ks: Sequence[int] = DEFAULT_RECALL_KS,
+    concurrency: int = DEFAULT_EVAL_CONCURRENCY,
+    latency_budget_ms: Optional[float] = None,
+) -> List[EvalReport]:
+    """
+    Evaluate every configuration in turn and mark the Pareto front of recall@max(ks), p50
+    latency and cost.
+
+    Args:
+        cases (List[GoldenCase]): The golden set
+        configurations (List[EvalConfiguration]): Configurations to compare
+        build_engine (Callable[[EvalConfiguration], SubsidyRetriever]): Builds the engine for a configuration
+        ks (Sequence[int]): Cutoffs for recall@k
+        concurrency (int): Retrievals in flight per configuration
+        latency_budget_ms (Optional[float]): Passed to retrieve(); None lets every stage finish
+
+    Returns:
+        List[EvalReport]: One report per configuration, in the given order
+    """
+    reports = [
+        evaluate_engine(build_engine(configuration), cases, ks, concurrency, latency_budget_ms, configuration)
+        for configuration in configurations
+    ]
+    k = max(ks)
+    front = pareto_front([(report.recall[k], report.p50_ms, report.cost_per_1k) for report in reports])
+    for report, optimal in zip(reports, front):
+        report.pareto = optimal
+    return reports
+
+
+def format_reports(reports: List[EvalReport], ks: Sequence[int] = DEFAULT_RECALL_KS) -> str:
+    """
+    Table of the reports by descending reranked recall@max(ks), Pareto-optimal rows marked with *.
+    """
+    k = max(ks)
+    recall_columns = " ".join(f"{f'R@{k_}':>6}" for k_ in ks)
+    lines = [f"  {'configuration':<60} {recall_columns} {'MRR':>6} {'dense R@' + str(k):>10} "
+             f"{'p50 ms':>8} {'p95 ms':>8} {'$/1k q':>7}"]
+    for report in sorted(reports, key=lambda r: (-r.recall[k], r.cost_per_1k, r.p50_ms)):
+        recalls = " ".join(f"{report.recall[k_]:6.3f}" for k_ in ks)
+        lines.append(f"{'*' if report.pareto else ' '} {report.configuration.label:<60} {recalls} {report.mrr:6.3f} "
+                     f"{report.dense_recall[k]:10.3f} {report.p50_ms:8.1f} {report.p95_ms:8.1f} {report.cost_per_1k:7.3f}")
+    return "\n".join(lines)
+
+
+def cheapest_meeting(reports: List[EvalReport], min_recall: float, k: int) -> Optional[EvalReport]:
+    """
+    The lowest-cost configuration (then the fastest) whose recall@k reaches min_recall.
+    """
+    meeting = [report for report in reports if report.recall[k] >= min_recall]
+    return min(meeting, key=lambda r: (r.cost_per_1k, r.p50_ms)) if meeting else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("golden", help="JSONL golden set")
+    parser.add_argument("--collection", nargs="+", default=[DEFAULT_COLLECTION_NAME],
+                        help="Collections as NAME or NAME:EMBED_MODEL, e.g. vindsub_subsidies_2024_v1_openai:openai")
+    parser.add_argument("--embed-model", default=DEFAULT_EMBED_MODEL, help="Embed model of collections given without one")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[100])
+    parser.add_argument("--top-n", type=int, nargs="+", default=[10])
+    parser.add_argument("--hybrid", nargs="+", choices=["off", "rrf", "relative_score"], default=["off"])
+    parser.add_argument("--k", type=int, nargs="+", default=list(DEFAULT_RECALL_KS), help="Cutoffs for recall@k")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_EVAL_CONCURRENCY)
+    parser.add_argument("--latency-budget-ms", type=float, default=None)
+    parser.add_argument("--min-recall", type=float, default=None, help="Report the cheapest configuration reaching this recall@max(k)")
+    parser.add_argument("--output", help="Write the reports, per-case ranks included, to this JSON file")
+    args = parser.parse_args()
+
+    cases = load_golden_set(args.golden)
+    # Every collection is queried with the model it was embedded with, as in the dashboard's comparison
+    collections = [
+        tuple(collection.split(":", 1)) if ":" in collection else (collection, args.embed_model)
+        for collection in args.collection
+    ]
+    configurations = [
+        EvalConfiguration(collection_name, top_k, top_n, None if hybrid == "off" else HybridSearch(hybrid), embed_model)
+        for collection_name, embed_model in collections
+        for top_k in args.top_k
+        for top_n in args.top_n
+        for hybrid in args.hybrid
+    ]
+    # One instance per embed model, so engines on the same model share its client and connection pool
+    embed_models = {name: build_embed_model(name) for name in {embed_model for _, embed_model in collections}}
+
+    def build_engine(configuration: EvalConfiguration) -> SubsidyRetriever:
+        return SubsidyRetriever(
+            configuration.collection_name,
+            embed_models[configuration.embed_model],
+            similarity_top_k=configuration.similarity_top_k,
+            rerank_top_n=configuration.rerank_top_n,
+            hybrid=configuration.hybrid,
+        )
+
+    print(f"{len(cases)} cases, {len(configurations)} configurations")
+    reports = sweep(cases, configurations, build_engine, args.k, args.concurrency, args.latency_budget_ms)
+    print(format_reports(reports, args.k))
+
+    if args.min_recall is not None:
+        best = cheapest_meeting(reports, args.min_recall, max(args.k))
+        print(f"\ncheapest with recall@{max(args.k)} >= {args.min_recall}: {best.configuration.label if best else 'none'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump([asdict(report) for report in reports], f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
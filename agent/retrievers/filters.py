@@ -0,0 +1,227 @@
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple, Type, Union, get_args
+
+from pydantic import BaseModel
+from qdrant_client.http.models import Filter, FieldCondition, MatchValue, MatchAny
+
+from agent.tools.tool_query_subsidies import CategorieSelectie
+
+CategorySelection = Union[dict, Iterable[str], None]
+
+
+def _nested_model(annotation) -> Optional[Type[BaseModel]]:
+    for arg in get_args(annotation):
+        if isinstance(arg, type) and issubclass(arg, BaseModel):
+            return arg
+    return None
+
+
+def _leaf_paths(model: Type[BaseModel], prefix: Tuple[str, ...] = ()) -> List[str]:
+    paths = []
+    for name, field in model.model_fields.items():
+        nested = _nested_model(field.annotation)
+        if nested is None:
+            paths.append(".".join(prefix + (name,)))
+        else:
+            paths.extend(_leaf_paths(nested, prefix + (name,)))
+    return paths
+
+
+# Every boolean leaf of the CategorieSelectie taxonomy, in schema order, e.g. "onderzoek.innovatie.procesinnovatie".
+# The payload key of a leaf is f"Categories.{leaf}".
+CATEGORY_LEAF_PATHS: Tuple[str, ...] = tuple(_leaf_paths(CategorieSelectie))
+CATEGORY_LEAF_INDEX: Dict[str, int] = {path: i for i, path in enumerate(CATEGORY_LEAF_PATHS)}
+
+# Top-level payload key of a subsidy's category bitset: bit i is set when leaf CATEGORY_LEAF_PATHS[i]
+# is True. Stored as a fixed-width hex string, as the bitset is wider than a Qdrant integer.
+CATEGORY_BITS_FIELD = "CategoryBits"
+CATEGORY_BITSET_HEX_WIDTH = (len(CATEGORY_LEAF_PATHS) + 3) // 4
+
+_CATEGORY_CONDITIONS: Dict[str, FieldCondition] = {
+    path: FieldCondition(key=f"Categories.{path}", match=MatchValue(value=True))
+    for path in CATEGORY_LEAF_PATHS
+}
+
+
+# Paths of the taxonomy's groups, e.g. "onderzoek" and "onderzoek.innovatie"
+CATEGORY_GROUP_PATHS: FrozenSet[str] = frozenset(
+    ".".join(path.split(".")[:depth]) for path in CATEGORY_LEAF_PATHS for depth in range(1, path.count(".") + 1)
+)
+
+
+def _selected_in_dict(categories: dict, prefix: str, selected: set, unknown: list) -> None:
+    for key, value in categories.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and path in CATEGORY_GROUP_PATHS:
+            _selected_in_dict(value, f"{path}.", selected, unknown)
+        elif not isinstance(value, dict) and path in CATEGORY_LEAF_INDEX:
+            if value is True:
+                selected.add(path)
+        elif value is None and path in CATEGORY_GROUP_PATHS:
+            # An optional group left unset selects nothing
+            continue
+        else:
+            unknown.append(path)
+
+
+def selected_category_leaves(categories: CategorySelection) -> FrozenSet[str]:
+    """
+    Turn a category selection into the set of selected leaf paths.
+
+    Args:
+        categories: A nested dict shaped like CategorieSelectie (only leaves set to True count),
+            or an iterable of leaf paths from CATEGORY_LEAF_PATHS.
+
+    Returns:
+        FrozenSet[str]: The selected leaf paths
+
+    Raises:
+        ValueError: For keys or leaf paths that are not in the taxonomy, which would otherwise
+            leave the search silently unfiltered
+    """
+    if not categories:
+        return frozenset()
+
+    if isinstance(categories, dict):
+        selected = set()
+        unknown = []
+        _selected_in_dict(categories, "", selected, unknown)
+        if unknown:
+            raise ValueError(f"Unknown categories: {sorted(unknown)}")
+        return frozenset(selected)
+
+    leaves = frozenset(categories)
+    unknown = leaves.difference(CATEGORY_LEAF_INDEX)
+    if unknown:
+        raise ValueError(f"Unknown category leaves: {sorted(unknown)}")
+    return leaves
+
+
+@lru_cache(maxsize=1024)
+def category_bitset(leaves: FrozenSet[str]) -> int:
+    """
+    Bitset of a set of leaf paths, as an integer. A subsidy matches a selection when
+    their bitsets share a bit.
+    """
+    bits = 0
+    for path in leaves:
+        bits |= 1 << CATEGORY_LEAF_INDEX[path]
+    return bits
+
+
+def encode_category_bitset(bits: int) -> str:
+    return format(bits, f"0{CATEGORY_BITSET_HEX_WIDTH}x")
+
+
+def decode_category_bitset(value: str) -> int:
+    return int(value, 16)
+
+
+@lru_cache(maxsize=1024)
+def compile_category_filter(leaves: FrozenSet[str]) -> Optional[Filter]:
+    """
+    Compile a set of selected leaf paths into a Qdrant filter that matches any of them.
+    Compiled filters are memoized per selection.
+    """
+    if not leaves:
+        return None
+    return Filter(should=[_CATEGORY_CONDITIONS[path] for path in sorted(leaves, key=CATEGORY_LEAF_INDEX.__getitem__)])
+
+
+@lru_cache(maxsize=1024)
+def _compile_subsidy_filter(
+    locations: Tuple[str, ...],
+    status: Tuple[str, ...],
+    leaves: FrozenSet[str],
+) -> Optional[Filter]:
+    must_conditions = []
+
+    if locations:
+        must_conditions.append(FieldCondition(key="Bereik", match=MatchAny(any=list(locations))))
+
+    if status:
+        must_conditions.append(FieldCondition(key="Status", match=MatchAny(any=list(status))))
+
+    category_filter = compile_category_filter(leaves)
+    if category_filter is not None:
+        must_conditions.append(category_filter)
+
+    return Filter(must=must_conditions) if must_conditions else None
+
+
+class SubsidyFilterSpec(NamedTuple):
+    """
+    Normalized location, status and category selection of a search. Empty means no condition.
+    """
+    locations: Tuple[str, ...]
+    status: Tuple[str, ...]
+    leaves: FrozenSet[str]
+
+
+def subsidy_filter_spec(
+    include_national: bool = True,
+    regions: List[str] = None,
+    categories: CategorySelection = None,
+    status: List[str] = None,
+) -> SubsidyFilterSpec:
+    """
+    Normalize the search arguments. Value lists are sorted so equal selections give equal specs.
+    """
+    query_locations = set(regions or [])
+    if include_national:
+        query_locations.add('National')
+
+    return SubsidyFilterSpec(
+        tuple(sorted(query_locations)),
+        tuple(sorted(set(status or []))),
+        selected_category_leaves(categories),
+    )
+
+
+def compile_subsidy_filter(spec: SubsidyFilterSpec) -> Optional[Filter]:
+    """
+    Memoized Qdrant filter for a spec from subsidy_filter_spec().
+    """
+    return _compile_subsidy_filter(*spec)
+
+
+def category_leaf_value(categories: dict, leaf: str):
+    """
+    Value of a leaf path such as "ict.software" in a nested Categories dict, or None.
+    """
+    value = categories
+    for key in leaf.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _matches_any(value, allowed: Tuple[str, ...]) -> bool:
+    # Like Qdrant's MatchAny, a list value matches when any of its elements does
+    values = value if isinstance(value, list) else [value]
+    return any(v in allowed for v in values)
+
+
+def payload_matches(spec: SubsidyFilterSpec, payload: dict) -> bool:
+    """
+    Evaluate the filter of a spec against a point payload in Python, with the same
+    semantics as the compiled Qdrant filter.
+    """
+    if spec.locations and not _matches_any(payload.get("Bereik"), spec.locations):
+        return False
+
+    if spec.status and not _matches_any(payload.get("Status"), spec.status):
+        return False
+
+    if spec.leaves:
+        encoded_bits = payload.get(CATEGORY_BITS_FIELD)
+        if encoded_bits is not None:
+            if not decode_category_bitset(encoded_bits) & category_bitset(spec.leaves):
+                return False
+        else:
+            categories = payload.get("Categories") or {}
+            if not any(category_leaf_value(categories, leaf) is True for leaf in spec.leaves):
+                return False
+
+    return True
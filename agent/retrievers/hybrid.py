@@ -0,0 +1,222 @@
+import os
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from llama_index.core.schema import NodeWithScore
+from qdrant_client.http.models import SparseVector
+
+from agent.retrievers.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Sparse vector written by QdrantVectorStore(enable_hybrid=True) at ingest, and the fastembed
+# model it uses by default to encode the documents
+SPARSE_VECTOR_NAME = "text-sparse-new"
+DEFAULT_SPARSE_MODEL = "prithivida/Splade_PP_en_v1"
+
+# "rrf" fuses the dense and sparse rankings by reciprocal rank, "relative_score" by min-max
+# normalized scores weighted with alpha (as QdrantVectorStore's hybrid mode does)
+FUSION_METHODS = ("rrf", "relative_score")
+DEFAULT_FUSION = os.getenv('HYBRID_FUSION', 'rrf')
+RRF_K = 60
+
+# Set RETRIEVER_HYBRID=1 to search the dense and the sparse vector and fuse the rankings
+HYBRID_SEARCH_ENABLED = os.getenv('RETRIEVER_HYBRID', '0') == '1'
+
+DEFAULT_SPARSE_CACHE_ENTRIES = 4096
+
+SparseEncoderFn = Callable[[List[str]], Tuple[List[List[int]], List[List[float]]]]
+
+
+@dataclass(frozen=True)
+class HybridSearch:
+    """
+    Configuration of a hybrid search. dense_top_k and sparse_top_k are the number of candidates
+    each branch fetches before fusion (the engine's similarity_top_k when None); alpha weighs the
+    dense scores in relative_score fusion.
+    """
+    fusion: str = DEFAULT_FUSION
+    dense_top_k: Optional[int] = None
+    sparse_top_k: Optional[int] = None
+    alpha: float = 0.5
+    sparse_model: str = DEFAULT_SPARSE_MODEL
+
+    def __post_init__(self):
+        if self.fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method: {self.fusion}")
+
+
+DEFAULT_HYBRID_SEARCH = HybridSearch() if HYBRID_SEARCH_ENABLED else None
+
+
+class SparseQueryEncoder:
+    """
+    Shared sparse query encoder with an LRU cache of query encodings.
+
+    The fastembed model is loaded once, on first use or by load(), instead of per search.
+    Inference runs in a worker thread so it does not block the engine loop.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_SPARSE_MODEL,
+        encode_fn: Optional[SparseEncoderFn] = None,
+        max_entries: int = DEFAULT_SPARSE_CACHE_ENTRIES,
+    ):
+        self.model_name = model_name
+        self.max_entries = max_entries
+
+        self._encode_fn = encode_fn
+        self._load_lock = threading.Lock()
+        self._cache: "OrderedDict[str, SparseVector]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> SparseEncoderFn:
+        if self._encode_fn is None:
+            with self._load_lock:
+                if self._encode_fn is None:
+                    from llama_index.vector_stores.qdrant.utils import fastembed_sparse_encoder
+
+                    logger.info(f"Loading sparse encoder {self.model_name}")
+                    self._encode_fn = fastembed_sparse_encoder(model_name=self.model_name)
+        return self._encode_fn
+
+    def _get(self, key: str) -> Optional[SparseVector]:
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is None:
+                self.misses += 1
+            else:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return vector
+
+    def _put(self, key: str, vector: SparseVector) -> None:
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def encode_batch(self, queries: List[str]) -> List[SparseVector]:
+        keys = [normalize_text(query) for query in queries]
+        vectors: Dict[str, Optional[SparseVector]] = {key: self._get(key) for key in set(keys)}
+
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            indices, values = self.load()(missing)
+            for key, key_indices, key_values in zip(missing, indices, values):
+                vectors[key] = SparseVector(indices=list(key_indices), values=list(key_values))
+                self._put(key, vectors[key])
+
+        return [vectors[key] for key in keys]
+
+    async def aencode_batch(self, queries: List[str]) -> List[SparseVector]:
+        keys = [normalize_text(query) for query in queries]
+        with self._lock:
+            cached = all(key in self._cache for key in keys)
+        if cached:
+            return self.encode_batch(queries)
+        return await asyncio.to_thread(self.encode_batch, queries)
+
+    async def aencode(self, query: str) -> SparseVector:
+        return (await self.aencode_batch([query]))[0]
+
+
+_sparse_encoders: Dict[str, SparseQueryEncoder] = {}
+_sparse_encoders_lock = threading.Lock()
+
+
+def get_sparse_encoder(model_name: str = DEFAULT_SPARSE_MODEL) -> SparseQueryEncoder:
+    """
+    Return the process-wide sparse query encoder for a fastembed model.
+    """
+    with _sparse_encoders_lock:
+        encoder = _sparse_encoders.get(model_name)
+        if encoder is None:
+            encoder = SparseQueryEncoder(model_name)
+            _sparse_encoders[model_name] = encoder
+        return encoder
+
+
+def reciprocal_rank_fusion(
+    dense: List[NodeWithScore],
+    sparse: List[NodeWithScore],
+    top_k: int,
+    k: int = RRF_K,
+) -> List[NodeWithScore]:
+    """
+    Fuse two rankings by summing 1 / (k + rank) per node.
+    """
+    nodes: Dict[str, NodeWithScore] = {}
+    scores: Dict[str, float] = {}
+    for ranking in (dense, sparse):
+        for rank, node in enumerate(ranking, start=1):
+            node_id = node.node.node_id
+            nodes.setdefault(node_id, node)
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return _top_fused(nodes, scores, top_k)
+
+
+def _normalized_scores(ranking: List[NodeWithScore]) -> Dict[str, float]:
+    if not ranking:
+        return {}
+    scores = [node.score or 0.0 for node in ranking]
+    low, high = min(scores), max(scores)
+    if high == low:
+        return {node.node.node_id: 1.0 for node in ranking}
+    return {node.node.node_id: (score - low) / (high - low) for node, score in zip(ranking, scores)}
+
+
+def relative_score_fusion(
+    dense: List[NodeWithScore],
+    sparse: List[NodeWithScore],
+    top_k: int,
+    alpha: float = 0.5,
+) -> List[NodeWithScore]:
+    """
+    Fuse two rankings by min-max normalizing each branch's scores and weighing them
+    alpha * dense + (1 - alpha) * sparse.
+    """
+    if not sparse:
+        return dense[:top_k]
+    if not dense:
+        return sparse[:top_k]
+
+    nodes: Dict[str, NodeWithScore] = {}
+    for node in dense + sparse:
+        nodes.setdefault(node.node.node_id, node)
+    dense_scores = _normalized_scores(dense)
+    sparse_scores = _normalized_scores(sparse)
+    scores = {
+        node_id: alpha * dense_scores.get(node_id, 0.0) + (1 - alpha) * sparse_scores.get(node_id, 0.0)
+        for node_id in nodes
+    }
+    return _top_fused(nodes, scores, top_k)
+
+
+def _top_fused(nodes: Dict[str, NodeWithScore], scores: Dict[str, float], top_k: int) -> List[NodeWithScore]:
+    # sorted() is stable, so ties keep the dense-first insertion order
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [NodeWithScore(node=nodes[node_id].node, score=scores[node_id]) for node_id in ranked]
+
+
+def fuse(
+    hybrid: HybridSearch,
+    dense: List[NodeWithScore],
+    sparse: List[NodeWithScore],
+    top_k: int,
+) -> List[NodeWithScore]:
+    """
+    Fuse the dense and sparse hits of one query with the configured fusion method.
+    """
+    if hybrid.fusion == "rrf":
+        return reciprocal_rank_fusion(dense, sparse, top_k)
+    return relative_score_fusion(dense, sparse, top_k, alpha=hybrid.alpha)
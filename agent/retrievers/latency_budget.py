@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Dict, List, Optional
+
+# Overall budget of one retrieval in milliseconds; set RETRIEVAL_LATENCY_BUDGET_MS=0 to disable it
+DEFAULT_LATENCY_BUDGET_MS = float(os.getenv('RETRIEVAL_LATENCY_BUDGET_MS', 8000)) or None
+
+# Share of the budget each stage may use, in pipeline order. Deadlines are cumulative,
+# so time a stage does not use carries over to the stages after it.
+STAGES = ("embed", "search", "rerank")
+DEFAULT_STAGE_SHARES = {"embed": 0.2, "search": 0.3, "rerank": 0.5}
+# Stages that are cancelled at their deadline. Only rerank has a fallback (the dense ranking);
+# an embed or search past its deadline is still awaited, as a late result beats an empty one.
+CANCELLABLE_STAGES = ("rerank",)
+
+
+class LatencyBudget:
+    """
+    Deadlines for one retrieval, split across the embed, search and rerank stages.
+
+    The budget starts when it is created. Stage k should finish before
+    start + budget * (share_1 + ... + share_k). With budget_ms=None no deadline applies,
+    but stage timings are still recorded.
+    """
+
+    def __init__(self, budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS, shares: Dict[str, float] = None):
+        self.budget_ms = budget_ms
+        self.start = time.perf_counter()
+
+        self.stage_ms: Dict[str, float] = {}
+        self.timeouts: List[str] = []
+
+        self._deadlines: Dict[str, float] = {}
+        if budget_ms is not None:
+            shares = shares or DEFAULT_STAGE_SHARES
+            total_share = sum(shares[stage] for stage in STAGES)
+            cumulative = 0.0
+            for stage in STAGES:
+                cumulative += shares[stage]
+                self._deadlines[stage] = self.start + budget_ms / 1000 * cumulative / total_share
+
+    def remaining(self, stage: str) -> Optional[float]:
+        """
+        Seconds left until the stage's deadline, or None without a budget.
+        """
+        deadline = self._deadlines.get(stage)
+        if deadline is None:
+            return None
+        return deadline - time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    async def run(self, stage: str, coro: Awaitable[Any]) -> Any:
+        """
+        Await a stage within its deadline. A stage that misses it is recorded in timeouts. Stages in
+        CANCELLABLE_STAGES are then cancelled and TimeoutError is raised for the caller to degrade;
+        other stages are awaited to the end.
+        """
+        timeout = self.remaining(stage)
+        started = time.perf_counter()
+        try:
+            if timeout is None:
+                return await coro
+            if stage not in CANCELLABLE_STAGES:
+                task = asyncio.ensure_future(coro)
+                try:
+                    done, _ = await asyncio.wait({task}, timeout=max(timeout, 0))
+                    if not done:
+                        self.timeouts.append(stage)
+                    return await task
+                finally:
+                    task.cancel()
+            if timeout <= 0:
+                coro.close()
+                raise TimeoutError
+            return await asyncio.wait_for(coro, timeout)
+        except TimeoutError:
+            # A stage may also time out on its own, e.g. a client timeout
+            if stage not in self.timeouts:
+                self.timeouts.append(stage)
+            raise
+        finally:
+            self.stage_ms[stage] = (time.perf_counter() - started) * 1000
+
+    def metadata(self) -> Dict[str, Any]:
+        """
+        Budget, per-stage timings and timed-out stages, for the result metadata.
+        """
+        return {
+            "budget_ms": self.budget_ms,
+            "stage_ms": dict(self.stage_ms),
+            "timeouts": list(self.timeouts),
+        }
@@ -0,0 +1,275 @@
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+from qdrant_client import QdrantClient
+
+from agent.retrievers.collection_versions import read_collection_epoch
+from agent.retrievers.filters import (
+    CATEGORY_BITS_FIELD,
+    CATEGORY_LEAF_PATHS,
+    SubsidyFilterSpec,
+    category_bitset,
+    decode_category_bitset,
+    selected_category_leaves,
+)
+from agent.retrievers.payload import CATEGORY_PAYLOAD_FIELD, payload_to_node
+
+logger = logging.getLogger(__name__)
+
+# Points per scroll request when exporting a collection
+SNAPSHOT_SCROLL_BATCH = 256
+# Filter masks kept per index before the memo is reset
+MAX_SPEC_MASKS = 4096
+# 64-bit words per category bitset
+CATEGORY_BITSET_WORDS = (len(CATEGORY_LEAF_PATHS) + 63) // 64
+
+
+def bitset_words(bits: int) -> np.ndarray:
+    """
+    A category bitset as little-endian uint64 words; bit i of the bitset is bit i % 64 of word i // 64.
+    """
+    return np.frombuffer(bits.to_bytes(CATEGORY_BITSET_WORDS * 8, "little"), dtype="<u8")
+
+
+def bitset_match(category_bits: np.ndarray, bits: int) -> np.ndarray:
+    """
+    Boolean mask of the columns of a (words x points) bitset matrix that share a bit with bits.
+    Words in which the selection has no bits are skipped.
+    """
+    mask = np.zeros(category_bits.shape[1], dtype=bool)
+    for word, selection in enumerate(bitset_words(bits)):
+        if selection:
+            mask |= (category_bits[word] & selection) != 0
+    return mask
+
+
+def payload_category_bits(payload: dict) -> int:
+    """
+    The category bitset of a point, computed from the Categories tree for points stored without one.
+    """
+    encoded_bits = payload.get(CATEGORY_BITS_FIELD)
+    if encoded_bits is not None:
+        return decode_category_bitset(encoded_bits)
+    return category_bitset(selected_category_leaves(payload.get(CATEGORY_PAYLOAD_FIELD) or {}))
+
+
+def save_vector_snapshot(client: QdrantClient, collection_name: str, save_dir: str, vector_name: str) -> Path:
+    """
+    Export a collection's dense vectors and payloads next to the documents written by save_documents,
+    so LocalVectorIndex can serve searches without Qdrant.
+
+    Args:
+        client (QdrantClient): Client of the Qdrant holding the collection
+        collection_name (str): Collection to export
+        save_dir (str): Directory path to save the snapshot in
+        vector_name (str): Name of the dense vector to export
+
+    Returns:
+        Path: The snapshot file
+    """
+    records = []
+    offset = None
+    while True:
+        batch, offset = client.scroll(
+            collection_name=collection_name,
+            limit=SNAPSHOT_SCROLL_BATCH,
+            offset=offset,
+            with_payload=True,
+            with_vectors=[vector_name],
+        )
+        records.extend(batch)
+        if offset is None:
+            break
+
+    save_path = Path(save_dir)
+    save_path.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_path = save_path / f"vectors_{collection_name}_{timestamp}.npz"
+
+    np.savez(
+        file_path,
+        ids=np.array([str(record.id) for record in records]),
+        embeddings=np.array([record.vector[vector_name] for record in records], dtype=np.float32),
+        payloads=np.frombuffer(json.dumps([record.payload for record in records]).encode("utf-8"), dtype=np.uint8),
+        epoch=np.int64(read_collection_epoch(client, collection_name)),
+    )
+    print(f"Saved {len(records)} vectors of {collection_name} to {file_path}")
+    return file_path
+
+
+def latest_vector_snapshot(save_dir: str, collection_name: str) -> Path:
+    """
+    The most recent snapshot of a collection in save_dir.
+    """
+    snapshots = list(Path(save_dir).glob(f"vectors_{collection_name}_*.npz"))
+    if not snapshots:
+        raise FileNotFoundError(f"No vector snapshot of {collection_name} found in {save_dir}")
+    return max(snapshots, key=lambda path: path.stat().st_mtime)
+
+
+class LocalVectorIndex:
+    """
+    In-process exact dense search over a collection snapshot.
+
+    Embeddings live in one contiguous, L2-normalized float32 matrix, so a search is a single
+    matrix-vector product (cosine similarity, as in the Qdrant collection). Filters are evaluated
+    with boolean masks precomputed per Bereik value and Status value, and for categories with an
+    AND over the (words x points) category bitset matrix, one contiguous row per 64 leaves.
+    The combined mask of a filter spec is memoized.
+    """
+
+    def __init__(self, ids: Sequence[str], embeddings: np.ndarray, payloads: List[dict], epoch: int = 0):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.embeddings = embeddings / np.where(norms == 0, 1, norms)
+        self.ids = list(ids)
+        self.payloads = payloads
+        self.epoch = epoch
+
+        # Rebuilt once, without the search metrics points_to_nodes records; searches hand out copies
+        self._nodes = [payload_to_node(payload) for payload in payloads]
+
+        self.location_masks = self._value_masks("Bereik")
+        self.status_masks = self._value_masks("Status")
+        self.category_bits = np.zeros((CATEGORY_BITSET_WORDS, len(payloads)), dtype="<u8")
+        for i, payload in enumerate(payloads):
+            self.category_bits[:, i] = bitset_words(payload_category_bits(payload))
+
+        self._spec_masks: Dict[SubsidyFilterSpec, Optional[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_records(cls, records, vector_name: str, epoch: int = 0) -> "LocalVectorIndex":
+        """
+        Build an index from Qdrant records fetched with their payload and dense vector.
+        """
+        return cls(
+            ids=[str(record.id) for record in records],
+            embeddings=np.array([record.vector[vector_name] for record in records], dtype=np.float32),
+            payloads=[record.payload for record in records],
+            epoch=epoch,
+        )
+
+    @classmethod
+    def load(cls, file_path: Path) -> "LocalVectorIndex":
+        start = time.perf_counter()
+        with np.load(file_path, allow_pickle=False) as snapshot:
+            index = cls(
+                ids=snapshot["ids"].tolist(),
+                embeddings=snapshot["embeddings"],
+                payloads=json.loads(snapshot["payloads"].tobytes().decode("utf-8")),
+                epoch=int(snapshot["epoch"]),
+            )
+        logger.info(f"Loaded {len(index)} vectors from {file_path} in {time.perf_counter() - start:.2f}s")
+        return index
+
+    @classmethod
+    def load_latest(cls, save_dir: str, collection_name: str) -> "LocalVectorIndex":
+        return cls.load(latest_vector_snapshot(save_dir, collection_name))
+
+    def _value_masks(self, field_name: str) -> Dict[str, np.ndarray]:
+        masks: Dict[str, np.ndarray] = {}
+        for i, payload in enumerate(self.payloads):
+            value = payload.get(field_name)
+            for v in value if isinstance(value, list) else [value]:
+                if v is not None:
+                    masks.setdefault(v, np.zeros(len(self.payloads), dtype=bool))[i] = True
+        return masks
+
+    def _any_of(self, masks: Dict[str, np.ndarray], keys) -> np.ndarray:
+        result = np.zeros(len(self), dtype=bool)
+        for key in keys:
+            mask = masks.get(key)
+            if mask is not None:
+                result |= mask
+        return result
+
+    def mask(self, spec: SubsidyFilterSpec) -> Optional[np.ndarray]:
+        """
+        Boolean mask of the points matching the spec, or None when it has no condition.
+        """
+        with self._lock:
+            if spec in self._spec_masks:
+                return self._spec_masks[spec]
+
+        mask = None
+        if spec.locations:
+            mask = self._any_of(self.location_masks, spec.locations)
+        if spec.status:
+            status_mask = self._any_of(self.status_masks, spec.status)
+            mask = status_mask if mask is None else mask & status_mask
+        if spec.leaves:
+            category_mask = bitset_match(self.category_bits, category_bitset(spec.leaves))
+            mask = category_mask if mask is None else mask & category_mask
+
+        with self._lock:
+            if len(self._spec_masks) >= MAX_SPEC_MASKS:
+                self._spec_masks.clear()
+            self._spec_masks[spec] = mask
+        return mask
+
+    def count(self, spec: SubsidyFilterSpec) -> int:
+        mask = self.mask(spec)
+        return len(self) if mask is None else int(mask.sum())
+
+    def category_counts(self, spec: SubsidyFilterSpec) -> Dict[str, int]:
+        """
+        Facet counts: per category leaf, the number of points matching the spec that have it.
+        Leaves without matches are left out.
+        """
+        mask = self.mask(spec)
+        bits = self.category_bits.T if mask is None else self.category_bits[:, mask].T
+        unpacked = np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=1, bitorder="little")
+        counts = unpacked[:, :len(CATEGORY_LEAF_PATHS)].sum(axis=0)
+        return {leaf: int(count) for leaf, count in zip(CATEGORY_LEAF_PATHS, counts) if count}
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        spec: SubsidyFilterSpec,
+        top_k: int,
+        include_categories: bool = False,
+    ) -> List[NodeWithScore]:
+        """
+        Exact top_k points by cosine similarity among those matching the spec.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm:
+            query = query / query_norm
+
+        mask = self.mask(spec)
+        if mask is None:
+            candidates = None
+            scores = self.embeddings @ query
+        else:
+            candidates = np.flatnonzero(mask)
+            scores = self.embeddings[candidates] @ query
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        positions = top if candidates is None else candidates[top]
+
+        return [self._node(position, float(scores[i]), include_categories) for i, position in zip(top, positions)]
+
+    def _node(self, position: int, score: float, include_categories: bool) -> NodeWithScore:
+        # A shallow copy with its own metadata, so callers editing node.metadata leave the index intact
+        node = self._nodes[position].model_copy()
+        node.metadata = dict(node.metadata)
+        if include_categories and CATEGORY_PAYLOAD_FIELD in self.payloads[position]:
+            node.metadata[CATEGORY_PAYLOAD_FIELD] = self.payloads[position][CATEGORY_PAYLOAD_FIELD]
+        return NodeWithScore(node=node, score=score)
+
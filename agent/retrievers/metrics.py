@@ -0,0 +1,236 @@
+"""
+In-process metrics for the retrieval pipeline: per-stage wall time, candidate counts, payload size
+and provider usage, kept as fixed-bucket histograms and counters.
+
+The process-wide registry from get_metrics_registry() can be read with snapshot() or exported
+with to_prometheus() in the Prometheus text exposition format. Recording an observation is a
+dict lookup, a bisect and a locked increment, a couple of microseconds per stage.
+"""
+import os
+import math
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Set RETRIEVER_METRICS=0 to skip recording altogether
+METRICS_ENABLED = os.getenv('RETRIEVER_METRICS', '1') != '0'
+
+# Upper bounds of the histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 200, 400, 1000)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 1e7)
+
+# Metric names and their help texts
+STAGE_SECONDS = "subsidy_retrieval_stage_seconds"
+CANDIDATES = "subsidy_retrieval_candidates"
+PAYLOAD_BYTES = "subsidy_retrieval_payload_bytes"
+RETRIEVALS = "subsidy_retrievals_total"
+PROVIDER_UNITS = "subsidy_provider_units_total"
+PARAMETER_EXTRACTIONS = "subsidy_parameter_extractions_total"
+METRIC_HELP = {
+    STAGE_SECONDS: "Wall time per retrieval stage (extract, embed, search, decode, rerank, total)",
+    CANDIDATES: "Candidates per stage (decoded search hits, documents sent to rerank)",
+    PAYLOAD_BYTES: "Node payload characters decoded per search response",
+    RETRIEVALS: "Retrievals by outcome (fresh, cached, semantic, degraded)",
+    PROVIDER_UNITS: "Usage billed or estimated per provider and unit",
+    PARAMETER_EXTRACTIONS: "Parameter extractions by source (rules, llm)",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, with their sum.
+    """
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile by linear interpolation within its bucket, as Prometheus'
+        histogram_quantile does. None without observations.
+        """
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"count": self.count, "sum": self.sum, "counts": list(self.counts)}
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"value": self.value}
+
+
+class MetricsRegistry:
+    """
+    Histograms and counters by name and labels, created on first use.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Labels], Any] = {}
+        self._lock = threading.Lock()
+
+    # The helpers below call these with a prebuilt labels tuple, which keeps a lookup to one dict get
+    def _histogram(self, name: str, bounds: Sequence[float], labels: Labels) -> Histogram:
+        metric = self._metrics.get((name, labels))
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault((name, labels), Histogram(bounds))
+        return metric
+
+    def _counter(self, name: str, labels: Labels) -> Counter:
+        metric = self._metrics.get((name, labels))
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault((name, labels), Counter())
+        return metric
+
+    def histogram(self, name: str, bounds: Sequence[float], **labels: str) -> Histogram:
+        return self._histogram(name, bounds, tuple(labels.items()))
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        return self._counter(name, tuple(labels.items()))
+
+    def _sorted_metrics(self) -> List[Tuple[Tuple[str, Labels], Any]]:
+        # Copied under the lock, since other threads may add a metric while this one reads
+        with self._lock:
+            items = list(self._metrics.items())
+        return sorted(items, key=lambda item: item[0])
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Every metric as {name: [{"labels": {...}, **values}]}, for reading in process.
+        """
+        snapshot: Dict[str, List[Dict[str, Any]]] = {}
+        for (name, labels), metric in self._sorted_metrics():
+            snapshot.setdefault(name, []).append({"labels": dict(labels), **metric.snapshot()})
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        seen = set()
+        for (name, labels), metric in self._sorted_metrics():
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {'histogram' if isinstance(metric, Histogram) else 'counter'}")
+            if isinstance(metric, Histogram):
+                values = metric.snapshot()
+                cumulative = 0
+                for bound, count in zip(list(metric.bounds) + [math.inf], values["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {values['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Return the process-wide metrics registry.
+    """
+    return _registry
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        _registry._histogram(STAGE_SECONDS, LATENCY_BUCKETS, (("stage", stage),)).observe(seconds)
+
+
+def observe_candidates(stage: str, candidates: int) -> None:
+    if METRICS_ENABLED:
+        _registry._histogram(CANDIDATES, COUNT_BUCKETS, (("stage", stage),)).observe(candidates)
+
+
+def observe_payload_bytes(size: int) -> None:
+    if METRICS_ENABLED:
+        _registry._histogram(PAYLOAD_BYTES, BYTES_BUCKETS, ()).observe(size)
+
+
+def count(name: str, amount: float = 1.0, **labels: str) -> None:
+    if METRICS_ENABLED:
+        _registry.counter(name, **labels).inc(amount)
+
+
+def record_retrieval(metadata: Dict[str, Any]) -> None:
+    """
+    Record the stage timings and outcome of one retrieval from its result metadata.
+    """
+    if not METRICS_ENABLED:
+        return
+    for stage, ms in (metadata.get("stage_ms") or {}).items():
+        observe_stage(stage, ms / 1000)
+    if "elapsed_ms" in metadata:
+        observe_stage("total", metadata["elapsed_ms"] / 1000)
+
+    if metadata.get("degraded"):
+        outcome = "degraded"
+    elif "semantic_cache" in metadata and metadata.get("cached"):
+        outcome = "semantic"
+    elif metadata.get("cached"):
+        outcome = "cached"
+    else:
+        outcome = "fresh"
+    count(RETRIEVALS, outcome=outcome)
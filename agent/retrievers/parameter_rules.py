@@ -0,0 +1,212 @@
+"""
+Deterministic extraction of include_national, regions and status from a user request.
+
+A gazetteer maps the 12 provinces, their common aliases and adjectives and their larger
+municipalities onto REGIONS; keyword patterns find statuses and national/regional cues,
+including negations such as "geen landelijke". A status is only taken from a word about a
+subsidy or regeling, and a place name that is also a Dutch word ("leiden", "houten") only from
+a locative word before it or its capital letter. extract_parameters_rules() returns None when the
+request holds something the rules cannot settle (a place name shared by provinces or used without
+such context, a negated region or status, a status word outside a subsidy context, conflicting
+national cues), so the caller can ask the LLM instead.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Province, aliases, adjectives and larger municipalities, written as they are matched:
+# lowercase, without accents, with hyphens and apostrophes as spaces
+REGION_ALIASES: Dict[str, List[str]] = {
+    "Drenthe": ["drenthe", "drents", "drentse", "assen", "emmen", "hoogeveen", "meppel", "coevorden"],
+    "Flevoland": ["flevoland", "flevolandse", "flevopolder", "almere", "lelystad", "dronten", "zeewolde",
+                  "noordoostpolder", "emmeloord", "urk"],
+    "Friesland": ["friesland", "fryslan", "friese", "leeuwarden", "sneek", "heerenveen", "drachten",
+                  "harlingen", "smallingerland", "sudwest fryslan"],
+    "Gelderland": ["gelderland", "gelders", "gelderse", "arnhem", "nijmegen", "apeldoorn", "ede", "doetinchem",
+                   "zutphen", "tiel", "harderwijk", "wageningen", "achterhoek", "veluwe", "betuwe"],
+    "Groningen": ["groningen", "gronings", "groningse", "delfzijl", "veendam", "stadskanaal", "hoogezand",
+                  "midden groningen", "eemsdelta", "winschoten"],
+    "Limburg": ["limburg", "limburgs", "limburgse", "maastricht", "venlo", "heerlen", "sittard", "geleen",
+                "roermond", "weert", "kerkrade", "venray"],
+    "Noord-Brabant": ["noord brabant", "brabant", "brabants", "brabantse", "eindhoven", "tilburg", "breda",
+                      "s hertogenbosch", "den bosch", "helmond", "oss", "roosendaal", "bergen op zoom",
+                      "waalwijk", "veghel"],
+    "Noord-Holland": ["noord holland", "noord hollands", "noord hollandse", "amsterdam", "haarlem", "zaanstad",
+                      "alkmaar", "hilversum", "hoorn", "den helder", "purmerend", "amstelveen", "haarlemmermeer",
+                      "schiphol", "zaandam"],
+    "Overijssel": ["overijssel", "overijssels", "overijsselse", "zwolle", "enschede", "deventer", "almelo",
+                   "kampen", "oldenzaal", "twente", "twentse", "salland"],
+    "Utrecht": ["utrecht", "utrechts", "utrechtse", "amersfoort", "nieuwegein", "veenendaal", "zeist",
+                "houten", "woerden", "ijsselstein", "utrechtse heuvelrug"],
+    "Zeeland": ["zeeland", "zeeuws", "zeeuwse", "middelburg", "vlissingen", "terneuzen", "zierikzee",
+                "zeeuws vlaanderen", "walcheren"],
+    "Zuid-Holland": ["zuid holland", "zuid hollands", "zuid hollandse", "rotterdam", "den haag", "s gravenhage",
+                     "leiden", "dordrecht", "delft", "zoetermeer", "gouda", "schiedam", "westland",
+                     "alphen aan den rijn", "drechtsteden"],
+}
+
+# Names that point at more than one province (or at none in particular)
+AMBIGUOUS_PLACES = ["holland", "bergen", "hengelo", "rijswijk", "hardenberg", "randstad", "noord nederland",
+                    "oost nederland", "zuid nederland", "west nederland"]
+
+# Municipalities in REGION_ALIASES that are also ordinary Dutch words ("moet leiden tot", "kampen met",
+# "houten woningbouw"). They only count as a place after a LOCATIVE_WORDS word or when capitalised
+# inside a sentence; anywhere else the request goes to the LLM.
+COMMON_WORD_PLACES = ["leiden", "kampen", "houten", "gouda", "ede", "delft", "weert", "hoorn", "oss"]
+LOCATIVE_WORDS = ["in", "uit", "te", "gemeente", "regio"]
+
+# Statuses are only settled when the word is about a subsidy or regeling: an adjective before the
+# noun ("gesloten regelingen"), a relative clause after it ("subsidies die nu open zijn") or an
+# explicit "status open". __subsidy__ stands for SUBSIDY_NOUNS, __adj__ for up to two words in
+# between and __clause__ for up to six.
+SUBSIDY_NOUNS = (r"(subsidies|subsidie|subsidieregelingen|subsidieregeling|regelingen|regeling|fondsen|fonds|"
+                 r"tenders?|calls?|schemes?|grants?)")
+RELATIVE_WORDS = r"(die|dat|welke|that|which)"
+STATUS_PATTERNS: Dict[str, List[str]] = {
+    "Open": [r"openstaande? __adj____subsidy__", r"open __subsidy__",
+             rf"__subsidy__ __clause__{RELATIVE_WORDS} __adj__(open|opengesteld)",
+             r"__subsidy__ (nog|nu|momenteel|still|currently) open",
+             r"status open", r"aanvraagbaar", r"nu aan te vragen", r"open for applications"],
+    "Aangekondigd": [r"(aangekondigde?|announced|upcoming) __adj____subsidy__",
+                     rf"__subsidy__ __clause__{RELATIVE_WORDS} __adj__(aangekondigd|binnenkort open|nog niet open)",
+                     r"__subsidy__ (die |dat )?binnenkort open", r"status aangekondigd"],
+    "Gesloten": [r"(gesloten|verlopen|afgelopen|closed|expired) __adj____subsidy__",
+                 rf"__subsidy__ __clause__{RELATIVE_WORDS} __adj__(gesloten|verlopen|afgelopen|closed|expired)",
+                 r"__subsidy__ (zijn |is )?(al |inmiddels )?(gesloten|verlopen)", r"status (gesloten|closed)"],
+}
+# A status word outside those contexts ("het platform is open", "het project is goed verlopen")
+# leaves the status to the LLM
+BARE_STATUS_PATTERN = (r"(open|openstaande?|opengesteld|aangekondigde?|gesloten|verlopen|afgelopen|closed|expired|"
+                       r"announced|upcoming)")
+# Phrases holding a status word that are never a status
+NON_STATUS_PATTERNS = [
+    r"open (innovatie|source|data|access|standaarden?|ruimte|teelt)",
+    r"afgelopen (jaren|jaar|maanden|maand|weken|week|periode|decennia|decennium|tijd|dagen)",
+    r"closed loop",
+]
+NEGATED_STATUS_PATTERN = r"((?<!nog )niet|geen|no|not) (meer )?(open|openstaande?|gesloten|verlopen|aangekondigde?|closed)"
+
+NATIONAL_WORDS = r"(landelijke?|nationaal|nationale?|rijkssubsidies?|national|nationwide)"
+NATIONAL_EXCLUDED_PATTERNS = [
+    rf"(geen|niet|zonder|behalve|exclusief) (de |het )?{NATIONAL_WORDS}",
+    r"(alleen|uitsluitend|enkel|slechts) (regionale?|provinciale?|gemeentelijke?)",
+    r"(alleen|uitsluitend|enkel|slechts) (in|binnen|voor|uit) (de provincie )?__region__",
+    r"(no|not|without|excluding) national",
+    r"only (regional|provincial|local)",
+]
+NATIONAL_INCLUDED_PATTERNS = [NATIONAL_WORDS, r"rvo", r"heel nederland", r"het hele land", r"rijksoverheid"]
+NEGATED_REGION_PATTERN = r"(niet|buiten|behalve|zonder|exclusief|geen|not|outside|except) (in |de provincie )?__region__"
+
+_REGION_PLACEHOLDER = "__region__"
+
+
+def normalize_for_rules(text: str) -> str:
+    """
+    Lowercase, strip accents and turn hyphens, apostrophes and punctuation into single spaces.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " " + " ".join(re.findall(r"[a-z0-9_]+", text)) + " "
+
+
+def _places_in_context(text: str) -> bool:
+    """
+    Whether every COMMON_WORD_PLACES word in the raw text reads as a place.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    previous = ""
+    sentence_start = True
+    for match in re.finditer(r"[A-Za-z0-9_]+|[.!?]", text):
+        word = match.group()
+        if word in ".!?":
+            sentence_start = True
+            continue
+        lowered = word.casefold()
+        if lowered in _COMMON_WORD_PLACES:
+            capitalised = word[0].isupper() and not sentence_start
+            if not capitalised and previous not in _LOCATIVE_WORDS:
+                return False
+        previous = lowered
+        sentence_start = False
+    return True
+
+
+def _alternation(names: List[str]) -> str:
+    # Longest names first, so "noord holland" wins over "holland"
+    return "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+
+
+_ALIAS_TO_REGION = {alias: region for region, aliases in REGION_ALIASES.items() for alias in aliases}
+_ALIAS_RE = re.compile(rf"(?<= )({_alternation(list(_ALIAS_TO_REGION))})(?= )")
+_COMMON_WORD_PLACES = frozenset(COMMON_WORD_PLACES)
+_LOCATIVE_WORDS = frozenset(LOCATIVE_WORDS)
+_AMBIGUOUS_RE = re.compile(rf"(?<= )({_alternation(AMBIGUOUS_PLACES)})(?= )")
+
+
+def _status_pattern(patterns: List[str]) -> str:
+    pattern = "|".join(patterns).replace("__subsidy__", SUBSIDY_NOUNS)
+    return pattern.replace("__adj__", r"(?:[a-z0-9_]+ ){0,2}").replace("__clause__", r"(?:[a-z0-9_]+ ){0,6}")
+
+
+_STATUS_RES = {
+    status: re.compile(rf"(?<= )({_status_pattern(patterns)})(?= )") for status, patterns in STATUS_PATTERNS.items()
+}
+_BARE_STATUS_RE = re.compile(rf"(?<= ){BARE_STATUS_PATTERN}(?= )")
+_NON_STATUS_RE = re.compile(rf"(?<= )({'|'.join(NON_STATUS_PATTERNS)})(?= )")
+_NEGATED_STATUS_RE = re.compile(rf"(?<= ){NEGATED_STATUS_PATTERN}(?= )")
+_NATIONAL_EXCLUDED_RES = [re.compile(rf"(?<= ){pattern}(?= )") for pattern in NATIONAL_EXCLUDED_PATTERNS]
+_NATIONAL_INCLUDED_RES = [re.compile(rf"(?<= ){pattern}(?= )") for pattern in NATIONAL_INCLUDED_PATTERNS]
+_NEGATED_REGION_RE = re.compile(rf"(?<= ){NEGATED_REGION_PATTERN}(?= )")
+
+Parameters = Tuple[Optional[bool], Optional[List[str]], Optional[List[str]]]
+
+
+def extract_parameters_rules(user_input: str) -> Optional[Parameters]:
+    """
+    Extract (include_national, regions, status) like extract_parameters, without an LLM.
+
+    Args:
+        user_input (str): The user's request
+
+    Returns:
+        Optional[Parameters]: The parameters, None for values that are not specified, or None
+            altogether when the request is ambiguous and should go to the LLM
+    """
+    text = normalize_for_rules(user_input)
+
+    if _AMBIGUOUS_RE.search(_ALIAS_RE.sub("_", text)) or not _places_in_context(user_input):
+        return None
+
+    # Replace every place name by the placeholder so the patterns can refer to "a region"
+    regions = []
+    for match in _ALIAS_RE.finditer(text):
+        region = _ALIAS_TO_REGION[match.group(1)]
+        if region not in regions:
+            regions.append(region)
+    generic = _NON_STATUS_RE.sub("_", _ALIAS_RE.sub(_REGION_PLACEHOLDER, text))
+
+    if _NEGATED_REGION_RE.search(generic) or _NEGATED_STATUS_RE.search(generic):
+        return None
+
+    status = []
+    unsettled = generic
+    for name, pattern in _STATUS_RES.items():
+        if pattern.search(unsettled):
+            status.append(name)
+            unsettled = pattern.sub("_", unsettled)
+    if _BARE_STATUS_RE.search(unsettled):
+        return None
+
+    include_national = None
+    remainder = generic
+    for pattern in _NATIONAL_EXCLUDED_RES:
+        if pattern.search(remainder):
+            include_national = False
+            remainder = pattern.sub("_", remainder)
+    if any(pattern.search(remainder) for pattern in _NATIONAL_INCLUDED_RES):
+        if include_national is False:
+            return None
+        include_national = True
+
+    return include_national, regions or None, status or None
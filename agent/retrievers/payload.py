@@ -0,0 +1,84 @@
+import json
+import time
+from typing import List
+
+from llama_index.core.schema import BaseNode, NodeWithScore
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+from agent.retrievers.filters import (
+    CATEGORY_BITS_FIELD,
+    category_bitset,
+    encode_category_bitset,
+    selected_category_leaves,
+)
+from agent.retrievers.metrics import observe_candidates, observe_payload_bytes, observe_stage
+
+# Top-level payload key of the nested category booleans. Searches only filter on it.
+CATEGORY_PAYLOAD_FIELD = "Categories"
+
+# Payload fields a search needs to rebuild a node: the node JSON written by QdrantVectorStore,
+# which carries the text and the display metadata (title, Status, Bereik, Deadline, bijdrage, ...)
+NODE_PAYLOAD_FIELDS = ["_node_content", "_node_type"]
+
+
+def payload_fields(include_categories: bool = False) -> List[str]:
+    """
+    Payload fields to request from Qdrant, optionally with the Categories dict.
+    """
+    if include_categories:
+        return NODE_PAYLOAD_FIELDS + [CATEGORY_PAYLOAD_FIELD]
+    return NODE_PAYLOAD_FIELDS
+
+
+def lean_payload(payload: dict) -> dict:
+    """
+    Drop the Categories dict from the node JSON of a point payload. The top-level Categories
+    field the filters use is kept, so the tree is stored once instead of twice.
+    """
+    node_dict = json.loads(payload["_node_content"])
+    node_dict.get("metadata", {}).pop(CATEGORY_PAYLOAD_FIELD, None)
+    return {**payload, "_node_content": json.dumps(node_dict)}
+
+
+def ingest_payload(payload: dict) -> dict:
+    """
+    Payload as stored at ingest: the lean node JSON plus the category bitset of the Categories tree.
+    """
+    payload = lean_payload(payload)
+    categories = payload.get(CATEGORY_PAYLOAD_FIELD)
+    if isinstance(categories, dict):
+        payload[CATEGORY_BITS_FIELD] = encode_category_bitset(category_bitset(selected_category_leaves(categories)))
+    return payload
+
+
+def payload_to_node(payload: dict, include_categories: bool = False) -> BaseNode:
+    """
+    Rebuild one llama_index node from its Qdrant payload, without recording metrics.
+    """
+    node = metadata_dict_to_node(payload)
+    if include_categories and CATEGORY_PAYLOAD_FIELD in payload:
+        node.metadata[CATEGORY_PAYLOAD_FIELD] = payload[CATEGORY_PAYLOAD_FIELD]
+    elif not include_categories:
+        node.metadata.pop(CATEGORY_PAYLOAD_FIELD, None)
+    return node
+
+
+def points_to_nodes(points, include_categories: bool = False) -> List[NodeWithScore]:
+    """
+    Rebuild the llama_index nodes stored by QdrantVectorStore from scored Qdrant points.
+
+    Categories end up in node.metadata only when requested, whether the collection was
+    written with lean or with full node JSON. The decode time, the number of points and the
+    size of their node JSON are recorded in the metrics registry.
+    """
+    started = time.perf_counter()
+    nodes = []
+    payload_size = 0
+    for point in points:
+        payload_size += len(point.payload.get("_node_content", ""))
+        nodes.append(NodeWithScore(node=payload_to_node(point.payload, include_categories), score=point.score))
+
+    observe_stage("decode", time.perf_counter() - started)
+    observe_candidates("search", len(nodes))
+    observe_payload_bytes(payload_size)
+    return nodes
@@ -0,0 +1,86 @@
+"""
+Payload indexes for the fields every subsidy search filters on.
+
+compile_subsidy_filter matches Bereik and Status with MatchAny and ORs over Categories.* leaves,
+so ingest declares a keyword index on Bereik and Status and a bool index on each category leaf.
+Check a collection with:
+
+    python -m agent.retrievers.payload_indexes --collection vindsub_subsidies_2024_v1_cohere [--create]
+"""
+import argparse
+from typing import Dict
+
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import PayloadSchemaType
+
+from agent.retrievers.filters import CATEGORY_LEAF_PATHS
+from agent.retrievers.payload import CATEGORY_PAYLOAD_FIELD
+
+REQUIRED_PAYLOAD_INDEXES: Dict[str, PayloadSchemaType] = {
+    "Bereik": PayloadSchemaType.KEYWORD,
+    "Status": PayloadSchemaType.KEYWORD,
+    **{f"{CATEGORY_PAYLOAD_FIELD}.{leaf}": PayloadSchemaType.BOOL for leaf in CATEGORY_LEAF_PATHS},
+}
+
+
+def missing_payload_indexes(client: QdrantClient, collection_name: str) -> Dict[str, str]:
+    """
+    Compare the collection's payload schema with REQUIRED_PAYLOAD_INDEXES.
+
+    Returns:
+        Dict[str, str]: Field name to problem ("missing" or "wrong type: <type>"), empty when all indexes exist
+    """
+    payload_schema = client.get_collection(collection_name=collection_name).payload_schema
+    problems = {}
+    for field_name, schema_type in REQUIRED_PAYLOAD_INDEXES.items():
+        index = payload_schema.get(field_name)
+        if index is None:
+            problems[field_name] = "missing"
+        elif index.data_type != schema_type:
+            problems[field_name] = f"wrong type: {index.data_type}"
+    return problems
+
+
+def create_payload_indexes(client: QdrantClient, collection_name: str) -> int:
+    """
+    Create every missing or mistyped index in REQUIRED_PAYLOAD_INDEXES.
+
+    Returns:
+        int: The number of indexes created
+    """
+    problems = missing_payload_indexes(client, collection_name)
+    for field_name in problems:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=REQUIRED_PAYLOAD_INDEXES[field_name],
+            wait=True,
+        )
+    return len(problems)
+
+
+def main():
+    from agent.retrievers.subsidy_retriever import DEFAULT_COLLECTION_NAME, QDRANT_URL, QDRANT_TIMEOUT_SECONDS, qdrant_api_key
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION_NAME)
+    parser.add_argument("--create", action="store_true", help="Create the missing indexes")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=QDRANT_URL, api_key=qdrant_api_key, timeout=QDRANT_TIMEOUT_SECONDS)
+
+    if args.create:
+        created = create_payload_indexes(client, args.collection)
+        print(f"Created {created} payload indexes on {args.collection}")
+
+    problems = missing_payload_indexes(client, args.collection)
+    print(f"{len(REQUIRED_PAYLOAD_INDEXES) - len(problems)}/{len(REQUIRED_PAYLOAD_INDEXES)} payload indexes present on {args.collection}")
+    for field_name, problem in problems.items():
+        print(f"  {field_name}: {problem}")
+
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
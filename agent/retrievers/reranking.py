@@ -0,0 +1,173 @@
+import os
+import re
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core.schema import MetadataMode, NodeWithScore
+
+from agent.retrievers.metrics import PROVIDER_UNITS, count
+
+# Chunks of one subsidy sent to rerank; embed_documents splits every Samenvatting into several
+# chunks, which otherwise crowd the rerank input and the final top_n. 0 keeps every chunk.
+DEFAULT_CHUNKS_PER_SUBSIDY = int(os.getenv('CHUNKS_PER_SUBSIDY', 1))
+
+# Cohere splits documents longer than 500 tokens (query included) into chunks that are billed as
+# separate documents, so each rerank document is cut down to its most query-relevant sentences
+RERANK_MAX_TOKENS = int(os.getenv('RERANK_MAX_TOKENS', 384))
+# Candidates whose dense score is below this fraction of the query's dense score range
+# (0 = worst candidate, 1 = best) are not reranked, but at least RERANK_MIN_CANDIDATES are
+RERANK_SCORE_CUTOFF = float(os.getenv('RERANK_SCORE_CUTOFF', 0.2))
+RERANK_MIN_CANDIDATES = 25
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@dataclass(frozen=True)
+class RerankInputPolicy:
+    """
+    How the dense candidates are turned into rerank documents: at most max_tokens per document
+    and a cutoff on the normalized dense score, keeping at least min_candidates.
+    """
+    max_tokens: int = RERANK_MAX_TOKENS
+    score_cutoff: float = RERANK_SCORE_CUTOFF
+    min_candidates: int = RERANK_MIN_CANDIDATES
+
+
+DEFAULT_RERANK_INPUT_POLICY = RerankInputPolicy()
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (about four characters per token) for budgeting rerank documents.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def select_passage(query_tokens: set, text: str, max_tokens: int) -> str:
+    """
+    Cut text down to about max_tokens tokens, keeping the sentences sharing the most words with
+    the query (in their original order). Text within the budget is returned unchanged.
+    """
+    if approximate_tokens(text) <= max_tokens:
+        return text
+
+    sentences = [sentence for sentence in _SENTENCE_RE.split(text) if sentence.strip()]
+    scored = []
+    for position, sentence in enumerate(sentences):
+        words = set(_WORD_RE.findall(sentence.lower()))
+        overlap = len(query_tokens & words) / math.sqrt(len(words)) if words else 0.0
+        # The opening sentence usually names the subsidy, so it wins ties
+        scored.append((overlap, -position, sentence))
+    scored.sort(reverse=True)
+
+    kept = []
+    budget = max_tokens
+    for _, negative_position, sentence in scored:
+        tokens = approximate_tokens(sentence)
+        if tokens <= budget:
+            kept.append((-negative_position, sentence))
+            budget -= tokens
+    if not kept:
+        # A single sentence longer than the budget is truncated
+        return text[:max_tokens * 4]
+    return " ".join(sentence for _, sentence in sorted(kept))
+
+
+def build_rerank_inputs(
+    query: str,
+    nodes: List[NodeWithScore],
+    policy: RerankInputPolicy,
+) -> Tuple[List[NodeWithScore], List[str]]:
+    """
+    The candidates worth reranking and their rerank documents, within the policy's token budget.
+    """
+    if len(nodes) > policy.min_candidates:
+        scores = [node.score or 0.0 for node in nodes]
+        low, high = min(scores), max(scores)
+        if high > low:
+            cutoff = low + policy.score_cutoff * (high - low)
+            kept = [node for node in nodes if (node.score or 0.0) >= cutoff]
+            # Candidates come in dense ranking order, so topping up takes the best of the rest
+            nodes = kept if len(kept) >= policy.min_candidates else nodes[:policy.min_candidates]
+
+    query_tokens = set(_WORD_RE.findall(query.lower()))
+    texts = [
+        select_passage(query_tokens, node.node.get_content(metadata_mode=MetadataMode.EMBED), policy.max_tokens)
+        for node in nodes
+    ]
+    return nodes, texts
+
+
+def subsidy_key(node: NodeWithScore) -> str:
+    """
+    The subsidy a chunk belongs to: its source document, else its title, else the chunk itself.
+    """
+    return node.node.ref_doc_id or node.node.metadata.get("title") or node.node.node_id
+
+
+def group_by_subsidy(nodes: List[NodeWithScore], chunks_per_subsidy: int) -> List[NodeWithScore]:
+    """
+    Keep the best chunks_per_subsidy chunks of every subsidy, in the order of the input ranking.
+    """
+    if chunks_per_subsidy <= 0:
+        return nodes
+
+    kept: Dict[str, int] = {}
+    grouped = []
+    for node in nodes:
+        key = subsidy_key(node)
+        if kept.get(key, 0) < chunks_per_subsidy:
+            kept[key] = kept.get(key, 0) + 1
+            grouped.append(node)
+    return grouped
+
+
+class CohereReranker:
+    """
+    Async Cohere rerank with the same input and output as llama_index's CohereRerank postprocessor.
+    The Cohere client (and SDK) is loaded on first use, so it is bound to the loop that awaits it
+    and importing this module stays cheap.
+    """
+
+    def __init__(self, top_n: int = 10, model: str = "rerank-v3.5", api_key: Optional[str] = None):
+        self.top_n = top_n
+        self.model = model
+        self._api_key = api_key
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from cohere import AsyncClient
+
+            self._client = AsyncClient(api_key=self._api_key)
+        return self._client
+
+    async def arerank(self, query: str, nodes: List[NodeWithScore], texts: Optional[List[str]] = None) -> List[NodeWithScore]:
+        """
+        Rerank the nodes against the query and return the top_n with their relevance scores.
+        texts are the documents to score per node (see build_rerank_inputs), the full node text by default.
+        """
+        if len(nodes) == 0:
+            return []
+
+        if texts is None:
+            texts = [
+                node.node.get_content(metadata_mode=MetadataMode.EMBED)
+                for node in nodes
+            ]
+        results = await self._get_client().rerank(
+            model=self.model,
+            top_n=self.top_n,
+            query=query,
+            documents=texts,
+        )
+        billed_units = getattr(results.meta, "billed_units", None) if results.meta else None
+        if billed_units is not None and billed_units.search_units:
+            count(PROVIDER_UNITS, billed_units.search_units, provider="cohere", unit="search_units")
+
+        return [
+            NodeWithScore(node=nodes[result.index].node, score=result.relevance_score)
+            for result in results.results
+        ]
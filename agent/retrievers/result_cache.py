@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from qdrant_client.http.models import Filter
+
+DEFAULT_TTL_SECONDS = float(os.getenv('RESULT_CACHE_TTL_SECONDS', 600))
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def canonical_filter(combined_filter: Optional[Filter]) -> str:
+    """
+    Stable string form of a Qdrant filter, used as part of a cache key.
+    """
+    if combined_filter is None:
+        return ""
+    return json.dumps(combined_filter.model_dump(exclude_none=True), sort_keys=True, separators=(",", ":"))
+
+
+class ResultCache:
+    """
+    Bounded LRU of full retrieve + rerank results with a time-to-live.
+
+    Keys are built by the engine from the normalized query, the canonical filter, the
+    collection, the embed and rerank settings and the collection epoch. A rebuilt collection
+    gets a new epoch, so its old entries simply stop matching and age out of the LRU.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss counters since the cache was created.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Return the process-wide result cache.
+    """
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
@@ -1,48 +1,29 @@
 import os
+import time
+from functools import lru_cache
 from typing import List
 
-from llama_index.core.program import FunctionCallingProgram
-from llama_index.core.vector_stores import MetadataFilter, MetadataFilters, FilterOperator
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from llama_index.embeddings.cohere import CohereEmbedding
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core import Settings, Document, VectorStoreIndex, StorageContext
-from llama_index.postprocessor.cohere_rerank import CohereRerank
 from llama_index.core.schema import NodeWithScore
 
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Filter, FieldCondition, MatchValue, MatchAny
-
 from agent.prompts.prompts import SYSTEM_PROMPT_NATIONAL_REGION_STATUS_EXTRACTOR
+from agent.retrievers.subsidy_retriever import (
+    get_subsidy_retriever,
+    retrieve_fan_out,
+    DEFAULT_COLLECTION_NAME,
+    DEFAULT_EMBED_MODEL,
+    DEFAULT_RERANK_CONCURRENCY,
+    DEFAULT_BACKEND,
+)
+from agent.retrievers.hybrid import DEFAULT_HYBRID_SEARCH, HybridSearch
+from agent.retrievers.latency_budget import DEFAULT_LATENCY_BUDGET_MS
+from agent.retrievers.embedding_cache import normalize_text
+from agent.retrievers.metrics import PARAMETER_EXTRACTIONS, PROVIDER_UNITS, count, observe_stage
+from agent.retrievers.parameter_rules import extract_parameters_rules
 from agent.tools.subsidy_report_parameters import REGIONS, STATUS
 
 from agent.tools.tool_query_subsidies import query_subsidies, SubsidyReportParameters, CategorieSelectie
 from agent.tools.utils import check_regions
 
-from openai import OpenAI
-
-### tracers ###
-
-from phoenix.otel import register
-from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
-# Add Phoenix API Key for tracing
-PHOENIX_API_KEY = os.getenv('PHOENIX_API_KEY')
-os.environ["PHOENIX_CLIENT_HEADERS"] = f"api_key={PHOENIX_API_KEY}"
-
-# configure the Phoenix tracer
-tracer_provider = register(
-  project_name="my-llm-app", # Default is 'default'
-  endpoint="https://app.phoenix.arize.com/v1/traces",
-)
-
-LlamaIndexInstrumentor().instrument(tracer_provider=tracer_provider)
-
-from openinference.instrumentation.openai import OpenAIInstrumentor
-
-OpenAIInstrumentor().instrument(tracer_provider=tracer_provider)
-
-### end tracers ###
-
 COHERE_API_KEY = os.getenv('COHERE_API_KEY')
 cohere_api_key = COHERE_API_KEY
 
@@ -50,9 +31,17 @@ QDRANT_API_KEY = os.getenv('QDRANT_API_KEY')
 qdrant_api_key = QDRANT_API_KEY
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-OpenAI.api_key = OPENAI_API_KEY
 
-client_openai = OpenAI()
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    """
+    Return the OpenAI client, importing the SDK on first use. Requests the rule-based extractor
+    settles never load it.
+    """
+    from openai import OpenAI
+
+    return OpenAI(api_key=OPENAI_API_KEY)
 
 
 # # prompt_template_str = """\
@@ -147,14 +136,47 @@ client_openai = OpenAI()
     
 #     return include_national, regions, status
 
-def extract_parameters(user_input: str) -> str:
+# Set PARAMETER_RULES=0 to send every request to the LLM extractor
+PARAMETER_RULES_ENABLED = os.getenv('PARAMETER_RULES', '1') != '0'
+# Distinct normalized inputs whose extracted parameters are kept
+PARAMETER_CACHE_SIZE = 4096
+
+
+def extract_parameters(user_input: str):
+    """
+    Extract include_national, regions and status from a user request.
+    The rule-based extractor settles the common cases locally; requests it finds ambiguous go
+    to gpt-4o. Results are memoized per normalized input. The time taken is recorded as the
+    "extract" stage in the metrics registry.
+    """
+    started = time.perf_counter()
+    include_national, regions, status = _extract_parameters(normalize_text(user_input))
+    observe_stage("extract", time.perf_counter() - started)
+    return include_national, list(regions) if regions else None, list(status) if status else None
+
+
+@lru_cache(maxsize=PARAMETER_CACHE_SIZE)
+def _extract_parameters(user_input: str):
+    parameters = extract_parameters_rules(user_input) if PARAMETER_RULES_ENABLED else None
+    if parameters is None:
+        parameters = extract_parameters_llm(user_input)
+        count(PARAMETER_EXTRACTIONS, source="llm")
+    else:
+        count(PARAMETER_EXTRACTIONS, source="rules")
+
+    # Tuples, so callers cannot modify the memoized lists
+    include_national, regions, status = parameters
+    return include_national, tuple(regions) if regions else None, tuple(status) if status else None
+
+
+def extract_parameters_llm(user_input: str):
     """
-    Extract the category from the summary of a subsidy.
+    Extract include_national, regions and status from a user request with gpt-4o.
     """
 
     summary_extraction_system_prompt = SYSTEM_PROMPT_NATIONAL_REGION_STATUS_EXTRACTOR
 
-    completion = client_openai.beta.chat.completions.parse(
+    completion = get_openai_client().beta.chat.completions.parse(
     model="gpt-4o",
     messages=[
         {"role": "system", "content": summary_extraction_system_prompt},
@@ -164,6 +186,9 @@ def extract_parameters(user_input: str) -> str:
     )
 
     report_parameters = completion.choices[0].message.parsed
+    if completion.usage:
+        count(PROVIDER_UNITS, completion.usage.prompt_tokens, provider="openai", unit="prompt_tokens")
+        count(PROVIDER_UNITS, completion.usage.completion_tokens, provider="openai", unit="completion_tokens")
 
     include_national = report_parameters.include_national
 
@@ -250,139 +275,211 @@ def extract_parameters(user_input: str) -> str:
 
 #     return nodes_reranked, nodes_embed
 
+async def aretrieve_subsidies(
+    user_input: str,
+    include_national: bool = True,
+    regions: List[str] = None,
+    categories: dict = None,
+    status: List[str] = None,
+    collection_name: str = DEFAULT_COLLECTION_NAME,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS,
+    include_categories: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    hybrid: HybridSearch = DEFAULT_HYBRID_SEARCH,
+    similarity_top_k: int = 100
+):
+    """
+    Retrieve subsidies based on query and filters, as a coroutine.
+    Embedding, search and rerank use async clients, so many searches can share one event loop.
+    """
+
+    try:
+        retriever = get_subsidy_retriever(collection_name, embed_model, backend, hybrid, similarity_top_k)
+
+        return await retriever.aretrieve(
+            user_input,
+            include_national=include_national,
+            regions=regions,
+            categories=categories,
+            status=status,
+            latency_budget_ms=latency_budget_ms,
+            include_categories=include_categories,
+        )
+
+    except Exception as e:
+        raise Exception(f"Error in aretrieve_subsidies: {str(e)}")
+
 def retrieve_subsidies(
     user_input: str, 
     include_national: bool = True, 
     regions: List[str] = None, 
     categories: dict = None,
     status: List[str] = None,
-    collection_name: str = "vindsub_subsidies_2024_v1_cohere",
-    embed_model: str = "cohere"
+    collection_name: str = DEFAULT_COLLECTION_NAME,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS,
+    include_categories: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    hybrid: HybridSearch = DEFAULT_HYBRID_SEARCH,
+    similarity_top_k: int = 100
 ):
     """
-    Retrieve subsidies based on query and filters
+    Retrieve subsidies based on query and filters (blocking wrapper around the async pipeline).
+    latency_budget_ms bounds the whole search (None for no bound); when the rerank stage runs
+    out of budget the dense results are returned with result.metadata["unreranked"] set, and
+    result.metadata["degraded"] tells callers to say the results may be incomplete.
+    Nodes come without the Categories tree unless include_categories is set.
+    backend="local" searches an in-process snapshot of the collection instead of Qdrant.
+    hybrid takes a HybridSearch (fusion method and per-branch top_k) to also search the sparse
+    vector, or None for dense search only; RETRIEVER_HYBRID=1 makes hybrid search the default.
+    similarity_top_k is the number of dense candidates handed to the reranker.
     """
 
-    if embed_model == "cohere":
-        embed_model = CohereEmbedding(
-            api_key=cohere_api_key,
-            model_name="embed-english-v3.0",
-            input_type="search_query",
+    try:
+        retriever = get_subsidy_retriever(collection_name, embed_model, backend, hybrid, similarity_top_k)
+
+        return retriever.retrieve(
+            user_input,
+            include_national=include_national,
+            regions=regions,
+            categories=categories,
+            status=status,
+            latency_budget_ms=latency_budget_ms,
+            include_categories=include_categories,
         )
+        
+    except Exception as e:
+        raise Exception(f"Error in retrieve_subsidies: {str(e)}")
 
+async def aretrieve_subsidies_for_request(
+    user_input: str,
+    categories: dict = None,
+    collection_name: str = DEFAULT_COLLECTION_NAME,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS,
+    include_categories: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    hybrid: HybridSearch = DEFAULT_HYBRID_SEARCH
+):
+    """
+    Retrieve subsidies for a free-text request, as a coroutine. include_national, regions and
+    status are extracted from the request with extract_parameters while the query is embedded
+    and searched speculatively; the extracted values are in result.metadata["parameters"].
+    """
 
-    elif embed_model == "openai":
-        embed_model = OpenAIEmbedding(
-            model="text-embedding-3-large",
-            api_key=OPENAI_API_KEY,
+    try:
+        retriever = get_subsidy_retriever(collection_name, embed_model, backend, hybrid)
+
+        return await retriever.aretrieve_with_extraction(
+            user_input,
+            extract_parameters,
+            categories=categories,
+            latency_budget_ms=latency_budget_ms,
+            include_categories=include_categories,
         )
 
-    Settings.embed_model = embed_model
+    except Exception as e:
+        raise Exception(f"Error in aretrieve_subsidies_for_request: {str(e)}")
+
+def retrieve_subsidies_for_request(
+    user_input: str,
+    categories: dict = None,
+    collection_name: str = DEFAULT_COLLECTION_NAME,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS,
+    include_categories: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    hybrid: HybridSearch = DEFAULT_HYBRID_SEARCH
+):
+    """
+    Retrieve subsidies for a free-text request (blocking). Parameter extraction, query embedding
+    and a speculative search run concurrently instead of one after the other.
+    """
 
     try:
-        # Convert the categories dict to CategorieSelectie model
-        category_filters = CategorieSelectie(**categories) if categories else None
-        
-        # Create must conditions list
-        must_conditions = []
-
-        # Build query_locations list
-        query_locations = []
-        if include_national:
-            query_locations.append('National')
-        if regions:
-            query_locations.extend(regions)
-
-        # Add location filter only if query_locations exist
-        if query_locations:
-            location_condition = FieldCondition(
-                key="Bereik",
-                match=MatchAny(any=query_locations)
-            )
-            must_conditions.append(location_condition)
-
-        # Add status filter if provided
-        if status:
-            status_condition = FieldCondition(
-                key="Status",
-                match=MatchAny(any=status)
-            )
-            must_conditions.append(status_condition)
-
-        # Create category conditions
-        category_conditions = []
-        if category_filters:
-            for main_category, subcategories in category_filters.model_dump().items():
-                if subcategories is None:
-                    continue
-                    
-                if isinstance(subcategories, dict):
-                    for sub_key, sub_value in subcategories.items():
-                        if isinstance(sub_value, dict):
-                            for nested_key, nested_value in sub_value.items():
-                                if nested_value is True:
-                                    category_conditions.append(
-                                        FieldCondition(
-                                            key=f"Categories.{main_category}.{sub_key}.{nested_key}",
-                                            match=MatchValue(value=True)
-                                        )
-                                    )
-                        elif sub_value is True:
-                            category_conditions.append(
-                                FieldCondition(
-                                    key=f"Categories.{main_category}.{sub_key}",
-                                    match=MatchValue(value=True)
-                                )
-                            )
-
-        # Add category filter if conditions exist
-        if category_conditions:
-            must_conditions.append(
-                Filter(should=category_conditions)
-            )
-
-        # Create final combined filter only if we have conditions
-        combined_filter = Filter(must=must_conditions) if must_conditions else None
-
-        print(f'combined_filter: {combined_filter}')
-
-        postprocessor = CohereRerank(
-            top_n=10,
-            model="rerank-v3.5",
-            api_key=cohere_api_key,
+        retriever = get_subsidy_retriever(collection_name, embed_model, backend, hybrid)
+
+        return retriever.retrieve_with_extraction(
+            user_input,
+            extract_parameters,
+            categories=categories,
+            latency_budget_ms=latency_budget_ms,
+            include_categories=include_categories,
         )
 
-        client = QdrantClient(url="https://afe80cce-90ed-4adc-9aa5-f830cf036737.eu-west-1-0.aws.cloud.qdrant.io:6333",
-                            api_key=qdrant_api_key,
-                            timeout=3600)
-        
-        query_collection_name = collection_name
-        vector_store = QdrantVectorStore(
-                    query_collection_name, 
-                    client=client, 
-                    enable_hybrid=True)
+    except Exception as e:
+        raise Exception(f"Error in retrieve_subsidies_for_request: {str(e)}")
+
+def retrieve_subsidies_batch(
+    queries: List[str],
+    filters_per_query: List[dict] = None,
+    collection_name: str = DEFAULT_COLLECTION_NAME,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    rerank_concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+    include_categories: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    hybrid: HybridSearch = DEFAULT_HYBRID_SEARCH
+):
+    """
+    Retrieve subsidies for many queries (e.g. company descriptions in an offline matching job).
+    filters_per_query holds, per query, the include_national/regions/categories/status keyword
+    arguments of retrieve_subsidies (or None). Returns (reranked, dense) nodes per query, in input order.
+    """
 
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
+    try:
+        retriever = get_subsidy_retriever(collection_name, embed_model, backend, hybrid)
 
-        if combined_filter:
-            retriever = index.as_retriever(similarity_top_k=100, vector_store_kwargs={"qdrant_filters": combined_filter})
-        else:
-            retriever = index.as_retriever(similarity_top_k=100)
+        return retriever.retrieve_batch(
+            queries,
+            filters_per_query=filters_per_query,
+            rerank_concurrency=rerank_concurrency,
+            include_categories=include_categories,
+        )
 
-        nodes_embed = retriever.retrieve(user_input)
-        nodes_reranked = postprocessor.postprocess_nodes(nodes=nodes_embed, query_str=user_input)
+    except Exception as e:
+        raise Exception(f"Error in retrieve_subsidies_batch: {str(e)}")
+
+def retrieve_subsidies_fan_out(
+    user_input: str,
+    configurations: List[tuple],
+    include_national: bool = True,
+    regions: List[str] = None,
+    categories: dict = None,
+    status: List[str] = None,
+    latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS
+):
+    """
+    Run the same search against several (collection_name, embed_model) configurations concurrently,
+    e.g. to compare embedders side by side. Returns one RetrievalResult per configuration, in order,
+    with its elapsed_ms in result.metadata.
+    """
+
+    try:
+        return retrieve_fan_out(
+            user_input,
+            configurations,
+            include_national=include_national,
+            regions=regions,
+            categories=categories,
+            status=status,
+            latency_budget_ms=latency_budget_ms,
+        )
 
-        return nodes_reranked, nodes_embed
-        
     except Exception as e:
-        raise Exception(f"Error in retrieve_subsidies: {str(e)}")
+        raise Exception(f"Error in retrieve_subsidies_fan_out: {str(e)}")
 
 def check_nodes_for_subsidy(subsidy_titles: List[str], nodes: List[NodeWithScore]):
-    matching_nodes = []
-    for index, node in enumerate(nodes):
-        if node.node.metadata.get('title') in subsidy_titles:
-            matching_nodes.append((node.node.metadata.get('title'), index))
-    return matching_nodes if matching_nodes else []
+    """
+    (title, index) of every node whose title is one of subsidy_titles. For recall and MRR over a
+    golden set of queries, use agent.retrievers.evaluation.
+    """
+    wanted = set(subsidy_titles)
+    return [
+        (node.node.metadata.get('title'), index)
+        for index, node in enumerate(nodes)
+        if node.node.metadata.get('title') in wanted
+    ]
 
 
 
@@ -0,0 +1,138 @@
+import os
+import math
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Filter
+
+from agent.retrievers.filters import CATEGORY_BITS_FIELD, SubsidyFilterSpec
+from agent.retrievers.payload import CATEGORY_PAYLOAD_FIELD
+from agent.retrievers.result_cache import ResultCache, canonical_filter
+
+logger = logging.getLogger(__name__)
+
+# Set SEARCH_PLANNER=0 to always search the HNSW graph with the filter applied
+SEARCH_PLANNER_ENABLED = os.getenv('SEARCH_PLANNER', '1') != '0'
+
+# Filters matching at most this many points are searched exactly: scanning the matches is
+# cheaper and more accurate than walking the HNSW graph under a restrictive filter
+EXACT_SEARCH_MAX_POINTS = int(os.getenv('EXACT_SEARCH_MAX_POINTS', 2048))
+# Filters matching at least this share of the collection search the graph without the filter
+# and drop non-matching hits afterwards, fetching top_k / selectivity * oversampling candidates
+POST_FILTER_MIN_SELECTIVITY = 0.5
+POST_FILTER_OVERSAMPLING = 1.5
+POST_FILTER_MAX_LIMIT = 1000
+
+# Filter cardinalities are cached per collection epoch
+COUNT_CACHE_TTL_SECONDS = 300
+
+UNFILTERED = "unfiltered"
+EXACT = "exact"
+FILTERED_HNSW = "filtered_hnsw"
+POST_FILTER = "post_filter"
+# Exact search in the in-process LocalVectorIndex
+LOCAL_EXACT = "local_exact"
+# Candidates of a search started before the filters were known, filtered afterwards
+SPECULATIVE = "speculative"
+
+
+@dataclass(frozen=True)
+class SearchPlan:
+    """
+    How one filtered search is executed, with the cardinality estimate it was based on.
+    limit is the number of candidates to fetch from Qdrant.
+    """
+    strategy: str
+    limit: int
+    matches: Optional[int] = None
+    total: Optional[int] = None
+
+    @property
+    def selectivity(self) -> Optional[float]:
+        if self.matches is None or not self.total:
+            return None
+        return self.matches / self.total
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {"strategy": self.strategy, "matches": self.matches, "total": self.total}
+
+
+def post_filter_payload_fields(spec: SubsidyFilterSpec) -> List[str]:
+    """
+    Payload fields payload_matches() needs to evaluate the spec on a post-filtered hit.
+    The category leaves are only used for points written before the category bitset existed.
+    """
+    if not spec.leaves:
+        return ["Bereik", "Status"]
+    return ["Bereik", "Status", CATEGORY_BITS_FIELD] + [f"{CATEGORY_PAYLOAD_FIELD}.{leaf}" for leaf in sorted(spec.leaves)]
+
+
+class SearchPlanner:
+    """
+    Picks exact search, filtered HNSW or unfiltered search plus post-filtering for a filter,
+    from its cardinality. Cardinalities come from Qdrant count calls, cached per filter and
+    collection epoch, so a repeated filter costs no extra round trip and a new one costs one
+    (the collection and filter counts are issued concurrently).
+    """
+
+    def __init__(
+        self,
+        aclient: AsyncQdrantClient,
+        collection_name: str,
+        enabled: bool = SEARCH_PLANNER_ENABLED,
+        exact_max_points: int = EXACT_SEARCH_MAX_POINTS,
+        post_filter_min_selectivity: float = POST_FILTER_MIN_SELECTIVITY,
+    ):
+        self.aclient = aclient
+        self.collection_name = collection_name
+        self.enabled = enabled
+        self.exact_max_points = exact_max_points
+        self.post_filter_min_selectivity = post_filter_min_selectivity
+
+        self._counts = ResultCache(ttl_seconds=COUNT_CACHE_TTL_SECONDS, max_entries=4096)
+
+    async def acount(self, combined_filter: Optional[Filter], epoch: int) -> int:
+        """
+        Number of points matching the filter (the whole collection for None).
+        """
+        key = (canonical_filter(combined_filter), epoch)
+        count = self._counts.get(key)
+        if count is None:
+            response = await self.aclient.count(
+                collection_name=self.collection_name,
+                count_filter=combined_filter,
+                exact=True,
+            )
+            count = response.count
+            self._counts.put(key, count)
+        return count
+
+    async def aplan(self, combined_filter: Optional[Filter], top_k: int, epoch: int) -> SearchPlan:
+        """
+        Plan a search for the top_k nearest points matching the filter.
+        """
+        if combined_filter is None:
+            return SearchPlan(UNFILTERED, top_k)
+        if not self.enabled:
+            return SearchPlan(FILTERED_HNSW, top_k)
+
+        # The two counts run concurrently, so a new filter waits for one round trip instead of two
+        total, matches = await asyncio.gather(self.acount(None, epoch), self.acount(combined_filter, epoch))
+        selectivity = matches / total if total else 0.0
+
+        if matches <= self.exact_max_points:
+            plan = SearchPlan(EXACT, top_k, matches, total)
+        elif selectivity >= self.post_filter_min_selectivity:
+            limit = min(math.ceil(top_k / selectivity * POST_FILTER_OVERSAMPLING), POST_FILTER_MAX_LIMIT)
+            plan = SearchPlan(POST_FILTER, max(limit, top_k), matches, total)
+        else:
+            plan = SearchPlan(FILTERED_HNSW, top_k, matches, total)
+
+        logger.info(
+            f"search plan {plan.strategy} on {self.collection_name}: "
+            f"{matches}/{total} points match ({selectivity:.1%}), fetching {plan.limit}"
+        )
+        return plan
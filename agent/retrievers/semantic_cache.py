@@ -0,0 +1,214 @@
+import os
+import time
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+# Opt-in until the threshold has been tuned on live traffic with a verify rate
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE', '0') == '1'
+# Cosine similarity a previous query vector needs to serve its results for a new query
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.95))
+# Share of semantic hits that still run search and rerank, to measure how well cached results agree
+DEFAULT_VERIFY_RATE = float(os.getenv('SEMANTIC_CACHE_VERIFY_RATE', 0.0))
+DEFAULT_TTL_SECONDS = float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', 600))
+# Query vectors kept per partition (one compiled filter and engine configuration) and partitions kept
+DEFAULT_MAX_ENTRIES_PER_PARTITION = 1024
+DEFAULT_MAX_PARTITIONS = 256
+# Slots a new partition starts with; it doubles up to the maximum as entries arrive, so the many
+# partitions of rare filters stay small
+INITIAL_PARTITION_CAPACITY = 16
+# Lower edges of the similarity buckets agreement is reported in
+AGREEMENT_BUCKETS = (0.80, 0.85, 0.90, 0.95, 0.98, 0.99)
+
+
+@dataclass(frozen=True)
+class SemanticHit:
+    similarity: float
+    value: Any
+
+
+class _Partition:
+    """
+    Ring buffer of unit-length query vectors and the results stored with them, grown on demand
+    up to max_entries.
+    """
+
+    def __init__(self, dim: int, max_entries: int):
+        capacity = min(INITIAL_PARTITION_CAPACITY, max_entries)
+        self.max_entries = max_entries
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires = np.full(capacity, float("-inf"))
+        self.values: List[Any] = [None] * capacity
+        self.size = 0
+        self.next_slot = 0
+
+    def _grow(self) -> None:
+        capacity = min(len(self.values) * 2, self.max_entries)
+        vectors = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        expires = np.full(capacity, float("-inf"))
+        expires[:self.size] = self.expires[:self.size]
+        self.vectors = vectors
+        self.expires = expires
+        self.values.extend([None] * (capacity - len(self.values)))
+
+    def nearest(self, vector: np.ndarray, now: float) -> Optional[int]:
+        if self.size == 0:
+            return None
+        similarities = self.vectors[:self.size] @ vector
+        similarities[self.expires[:self.size] < now] = -np.inf
+        best = int(np.argmax(similarities))
+        return best if np.isfinite(similarities[best]) else None
+
+    def add(self, vector: np.ndarray, value: Any, expires: float) -> None:
+        # Slots are only reused once the buffer has grown to max_entries
+        if self.size == len(self.values) < self.max_entries:
+            self._grow()
+        slot = self.next_slot
+        self.vectors[slot] = vector
+        self.expires[slot] = expires
+        self.values[slot] = value
+        self.next_slot = (slot + 1) % self.max_entries
+        self.size = max(self.size, slot + 1)
+
+
+def result_agreement(cached_ids: List[str], fresh_ids: List[str]) -> float:
+    """
+    Share of the fresh result ids that the cached result also holds.
+    """
+    if not fresh_ids:
+        return 1.0 if not cached_ids else 0.0
+    return len(set(cached_ids) & set(fresh_ids)) / len(fresh_ids)
+
+
+class SemanticCache:
+    """
+    Serves a query from the results of an earlier query whose vector is close enough.
+
+    Results are partitioned by everything but the query text: the canonical filter, the engine
+    configuration and the collection epoch, so a hit only ever crosses wording, never filters.
+    Within a partition the nearest stored query vector is found with one exact dot product over
+    at most max_entries_per_partition unit vectors; above the threshold its results are served.
+    With verify_rate > 0 a sample of hits is also answered in full, and result_agreement() of the
+    cached and the fresh results is recorded per similarity bucket, so the threshold can be tuned.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        verify_rate: float = DEFAULT_VERIFY_RATE,
+        max_entries_per_partition: int = DEFAULT_MAX_ENTRIES_PER_PARTITION,
+        max_partitions: int = DEFAULT_MAX_PARTITIONS,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.verify_rate = verify_rate
+        self.max_entries_per_partition = max_entries_per_partition
+        self.max_partitions = max_partitions
+
+        self._partitions: "OrderedDict[Hashable, _Partition]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+        self.hits = 0
+        self.misses = 0
+        self.verified = 0
+        # Running sum and count of the agreement per similarity bucket
+        self._agreement_sums: Dict[float, float] = {bucket: 0.0 for bucket in AGREEMENT_BUCKETS}
+        self._agreement_counts: Dict[float, int] = {bucket: 0 for bucket in AGREEMENT_BUCKETS}
+
+    @staticmethod
+    def _unit(query_embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def get(self, partition_key: Hashable, query_embedding: List[float]) -> Optional[SemanticHit]:
+        vector = self._unit(query_embedding)
+        with self._lock:
+            partition = self._partitions.get(partition_key)
+            slot = None
+            if vector is not None and partition is not None and partition.vectors.shape[1] == len(vector):
+                slot = partition.nearest(vector, time.monotonic())
+            if slot is None:
+                self.misses += 1
+                return None
+
+            similarity = float(partition.vectors[slot] @ vector)
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self._partitions.move_to_end(partition_key)
+            self.hits += 1
+            return SemanticHit(similarity, partition.values[slot])
+
+    def put(self, partition_key: Hashable, query_embedding: List[float], value: Any) -> None:
+        vector = self._unit(query_embedding)
+        if vector is None:
+            return
+        with self._lock:
+            partition = self._partitions.get(partition_key)
+            if partition is None or partition.vectors.shape[1] != len(vector):
+                partition = _Partition(len(vector), self.max_entries_per_partition)
+                self._partitions[partition_key] = partition
+            self._partitions.move_to_end(partition_key)
+            partition.add(vector, value, time.monotonic() + self.ttl_seconds)
+            while len(self._partitions) > self.max_partitions:
+                self._partitions.popitem(last=False)
+
+    def should_verify(self) -> bool:
+        return self.verify_rate > 0 and self._random.random() < self.verify_rate
+
+    def record_agreement(self, similarity: float, cached_ids: List[str], fresh_ids: List[str]) -> float:
+        agreement = result_agreement(cached_ids, fresh_ids)
+        bucket = max((edge for edge in AGREEMENT_BUCKETS if similarity >= edge), default=AGREEMENT_BUCKETS[0])
+        with self._lock:
+            self.verified += 1
+            self._agreement_sums[bucket] += agreement
+            self._agreement_counts[bucket] += 1
+        return agreement
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partitions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters and the mean agreement of verified hits per similarity bucket.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "threshold": self.threshold,
+                "verified": self.verified,
+                "agreement": {
+                    bucket: self._agreement_sums[bucket] / count
+                    for bucket, count in self._agreement_counts.items() if count
+                },
+                "entries": sum(partition.size for partition in self._partitions.values()),
+            }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Return the process-wide semantic cache.
+    """
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
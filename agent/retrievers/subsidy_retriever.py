@@ -0,0 +1,1130 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import NodeWithScore
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Filter, QueryRequest, SearchParams, SparseVector
+
+from agent.retrievers.collection_versions import aread_collection_epoch
+from agent.retrievers.embedding_cache import get_embedding_cache, normalize_text
+from agent.retrievers.engine_loop import run_sync, run_on_engine_loop
+from agent.retrievers.filters import SubsidyFilterSpec, compile_subsidy_filter, payload_matches, subsidy_filter_spec
+from agent.retrievers.hybrid import (
+    DEFAULT_HYBRID_SEARCH,
+    SPARSE_VECTOR_NAME,
+    HybridSearch,
+    SparseQueryEncoder,
+    fuse,
+    get_sparse_encoder,
+)
+from agent.retrievers.latency_budget import LatencyBudget, DEFAULT_LATENCY_BUDGET_MS
+from agent.retrievers.local_backend import LocalVectorIndex
+from agent.retrievers.metrics import PROVIDER_UNITS, count, observe_candidates, record_retrieval
+from agent.retrievers.payload import payload_fields, points_to_nodes
+from agent.retrievers.reranking import (
+    CohereReranker,
+    DEFAULT_CHUNKS_PER_SUBSIDY,
+    DEFAULT_RERANK_INPUT_POLICY,
+    RerankInputPolicy,
+    approximate_tokens,
+    build_rerank_inputs,
+    group_by_subsidy,
+)
+from agent.retrievers.result_cache import get_result_cache, canonical_filter
+from agent.retrievers.semantic_cache import SEMANTIC_CACHE_ENABLED, SemanticCache, SemanticHit, get_semantic_cache
+from agent.retrievers.tracing import atraced
+from agent.retrievers.search_planner import (
+    SearchPlan,
+    SearchPlanner,
+    EXACT,
+    FILTERED_HNSW,
+    LOCAL_EXACT,
+    POST_FILTER,
+    POST_FILTER_MAX_LIMIT,
+    SPECULATIVE,
+    post_filter_payload_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+COHERE_API_KEY = os.getenv('COHERE_API_KEY')
+cohere_api_key = COHERE_API_KEY
+
+QDRANT_API_KEY = os.getenv('QDRANT_API_KEY')
+qdrant_api_key = QDRANT_API_KEY
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+QDRANT_URL = "https://afe80cce-90ed-4adc-9aa5-f830cf036737.eu-west-1-0.aws.cloud.qdrant.io:6333"
+# Backstop for a single Qdrant request; interactive searches are bounded tighter by their LatencyBudget
+QDRANT_TIMEOUT_SECONDS = int(os.getenv('QDRANT_TIMEOUT_SECONDS', 30))
+
+DEFAULT_COLLECTION_NAME = "vindsub_subsidies_2024_v1_cohere"
+DEFAULT_EMBED_MODEL = "cohere"
+
+# "qdrant" searches the Qdrant collection, "local" an in-process LocalVectorIndex loaded from
+# the latest vector snapshot in VECTOR_SNAPSHOT_DIR (written at ingest next to the documents)
+RETRIEVER_BACKENDS = ("qdrant", "local")
+DEFAULT_BACKEND = os.getenv('RETRIEVER_BACKEND', 'qdrant')
+VECTOR_SNAPSHOT_DIR = os.getenv('VECTOR_SNAPSHOT_DIR', "/Users/delonsaks/Documents/subsidies-dot-io/data/vindsubsidies")
+
+# Named dense vector written by QdrantVectorStore(enable_hybrid=True) at ingest
+DENSE_VECTOR_NAME = "text-dense"
+
+# Texts per embedding request, within each provider's limit
+EMBED_BATCH_SIZES = {"cohere": 96, "openai": 256}
+# Searches per Qdrant query_batch_points round trip
+SEARCH_BATCH_SIZE = 64
+# Default number of rerank calls in flight for batch retrieval
+DEFAULT_RERANK_CONCURRENCY = 8
+
+# A speculative search (started while the filters are still being extracted) fetches this many
+# times the dense top_k, so the extracted filters can usually be applied to its candidates
+SPECULATIVE_OVERSAMPLING = 4
+
+# How long the engine trusts its copy of the collection epoch before reading it again
+EPOCH_REFRESH_SECONDS = 10
+# How long a refresh may take before the engine keeps using its previous epoch
+EPOCH_READ_TIMEOUT_SECONDS = 1.0
+
+
+def build_embed_model(embed_model: str):
+    """
+    Build the query embedding model for the given provider name ("cohere" or "openai").
+    The provider integration is imported here, so only the embedders in use are ever loaded.
+    """
+    if embed_model == "cohere":
+        from llama_index.embeddings.cohere import CohereEmbedding
+
+        return CohereEmbedding(
+            api_key=cohere_api_key,
+            model_name="embed-english-v3.0",
+            input_type="search_query",
+            embed_batch_size=EMBED_BATCH_SIZES["cohere"],
+        )
+
+    if embed_model == "openai":
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        return OpenAIEmbedding(
+            model="text-embedding-3-large",
+            api_key=OPENAI_API_KEY,
+            embed_batch_size=EMBED_BATCH_SIZES["openai"],
+        )
+
+    raise ValueError(f"Unknown embed model: {embed_model}")
+
+
+@dataclass
+class RetrievalResult:
+    """
+    Nodes returned by one retrieval, with the configuration that produced them.
+    Unpacks like the (nodes_reranked, nodes_embed) tuple retrieve_subsidies used to return.
+    """
+    collection_name: str
+    embed_model: str
+    nodes_reranked: List[NodeWithScore]
+    nodes_embed: List[NodeWithScore]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __iter__(self):
+        return iter((self.nodes_reranked, self.nodes_embed))
+
+    def __getitem__(self, index):
+        return (self.nodes_reranked, self.nodes_embed)[index]
+
+
+def _documents_span_attributes(prefix: str, nodes: List[NodeWithScore]) -> Dict[str, Any]:
+    # Ids and scores only: the texts are in the collection and would dominate the exported volume
+    attributes = {}
+    for i, node in enumerate(nodes):
+        attributes[f"{prefix}.{i}.document.id"] = node.node.node_id
+        if node.score is not None:
+            attributes[f"{prefix}.{i}.document.score"] = node.score
+    return attributes
+
+
+def _search_span_attributes(found: Tuple[List[NodeWithScore], Optional[SearchPlan]]) -> Dict[str, Any]:
+    nodes, plan = found
+    attributes = _documents_span_attributes("retrieval.documents", nodes)
+    if plan is not None:
+        attributes["retrieval.search_plan"] = plan.strategy
+    return attributes
+
+
+def _result_span_attributes(result: RetrievalResult) -> Dict[str, Any]:
+    return {
+        "retrieval.results": len(result.nodes_reranked),
+        "retrieval.cached": result.metadata.get("cached", False),
+        "retrieval.degraded": result.metadata.get("degraded", False),
+        "retrieval.unreranked": result.metadata.get("unreranked", False),
+        "retrieval.timeouts": result.metadata.get("timeouts", []),
+    }
+
+
+class SubsidyRetriever:
+    """
+    Long-lived retrieval engine for one collection, embed model and backend.
+
+    The embed model, reranker and Qdrant client are built once in the constructor, so a
+    search only pays for the embed, search and rerank calls. Query embeddings go through
+    the shared two-tier EmbeddingCache and full results through the shared ResultCache,
+    keyed on the collection epoch written at ingest. The pipeline is async and runs on the shared
+    engine loop; retrieve() is the blocking wrapper around aretrieve().
+    With backend="local" the dense search runs in process on a LocalVectorIndex instead of Qdrant.
+    With a HybridSearch configuration the sparse vector is searched next to the dense one and the
+    two rankings are fused; the sparse query encoder is shared across engines.
+    Before reranking, the hits are grouped per subsidy down to chunks_per_subsidy chunks each and,
+    with a RerankInputPolicy, low-scoring candidates are dropped and documents cut to a token budget.
+    With a SemanticCache, a query whose vector is close to an earlier one under the same filter is
+    answered from that query's results once it has been embedded, skipping search and rerank.
+    Use get_subsidy_retriever() to share one engine per process.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = DEFAULT_COLLECTION_NAME,
+        embed_model: Union[str, BaseEmbedding] = DEFAULT_EMBED_MODEL,
+        similarity_top_k: int = 100,
+        rerank_top_n: int = 10,
+        aclient: Optional[AsyncQdrantClient] = None,
+        reranker: Optional[CohereReranker] = None,
+        backend: str = DEFAULT_BACKEND,
+        local_index: Optional[LocalVectorIndex] = None,
+        hybrid: Optional[HybridSearch] = DEFAULT_HYBRID_SEARCH,
+        sparse_encoder: Optional[SparseQueryEncoder] = None,
+        chunks_per_subsidy: int = DEFAULT_CHUNKS_PER_SUBSIDY,
+        rerank_inputs: Optional[RerankInputPolicy] = DEFAULT_RERANK_INPUT_POLICY,
+        semantic_cache: Optional[SemanticCache] = None,
+    ):
+        if backend not in RETRIEVER_BACKENDS:
+            raise ValueError(f"Unknown retriever backend: {backend}")
+        if hybrid is not None and backend == "local":
+            raise ValueError("Hybrid search needs the qdrant backend; vector snapshots hold no sparse vectors")
+
+        self.collection_name = collection_name
+        self.similarity_top_k = similarity_top_k
+        self.backend = backend
+        self.chunks_per_subsidy = chunks_per_subsidy
+        self.rerank_inputs = rerank_inputs
+
+        # Hybrid search fetches dense_top_k and sparse_top_k candidates and fuses them to similarity_top_k
+        self.hybrid = hybrid
+        self.sparse_encoder = None
+        self.dense_top_k = similarity_top_k
+        self.sparse_top_k = None
+        if hybrid is not None:
+            self.sparse_encoder = sparse_encoder or get_sparse_encoder(hybrid.sparse_model)
+            self.dense_top_k = hybrid.dense_top_k or similarity_top_k
+            self.sparse_top_k = hybrid.sparse_top_k or similarity_top_k
+
+        # The embed model belongs to this engine; the global llama_index Settings are never touched,
+        # so engines for different embedders can serve requests from any number of threads.
+        if isinstance(embed_model, str):
+            self.embed_model_name = embed_model
+            self.embed_model = build_embed_model(embed_model)
+        else:
+            self.embed_model_name = embed_model.model_name
+            self.embed_model = embed_model
+        self.embedding_cache = get_embedding_cache()
+
+        self.reranker = reranker or CohereReranker(
+            top_n=rerank_top_n,
+            model="rerank-v3.5",
+            api_key=cohere_api_key,
+        )
+
+        self.aclient = aclient or AsyncQdrantClient(url=QDRANT_URL,
+                                                    api_key=qdrant_api_key,
+                                                    timeout=QDRANT_TIMEOUT_SECONDS)
+
+        self.planner = SearchPlanner(self.aclient, collection_name)
+
+        self.local_index = None
+        if backend == "local":
+            self.local_index = local_index or LocalVectorIndex.load_latest(VECTOR_SNAPSHOT_DIR, collection_name)
+
+        self.result_cache = get_result_cache()
+        self.semantic_cache = semantic_cache or (get_semantic_cache() if SEMANTIC_CACHE_ENABLED else None)
+        self._epoch = 0
+        self._epoch_checked_at = float("-inf")
+
+    async def _acollection_epoch(self) -> int:
+        if self.local_index is not None:
+            return self.local_index.epoch
+
+        now = time.monotonic()
+        if now - self._epoch_checked_at > EPOCH_REFRESH_SECONDS:
+            try:
+                self._epoch = await asyncio.wait_for(
+                    aread_collection_epoch(self.aclient, self.collection_name),
+                    EPOCH_READ_TIMEOUT_SECONDS,
+                )
+                self._epoch_checked_at = now
+            except TimeoutError:
+                logger.warning(f"Reading the epoch of {self.collection_name} timed out, keeping epoch {self._epoch}")
+        return self._epoch
+
+    def _result_cache_key(
+        self,
+        user_input: str,
+        combined_filter: Optional[Filter],
+        epoch: int,
+        include_categories: bool = False,
+    ) -> tuple:
+        return (
+            normalize_text(user_input),
+            canonical_filter(combined_filter),
+            include_categories,
+            self.backend,
+            self.collection_name,
+            self.embed_model.model_name,
+            self.similarity_top_k,
+            self.hybrid,
+            self.chunks_per_subsidy,
+            self.rerank_inputs,
+            self.reranker.model,
+            self.reranker.top_n,
+            epoch,
+        )
+
+    def _result(self, nodes_reranked: List[NodeWithScore], nodes_embed: List[NodeWithScore], metadata: dict) -> RetrievalResult:
+        # Every result passes here, so this is where its stage timings and outcome are recorded
+        record_retrieval(metadata)
+        # Copy the lists so callers cannot modify what the result cache holds
+        return RetrievalResult(
+            collection_name=self.collection_name,
+            embed_model=self.embed_model_name,
+            nodes_reranked=list(nodes_reranked),
+            nodes_embed=list(nodes_embed),
+            metadata=metadata,
+        )
+
+    def _embedding_cache_key(self, user_input: str) -> str:
+        return self.embedding_cache.make_key(
+            self.embed_model.model_name,
+            getattr(self.embed_model, "input_type", None),
+            user_input,
+        )
+
+    async def _aembed_query(self, user_input: str) -> List[float]:
+        key = self._embedding_cache_key(user_input)
+        query_embedding = self.embedding_cache.get(key)
+        if query_embedding is None:
+            query_embedding = await self.embed_model.aget_query_embedding(user_input)
+            self.embedding_cache.put(key, query_embedding)
+            count(PROVIDER_UNITS, approximate_tokens(user_input), provider=self.embed_model_name, unit="approx_tokens")
+        return query_embedding
+
+    async def _aencode_query(self, user_input: str) -> Tuple[List[float], Optional[SparseVector]]:
+        # The sparse encoding overlaps with the dense embedding call
+        if self.sparse_encoder is None:
+            return await self._aembed_query(user_input), None
+        query_embedding, sparse_vector = await asyncio.gather(
+            self._aembed_query(user_input), self.sparse_encoder.aencode(user_input)
+        )
+        return query_embedding, sparse_vector
+
+    async def _asearch(
+        self,
+        query_embedding: List[float],
+        spec: SubsidyFilterSpec,
+        combined_filter: Optional[Filter],
+        epoch: int,
+        include_categories: bool = False,
+        sparse_vector: Optional[SparseVector] = None,
+    ) -> Tuple[List[NodeWithScore], SearchPlan]:
+        if self.local_index is not None:
+            return self._search_local(query_embedding, spec, include_categories)
+
+        plan = await self.planner.aplan(combined_filter, self.dense_top_k, epoch)
+        if sparse_vector is None:
+            return await self._aexecute_plan(plan, query_embedding, spec, combined_filter, include_categories)
+
+        (nodes_dense, plan), nodes_sparse = await asyncio.gather(
+            self._aexecute_plan(plan, query_embedding, spec, combined_filter, include_categories),
+            self._asearch_sparse(sparse_vector, combined_filter, include_categories),
+        )
+        return fuse(self.hybrid, nodes_dense, nodes_sparse, self.similarity_top_k), plan
+
+    async def _asearch_sparse(
+        self,
+        sparse_vector: SparseVector,
+        combined_filter: Optional[Filter],
+        include_categories: bool = False,
+    ) -> List[NodeWithScore]:
+        response = await self.aclient.query_points(
+            collection_name=self.collection_name,
+            query=sparse_vector,
+            using=SPARSE_VECTOR_NAME,
+            query_filter=combined_filter,
+            limit=self.sparse_top_k,
+            with_payload=payload_fields(include_categories),
+        )
+        return points_to_nodes(response.points, include_categories)
+
+    def _search_local(
+        self,
+        query_embedding: List[float],
+        spec: SubsidyFilterSpec,
+        include_categories: bool = False,
+    ) -> Tuple[List[NodeWithScore], SearchPlan]:
+        nodes = self.local_index.search(query_embedding, spec, self.dense_top_k, include_categories)
+        plan = SearchPlan(LOCAL_EXACT, self.dense_top_k, self.local_index.count(spec), len(self.local_index))
+        return nodes, plan
+
+    async def _aexecute_plan(
+        self,
+        plan: SearchPlan,
+        query_embedding: List[float],
+        spec: SubsidyFilterSpec,
+        combined_filter: Optional[Filter],
+        include_categories: bool = False,
+    ) -> Tuple[List[NodeWithScore], SearchPlan]:
+        if plan.strategy == POST_FILTER:
+            response = await self.aclient.query_points(
+                collection_name=self.collection_name,
+                query=query_embedding,
+                using=DENSE_VECTOR_NAME,
+                limit=plan.limit,
+                with_payload=payload_fields(include_categories) + post_filter_payload_fields(spec),
+            )
+            points = [point for point in response.points if payload_matches(spec, point.payload)]
+            if len(points) >= self.dense_top_k:
+                return points_to_nodes(points[:self.dense_top_k], include_categories), plan
+
+            # The candidates held too few matches; search again with the filter applied
+            logger.info(f"post-filter kept {len(points)}/{len(response.points)} hits, falling back to {FILTERED_HNSW}")
+            plan = SearchPlan(FILTERED_HNSW, self.dense_top_k, plan.matches, plan.total)
+
+        response = await self.aclient.query_points(
+            collection_name=self.collection_name,
+            query=query_embedding,
+            using=DENSE_VECTOR_NAME,
+            query_filter=combined_filter,
+            search_params=SearchParams(exact=plan.strategy == EXACT),
+            limit=self.dense_top_k,
+            with_payload=payload_fields(include_categories),
+        )
+        return points_to_nodes(response.points, include_categories), plan
+
+    async def _arerank(self, user_input: str, nodes_embed: List[NodeWithScore]) -> List[NodeWithScore]:
+        if self.rerank_inputs is None:
+            observe_candidates("rerank", len(nodes_embed))
+            return await self.reranker.arerank(user_input, nodes_embed)
+        candidates, texts = build_rerank_inputs(user_input, nodes_embed, self.rerank_inputs)
+        observe_candidates("rerank", len(candidates))
+        return await self.reranker.arerank(user_input, candidates, texts)
+
+    async def _aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        keys = [self._embedding_cache_key(query) for query in queries]
+        embeddings = {key: self.embedding_cache.get(key) for key in set(keys)}
+
+        # Embed each distinct uncached query once; the embed model splits them into provider-sized batches
+        missing = {key: query for key, query in zip(keys, queries) if embeddings[key] is None}
+        if missing:
+            missing_embeddings = await self.embed_model.aget_text_embedding_batch(list(missing.values()))
+            for key, query_embedding in zip(missing, missing_embeddings):
+                embeddings[key] = query_embedding
+                self.embedding_cache.put(key, query_embedding)
+            tokens = sum(approximate_tokens(query) for query in missing.values())
+            count(PROVIDER_UNITS, tokens, provider=self.embed_model_name, unit="approx_tokens")
+
+        return [embeddings[key] for key in keys]
+
+    async def _asearch_batch(
+        self,
+        query_embeddings: List[List[float]],
+        specs: List[SubsidyFilterSpec],
+        combined_filters: List[Optional[Filter]],
+        epoch: int,
+        include_categories: bool = False,
+        sparse_vectors: Optional[List[SparseVector]] = None,
+    ) -> Tuple[List[List[NodeWithScore]], List[SearchPlan]]:
+        if self.local_index is not None:
+            searches = [
+                self._search_local(query_embedding, spec, include_categories)
+                for query_embedding, spec in zip(query_embeddings, specs)
+            ]
+            return [nodes for nodes, _ in searches], [plan for _, plan in searches]
+
+        # Plan each distinct filter once. Batches only choose between exact and filtered HNSW search;
+        # post-filtering is not worth a second round trip for the queries it would leave short.
+        distinct_filters = {canonical_filter(combined_filter): combined_filter for combined_filter in combined_filters}
+        distinct_plans = await asyncio.gather(*[
+            self.planner.aplan(combined_filter, self.dense_top_k, epoch)
+            for combined_filter in distinct_filters.values()
+        ])
+        plans_by_filter = dict(zip(distinct_filters, distinct_plans))
+        plans = []
+        for combined_filter in combined_filters:
+            plan = plans_by_filter[canonical_filter(combined_filter)]
+            if plan.strategy == POST_FILTER:
+                plan = SearchPlan(FILTERED_HNSW, self.dense_top_k, plan.matches, plan.total)
+            plans.append(plan)
+
+        requests = [
+            QueryRequest(
+                query=query_embedding,
+                using=DENSE_VECTOR_NAME,
+                filter=combined_filter,
+                params=SearchParams(exact=plan.strategy == EXACT),
+                limit=self.dense_top_k,
+                with_payload=payload_fields(include_categories),
+            )
+            for query_embedding, combined_filter, plan in zip(query_embeddings, combined_filters, plans)
+        ]
+        # Sparse searches ride along in the same round trips, after the dense ones
+        if sparse_vectors is not None:
+            requests += [
+                QueryRequest(
+                    query=sparse_vector,
+                    using=SPARSE_VECTOR_NAME,
+                    filter=combined_filter,
+                    limit=self.sparse_top_k,
+                    with_payload=payload_fields(include_categories),
+                )
+                for sparse_vector, combined_filter in zip(sparse_vectors, combined_filters)
+            ]
+
+        responses = []
+        for start in range(0, len(requests), SEARCH_BATCH_SIZE):
+            responses.extend(await self.aclient.query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests[start:start + SEARCH_BATCH_SIZE],
+            ))
+        nodes_per_query = [points_to_nodes(response.points, include_categories) for response in responses]
+        if sparse_vectors is None:
+            return nodes_per_query, plans
+
+        n_queries = len(query_embeddings)
+        return [
+            fuse(self.hybrid, nodes_dense, nodes_sparse, self.similarity_top_k)
+            for nodes_dense, nodes_sparse in zip(nodes_per_query[:n_queries], nodes_per_query[n_queries:])
+        ], plans
+
+    async def _aretrieve_batch(
+        self,
+        queries: List[str],
+        filters_per_query: Optional[List[Optional[dict]]],
+        rerank_concurrency: int,
+        include_categories: bool = False,
+    ) -> List[RetrievalResult]:
+        if filters_per_query is None:
+            filters_per_query = [None] * len(queries)
+        if len(filters_per_query) != len(queries):
+            raise ValueError("filters_per_query must have one entry per query")
+
+        specs = [subsidy_filter_spec(**(filters or {})) for filters in filters_per_query]
+        combined_filters = [compile_subsidy_filter(spec) for spec in specs]
+        epoch = await self._acollection_epoch()
+        cache_keys = [
+            self._result_cache_key(query, combined_filter, epoch, include_categories)
+            for query, combined_filter in zip(queries, combined_filters)
+        ]
+        start = time.perf_counter()
+        results = [self.result_cache.get(cache_key) for cache_key in cache_keys]
+        cached = [result is not None for result in results]
+        plans: List[Optional[SearchPlan]] = [None] * len(queries)
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            pending_queries = [queries[i] for i in pending]
+            if self.sparse_encoder is None:
+                query_embeddings = await self._aembed_queries(pending_queries)
+                sparse_vectors = None
+            else:
+                query_embeddings, sparse_vectors = await asyncio.gather(
+                    self._aembed_queries(pending_queries), self.sparse_encoder.aencode_batch(pending_queries)
+                )
+            nodes_embed_per_query, pending_plans = await self._asearch_batch(
+                query_embeddings,
+                [specs[i] for i in pending],
+                [combined_filters[i] for i in pending],
+                epoch,
+                include_categories,
+                sparse_vectors,
+            )
+            for i, plan in zip(pending, pending_plans):
+                plans[i] = plan
+            nodes_embed_per_query = [
+                group_by_subsidy(nodes_embed, self.chunks_per_subsidy) for nodes_embed in nodes_embed_per_query
+            ]
+
+            semaphore = asyncio.Semaphore(rerank_concurrency)
+
+            async def rerank(i: int, nodes_embed: List[NodeWithScore]) -> List[NodeWithScore]:
+                async with semaphore:
+                    return await self._arerank(queries[i], nodes_embed)
+
+            nodes_reranked_per_query = await asyncio.gather(*[
+                rerank(i, nodes_embed) for i, nodes_embed in zip(pending, nodes_embed_per_query)
+            ])
+
+            for i, nodes_reranked, nodes_embed in zip(pending, nodes_reranked_per_query, nodes_embed_per_query):
+                results[i] = (nodes_reranked, nodes_embed)
+                self.result_cache.put(cache_keys[i], results[i])
+
+        batch_elapsed_ms = (time.perf_counter() - start) * 1000
+        return [
+            self._result(nodes_reranked, nodes_embed, {
+                "cached": is_cached,
+                "batch_elapsed_ms": batch_elapsed_ms,
+                "search_plan": plan.as_metadata() if plan else None,
+            })
+            for (nodes_reranked, nodes_embed), is_cached, plan in zip(results, cached, plans)
+        ]
+
+    def _budget_metadata(
+        self,
+        budget: LatencyBudget,
+        cached: bool,
+        unreranked: bool = False,
+        plan: Optional[SearchPlan] = None,
+    ) -> dict:
+        return {
+            "cached": cached,
+            "elapsed_ms": budget.elapsed_ms(),
+            **budget.metadata(),
+            "degraded": bool(budget.timeouts),
+            "unreranked": unreranked,
+            "search_plan": plan.as_metadata() if plan else None,
+        }
+
+    def _span_attributes(self, user_input: str) -> Dict[str, Any]:
+        return {
+            "input.value": user_input,
+            "retrieval.collection": self.collection_name,
+            "retrieval.embed_model": self.embed_model_name,
+        }
+
+    async def _aretrieve(
+        self,
+        user_input: str,
+        include_national: bool = True,
+        regions: List[str] = None,
+        categories: dict = None,
+        status: List[str] = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        # With tracing on, every retrieval is a trace of its own with the search and rerank as children
+        return await atraced(
+            "SubsidyRetriever.retrieve",
+            self._aretrieve_stages(user_input, include_national, regions, categories, status, latency_budget_ms,
+                                   include_categories),
+            "CHAIN",
+            self._span_attributes(user_input),
+            describe=_result_span_attributes,
+        )
+
+    async def _aretrieve_stages(
+        self,
+        user_input: str,
+        include_national: bool = True,
+        regions: List[str] = None,
+        categories: dict = None,
+        status: List[str] = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        spec = subsidy_filter_spec(include_national, regions, categories, status)
+        combined_filter = compile_subsidy_filter(spec)
+
+        logger.debug(f'combined_filter: {combined_filter}')
+
+        # The epoch refresh has its own timeout, so the budget starts after it
+        epoch = await self._acollection_epoch()
+        budget = LatencyBudget(latency_budget_ms)
+        cache_key = self._result_cache_key(user_input, combined_filter, epoch, include_categories)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            nodes_reranked, nodes_embed = cached
+            return self._result(nodes_reranked, nodes_embed, self._budget_metadata(budget, cached=True))
+
+        # An embed or search past its deadline is still awaited and skips the rerank; only when the
+        # call itself times out is there nothing to fall back to, and an empty result is returned
+        try:
+            query_embedding, sparse_vector = await budget.run("embed", self._aencode_query(user_input))
+            semantic_hit, semantic_result = self._semantic_lookup(cache_key, query_embedding, budget)
+            if semantic_result is not None:
+                return semantic_result
+            nodes_embed, plan = await budget.run("search", self._atraced_search(
+                self._asearch(query_embedding, spec, combined_filter, epoch, include_categories, sparse_vector)
+            ))
+        except TimeoutError:
+            logger.warning(f"{budget.timeouts[-1]} stage exceeded its latency budget on {self.collection_name}")
+            return self._result([], [], self._budget_metadata(budget, cached=False))
+
+        return await self._arerank_result(user_input, nodes_embed, plan, budget, cache_key, query_embedding, semantic_hit)
+
+    async def _arerank_result(
+        self,
+        user_input: str,
+        nodes_embed: List[NodeWithScore],
+        plan: SearchPlan,
+        budget: LatencyBudget,
+        cache_key: tuple,
+        query_embedding: Optional[List[float]] = None,
+        semantic_hit: Optional[SemanticHit] = None,
+    ) -> RetrievalResult:
+        nodes_embed = group_by_subsidy(nodes_embed, self.chunks_per_subsidy)
+
+        # A rerank that runs out of budget falls back to the dense ranking
+        try:
+            nodes_reranked = await budget.run("rerank", atraced(
+                "SubsidyRetriever.rerank",
+                self._arerank(user_input, nodes_embed),
+                "RERANKER",
+                {"reranker.query": user_input, "reranker.model_name": self.reranker.model,
+                 "reranker.top_k": self.reranker.top_n, "reranker.candidates": len(nodes_embed)},
+                describe=lambda nodes: _documents_span_attributes("reranker.output_documents", nodes),
+            ))
+            unreranked = False
+        except TimeoutError:
+            logger.warning(f"rerank stage exceeded its latency budget on {self.collection_name}, returning dense results")
+            nodes_reranked = nodes_embed[:self.reranker.top_n]
+            unreranked = True
+
+        # Degraded results are not cached, so the next request gets another chance at the full pipeline
+        if not budget.timeouts:
+            self.result_cache.put(cache_key, (nodes_reranked, nodes_embed))
+            if self.semantic_cache is not None and query_embedding is not None:
+                self.semantic_cache.put(cache_key[1:], query_embedding, (nodes_reranked, nodes_embed))
+
+        metadata = self._budget_metadata(budget, cached=False, unreranked=unreranked, plan=plan)
+        if semantic_hit is not None:
+            cached_ids = [node.node.node_id for node in semantic_hit.value[0]]
+            fresh_ids = [node.node.node_id for node in nodes_reranked]
+            metadata["semantic_cache"] = {
+                "similarity": semantic_hit.similarity,
+                "agreement": self.semantic_cache.record_agreement(semantic_hit.similarity, cached_ids, fresh_ids),
+            }
+        return self._result(nodes_reranked, nodes_embed, metadata)
+
+    def _semantic_lookup(
+        self,
+        cache_key: tuple,
+        query_embedding: List[float],
+        budget: LatencyBudget,
+    ) -> Tuple[Optional[SemanticHit], Optional[RetrievalResult]]:
+        """
+        Look up a close earlier query under the same filter and configuration (the result cache key
+        without the query text). Returns the hit and, unless the hit was sampled for verification,
+        the result to serve.
+        """
+        if self.semantic_cache is None:
+            return None, None
+        semantic_hit = self.semantic_cache.get(cache_key[1:], query_embedding)
+        if semantic_hit is None or self.semantic_cache.should_verify():
+            return semantic_hit, None
+        nodes_reranked, nodes_embed = semantic_hit.value
+        metadata = self._budget_metadata(budget, cached=True)
+        metadata["semantic_cache"] = {"similarity": semantic_hit.similarity}
+        return semantic_hit, self._result(nodes_reranked, nodes_embed, metadata)
+
+    async def _aspeculative_search(
+        self,
+        query_embedding: List[float],
+        coarse_spec: SubsidyFilterSpec,
+        include_categories: bool = False,
+    ) -> Tuple[list, int]:
+        limit = min(self.dense_top_k * SPECULATIVE_OVERSAMPLING, POST_FILTER_MAX_LIMIT)
+        response = await self.aclient.query_points(
+            collection_name=self.collection_name,
+            query=query_embedding,
+            using=DENSE_VECTOR_NAME,
+            query_filter=compile_subsidy_filter(coarse_spec),
+            limit=limit,
+            with_payload=payload_fields(include_categories) + post_filter_payload_fields(coarse_spec),
+        )
+        return response.points, limit
+
+    def _atraced_search(self, search: Awaitable[Tuple[List[NodeWithScore], SearchPlan]]):
+        return atraced("SubsidyRetriever.search", search, "RETRIEVER",
+                       {"retrieval.top_k": self.dense_top_k}, describe=_search_span_attributes)
+
+    def _speculative_matches(self, points: list, limit: int, spec: SubsidyFilterSpec) -> Tuple[list, SearchPlan, bool]:
+        """
+        Apply the filters to the speculative candidates. Returns the top matches, the plan and whether
+        the matches are complete: enough of them, or a short response, which holds every point
+        passing the coarse filter.
+        """
+        matches = [point for point in points if payload_matches(spec, point.payload)]
+        complete = len(matches) >= self.dense_top_k or len(points) < limit
+        return matches[:self.dense_top_k], SearchPlan(SPECULATIVE, limit, len(matches), len(points)), complete
+
+    async def _asearch_after_speculation(
+        self,
+        speculation: Optional[asyncio.Future],
+        query_embedding: List[float],
+        spec: SubsidyFilterSpec,
+        combined_filter: Optional[Filter],
+        epoch: int,
+        include_categories: bool = False,
+        sparse_vector: Optional[SparseVector] = None,
+    ) -> Tuple[List[NodeWithScore], SearchPlan]:
+        if speculation is not None:
+            points, limit = await speculation
+            matches, plan, complete = self._speculative_matches(points, limit, spec)
+            if complete:
+                return points_to_nodes(matches, include_categories), plan
+            logger.info(f"speculative search kept {len(matches)}/{len(points)} candidates, searching again with the filter")
+
+        return await self._asearch(query_embedding, spec, combined_filter, epoch, include_categories, sparse_vector)
+
+    def _speculative_fallback(
+        self,
+        speculation: Optional[asyncio.Future],
+        spec: SubsidyFilterSpec,
+        include_categories: bool = False,
+    ) -> Tuple[List[NodeWithScore], Optional[SearchPlan]]:
+        # No time is left to search again, so the matches among the speculative candidates are all there is
+        if speculation is None or not speculation.done() or speculation.cancelled() or speculation.exception():
+            return [], None
+        points, limit = speculation.result()
+        matches, plan, _ = self._speculative_matches(points, limit, spec)
+        return points_to_nodes(matches, include_categories), plan
+
+    async def _aretrieve_with_extraction(
+        self,
+        user_input: str,
+        extract_parameters: Callable[[str], tuple],
+        categories: dict = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        return await atraced(
+            "SubsidyRetriever.retrieve_with_extraction",
+            self._aretrieve_with_extraction_stages(user_input, extract_parameters, categories, latency_budget_ms,
+                                                   include_categories),
+            "CHAIN",
+            self._span_attributes(user_input),
+            describe=_result_span_attributes,
+        )
+
+    async def _aretrieve_with_extraction_stages(
+        self,
+        user_input: str,
+        extract_parameters: Callable[[str], tuple],
+        categories: dict = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        extract_started = time.perf_counter()
+        extraction = asyncio.ensure_future(asyncio.to_thread(extract_parameters, user_input))
+        speculation = None
+        try:
+            epoch = await self._acollection_epoch()
+            budget = LatencyBudget(latency_budget_ms)
+            try:
+                query_embedding, sparse_vector = await budget.run("embed", self._aencode_query(user_input))
+            except TimeoutError:
+                query_embedding = sparse_vector = None
+
+            # While the extractor is still busy, search with the category filter only
+            if query_embedding is not None and not extraction.done() and self.local_index is None and sparse_vector is None:
+                coarse_spec = subsidy_filter_spec(include_national=False, categories=categories)
+                speculation = asyncio.ensure_future(self._aspeculative_search(query_embedding, coarse_spec, include_categories))
+
+            # The filters are needed before the search deadline; past it, the request falls back to the
+            # default filters over whatever the speculative search found
+            extract_timeout = budget.remaining("search")
+            extract_timed_out = False
+            try:
+                if extract_timeout is None:
+                    include_national, regions, status = await extraction
+                else:
+                    include_national, regions, status = await asyncio.wait_for(extraction, max(extract_timeout, 0))
+            except TimeoutError:
+                logger.warning(f"parameter extraction exceeded its latency budget on {self.collection_name}, "
+                               f"using the default filters")
+                budget.timeouts.append("extract")
+                include_national = regions = status = None
+                extract_timed_out = True
+            extract_ms = (time.perf_counter() - extract_started) * 1000
+            parameters = {
+                "include_national": True if include_national is None else include_national,
+                "regions": regions,
+                "status": status,
+            }
+            spec = subsidy_filter_spec(parameters["include_national"], regions, categories, status)
+            combined_filter = compile_subsidy_filter(spec)
+
+            cache_key = self._result_cache_key(user_input, combined_filter, epoch, include_categories)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                result = self._result(*cached, self._budget_metadata(budget, cached=True))
+            elif query_embedding is None:
+                logger.warning(f"embed stage timed out on {self.collection_name}")
+                result = self._result([], [], self._budget_metadata(budget, cached=False))
+            else:
+                semantic_hit, result = self._semantic_lookup(cache_key, query_embedding, budget)
+            if result is None:
+                try:
+                    if extract_timed_out:
+                        nodes_embed, plan = self._speculative_fallback(speculation, spec, include_categories)
+                    else:
+                        nodes_embed, plan = await budget.run("search", self._atraced_search(self._asearch_after_speculation(
+                            speculation, query_embedding, spec, combined_filter, epoch, include_categories, sparse_vector
+                        )))
+                    result = await self._arerank_result(
+                        user_input, nodes_embed, plan, budget, cache_key, query_embedding, semantic_hit
+                    )
+                except TimeoutError:
+                    logger.warning(f"search stage exceeded its latency budget on {self.collection_name}")
+                    result = self._result([], [], self._budget_metadata(budget, cached=False))
+        finally:
+            for task in (extraction, speculation):
+                if task is not None and not task.done():
+                    task.cancel()
+
+        result.metadata.update({"parameters": parameters, "extract_ms": extract_ms})
+        return result
+
+    async def aretrieve(
+        self,
+        user_input: str,
+        include_national: bool = True,
+        regions: List[str] = None,
+        categories: dict = None,
+        status: List[str] = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        """
+        Retrieve subsidies based on query and filters without blocking the caller's event loop.
+        The result holds the reranked nodes, the dense nodes they were reranked from (at most
+        chunks_per_subsidy chunks per subsidy) and metadata such as elapsed_ms and whether it
+        came from the result cache.
+
+        latency_budget_ms bounds the whole retrieval (None for no bound) and is split across
+        the embed, search and rerank stages. An embed or search past its deadline still
+        completes, but leaves no time to rerank; when the rerank stage runs out of budget the
+        top dense results are returned with metadata["unreranked"] set. Either way
+        metadata["degraded"] is set and metadata["timeouts"] names the stage, next to the
+        per-stage timings in metadata["stage_ms"].
+
+        Search results carry only the payload needed to show a subsidy; set include_categories
+        to also fetch the Categories tree into node.metadata.
+        """
+        return await run_on_engine_loop(
+            self._aretrieve(user_input, include_national, regions, categories, status, latency_budget_ms, include_categories)
+        )
+
+    def retrieve(
+        self,
+        user_input: str,
+        include_national: bool = True,
+        regions: List[str] = None,
+        categories: dict = None,
+        status: List[str] = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        """
+        Blocking version of aretrieve().
+        """
+        return run_sync(
+            self._aretrieve(user_input, include_national, regions, categories, status, latency_budget_ms, include_categories)
+        )
+
+    async def aretrieve_with_extraction(
+        self,
+        user_input: str,
+        extract_parameters: Callable[[str], tuple],
+        categories: dict = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        """
+        Retrieve subsidies for a request whose include_national, regions and status filters still
+        have to be extracted from it, e.g. by an LLM.
+
+        extract_parameters(user_input) runs in a worker thread while the query is embedded. If
+        it is still running by then, a speculative search with only the category filter fetches
+        SPECULATIVE_OVERSAMPLING times the candidates. Once the filters are known they are
+        applied to those candidates, and the collection is only searched again when too few of
+        them match. The latency approaches max(extract, embed + search) rather than the sum.
+        Extraction has until the search stage's deadline. If it takes longer, the default filters
+        are applied to the speculative candidates (an empty result without them), and "extract" is
+        recorded in metadata["timeouts"].
+
+        Args:
+            user_input (str): The user's request
+            extract_parameters (Callable[[str], tuple]): Returns (include_national, regions, status)
+                for the request, None for unspecified values
+            categories (dict): Category selection, known up front
+            latency_budget_ms (Optional[float]): Bound on the whole retrieval, extraction included
+            include_categories (bool): Also fetch the Categories tree into node.metadata
+
+        Returns:
+            RetrievalResult: As aretrieve(), with the extracted filters in metadata["parameters"]
+                and the extraction time in metadata["extract_ms"]
+        """
+        return await run_on_engine_loop(
+            self._aretrieve_with_extraction(user_input, extract_parameters, categories, latency_budget_ms, include_categories)
+        )
+
+    def retrieve_with_extraction(
+        self,
+        user_input: str,
+        extract_parameters: Callable[[str], tuple],
+        categories: dict = None,
+        latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+        include_categories: bool = False,
+    ) -> RetrievalResult:
+        """
+        Blocking version of aretrieve_with_extraction().
+        """
+        return run_sync(
+            self._aretrieve_with_extraction(user_input, extract_parameters, categories, latency_budget_ms, include_categories)
+        )
+
+    async def aretrieve_batch(
+        self,
+        queries: List[str],
+        filters_per_query: Optional[List[Optional[dict]]] = None,
+        rerank_concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+        include_categories: bool = False,
+    ) -> List[RetrievalResult]:
+        """
+        Retrieve subsidies for many queries at once.
+
+        Uncached queries are embedded in provider-sized batches and searched with one
+        query_batch_points round trip per SEARCH_BATCH_SIZE queries, then reranked with at
+        most rerank_concurrency rerank calls in flight.
+
+        Args:
+            queries (List[str]): The search texts
+            filters_per_query (Optional[List[Optional[dict]]]): Per query, the keyword arguments
+                of retrieve() (include_national, regions, categories, status), or None for the defaults
+            rerank_concurrency (int): Maximum number of concurrent rerank calls
+            include_categories (bool): Also fetch the Categories tree into node.metadata
+
+        Returns:
+            List[RetrievalResult]: One result per query, in input order
+        """
+        return await run_on_engine_loop(
+            self._aretrieve_batch(queries, filters_per_query, rerank_concurrency, include_categories)
+        )
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        filters_per_query: Optional[List[Optional[dict]]] = None,
+        rerank_concurrency: int = DEFAULT_RERANK_CONCURRENCY,
+        include_categories: bool = False,
+    ) -> List[RetrievalResult]:
+        """
+        Blocking version of aretrieve_batch().
+        """
+        return run_sync(
+            self._aretrieve_batch(queries, filters_per_query, rerank_concurrency, include_categories)
+        )
+
+
+_retrievers: Dict[Tuple[str, str, str, Optional[HybridSearch], int, int], SubsidyRetriever] = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_subsidy_retriever(
+    collection_name: str = DEFAULT_COLLECTION_NAME,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    backend: str = DEFAULT_BACKEND,
+    hybrid: Optional[HybridSearch] = DEFAULT_HYBRID_SEARCH,
+    similarity_top_k: int = 100,
+    rerank_top_n: int = 10,
+) -> SubsidyRetriever:
+    """
+    Return the process-wide engine for a collection, embed model, backend, hybrid configuration
+    and result sizes, building it on first use.
+    """
+    key = (collection_name, embed_model, backend, hybrid, similarity_top_k, rerank_top_n)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        with _retrievers_lock:
+            retriever = _retrievers.get(key)
+            if retriever is None:
+                retriever = SubsidyRetriever(
+                    collection_name,
+                    embed_model,
+                    similarity_top_k=similarity_top_k,
+                    rerank_top_n=rerank_top_n,
+                    backend=backend,
+                    hybrid=hybrid,
+                )
+                _retrievers[key] = retriever
+    return retriever
+
+
+def register_subsidy_retriever(retriever: SubsidyRetriever) -> None:
+    """
+    Make get_subsidy_retriever() (and so retrieve_subsidies and friends) return a prebuilt engine
+    for its collection, embed model name, backend, hybrid configuration and result sizes, e.g. an
+    engine with offline fakes or its own Qdrant client.
+    """
+    key = (
+        retriever.collection_name,
+        retriever.embed_model_name,
+        retriever.backend,
+        retriever.hybrid,
+        retriever.similarity_top_k,
+        retriever.reranker.top_n,
+    )
+    with _retrievers_lock:
+        _retrievers[key] = retriever
+
+
+async def aretrieve_fan_out(
+    user_input: str,
+    configurations: List[Tuple[str, str]],
+    include_national: bool = True,
+    regions: List[str] = None,
+    categories: dict = None,
+    status: List[str] = None,
+    latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+) -> List[RetrievalResult]:
+    """
+    Run the same search against several (collection_name, embed_model) configurations concurrently.
+
+    The searches overlap on the engine loop, so the total cost is close to the slowest
+    configuration rather than the sum. Each configuration gets its own latency budget and
+    each result carries its own elapsed_ms and degradation flags in its metadata.
+
+    Returns:
+        List[RetrievalResult]: One result per configuration, in the given order
+    """
+    engines = [get_subsidy_retriever(collection_name, embed_model) for collection_name, embed_model in configurations]
+
+    async def gather():
+        return await asyncio.gather(*[
+            engine._aretrieve(user_input, include_national, regions, categories, status, latency_budget_ms)
+            for engine in engines
+        ])
+
+    return await run_on_engine_loop(gather())
+
+
+def retrieve_fan_out(
+    user_input: str,
+    configurations: List[Tuple[str, str]],
+    include_national: bool = True,
+    regions: List[str] = None,
+    categories: dict = None,
+    status: List[str] = None,
+    latency_budget_ms: Optional[float] = DEFAULT_LATENCY_BUDGET_MS,
+) -> List[RetrievalResult]:
+    """
+    Blocking version of aretrieve_fan_out().
+    """
+    return run_sync(
+        aretrieve_fan_out(user_input, configurations, include_national, regions, categories, status, latency_budget_ms)
+    )
@@ -0,0 +1,277 @@
+"""
+Opt-in Phoenix tracing for the retrieval engine and its LlamaIndex and OpenAI calls.
+
+Nothing is registered or instrumented on import. Applications call init_tracing() once at
+startup; the Phoenix, OpenTelemetry and OpenInference packages are only imported when tracing is
+enabled. Each retrieval is then the root span of its trace, with child spans for the search and
+rerank stages (atraced) next to the spans of the instrumented embedding and LLM calls.
+
+Spans leave the request path quickly: attribute values are truncated when they are set, ended
+spans are held per trace by a TailSamplingSpanProcessor until the trace's root span ends, and
+the traces it keeps (a sampled share, plus every slow or failed one) go to a BatchSpanProcessor
+that exports from a background thread through a bounded queue.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PHOENIX_API_KEY = os.getenv('PHOENIX_API_KEY')
+# Tracing is on by default wherever a Phoenix API key is configured; TRACING=0/1 overrides that
+TRACING_ENABLED = os.getenv('TRACING', '1' if PHOENIX_API_KEY else '0') == '1'
+PHOENIX_ENDPOINT = os.getenv('PHOENIX_COLLECTOR_ENDPOINT', "https://app.phoenix.arize.com/v1/traces")
+PHOENIX_PROJECT_NAME = os.getenv('PHOENIX_PROJECT_NAME', "my-llm-app")
+
+
+@dataclass(frozen=True)
+class TraceExportPolicy:
+    """
+    Which traces are exported, how large their attributes may be and how they are batched.
+
+    head_sample_ratio decides at the root span whether a trace is recorded at all; unrecorded
+    traces cost next to nothing but are lost even when slow or failing. Of the recorded traces,
+    sample_ratio are exported, plus every trace whose root took slow_ms or longer or that holds
+    a span with an error status.
+    """
+    sample_ratio: float = 0.1
+    head_sample_ratio: float = 1.0
+    slow_ms: float = 3000.0
+    max_attribute_length: int = 4096
+    # Enough for the id, content and metadata of 100 retrieved documents
+    max_attributes: int = 512
+    hide_embedding_vectors: bool = True
+    # Traces waiting for their root span, and spans kept per trace
+    max_pending_traces: int = 512
+    max_spans_per_trace: int = 256
+    # BatchSpanProcessor: spans queued for export (newer spans are dropped when full), spans per
+    # export request and the delay between exports
+    max_queue_size: int = 2048
+    max_export_batch_size: int = 256
+    schedule_delay_ms: float = 2000.0
+
+
+DEFAULT_TRACE_EXPORT_POLICY = TraceExportPolicy(
+    sample_ratio=float(os.getenv('TRACE_SAMPLE_RATIO', 0.1)),
+    head_sample_ratio=float(os.getenv('TRACE_HEAD_SAMPLE_RATIO', 1.0)),
+    slow_ms=float(os.getenv('TRACE_SLOW_MS', 3000)),
+    max_attribute_length=int(os.getenv('TRACE_MAX_ATTRIBUTE_LENGTH', 4096)),
+)
+
+_TRACE_ID_LIMIT = 2 ** 64
+
+OPENINFERENCE_SPAN_KIND = "openinference.span.kind"
+
+
+def _trace_id_sampled(trace_id: int, ratio: float) -> bool:
+    # Same rule as OpenTelemetry's TraceIdRatioBased sampler: the low 64 bits against the ratio
+    return (trace_id & (_TRACE_ID_LIMIT - 1)) < round(ratio * _TRACE_ID_LIMIT)
+
+
+class TailSamplingSpanProcessor:
+    """
+    Span processor that decides per trace, once its root span has ended, whether to export it.
+
+    Ended spans are buffered per trace id. When the local root ends, the trace is passed on to
+    the export processor if it is slow, holds an error, or its trace id falls in sample_ratio;
+    otherwise its spans are dropped. The buffer is bounded by max_pending_traces (the oldest
+    incomplete trace is evicted) and max_spans_per_trace.
+    """
+
+    def __init__(self, export_processor: Any, policy: TraceExportPolicy = DEFAULT_TRACE_EXPORT_POLICY):
+        from opentelemetry.trace import StatusCode
+
+        self.export_processor = export_processor
+        self.policy = policy
+        self._error_status = StatusCode.ERROR
+
+        self._pending: "OrderedDict[int, List[Any]]" = OrderedDict()
+        self._errors = set()
+        self._lock = threading.Lock()
+
+        self.kept_traces = 0
+        self.dropped_traces = 0
+        self.evicted_traces = 0
+        self.kept_spans = 0
+
+    def on_start(self, span: Any, parent_context: Any = None) -> None:
+        pass
+
+    def _on_ending(self, span: Any) -> None:
+        pass
+
+    def on_end(self, span: Any) -> None:
+        trace_id = span.context.trace_id
+        is_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            spans = self._pending.get(trace_id)
+            if spans is None:
+                spans = self._pending[trace_id] = []
+                if len(self._pending) > self.policy.max_pending_traces:
+                    evicted_id, _ = self._pending.popitem(last=False)
+                    self._errors.discard(evicted_id)
+                    self.evicted_traces += 1
+            if len(spans) < self.policy.max_spans_per_trace:
+                spans.append(span)
+            if span.status.status_code is self._error_status:
+                self._errors.add(trace_id)
+            if not is_root:
+                return
+
+            del self._pending[trace_id]
+            failed = trace_id in self._errors
+            self._errors.discard(trace_id)
+            duration_ms = (span.end_time - span.start_time) / 1e6
+            keep = failed or duration_ms >= self.policy.slow_ms or _trace_id_sampled(trace_id, self.policy.sample_ratio)
+            if keep:
+                self.kept_traces += 1
+                self.kept_spans += len(spans)
+            else:
+                self.dropped_traces += 1
+
+        # Outside the lock: the export processor only enqueues
+        if keep:
+            for ended in spans:
+                self.export_processor.on_end(ended)
+
+    def shutdown(self) -> None:
+        self.export_processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.export_processor.force_flush(timeout_millis)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "kept_traces": self.kept_traces,
+                "dropped_traces": self.dropped_traces,
+                "evicted_traces": self.evicted_traces,
+                "kept_spans": self.kept_spans,
+                "pending_traces": len(self._pending),
+            }
+
+
+def build_tracer_provider(
+    endpoint: str = PHOENIX_ENDPOINT,
+    project_name: str = PHOENIX_PROJECT_NAME,
+    policy: TraceExportPolicy = DEFAULT_TRACE_EXPORT_POLICY,
+    span_exporter: Optional[Any] = None,
+) -> Any:
+    """
+    Build a Phoenix tracer provider with the sampling, truncation and batching of the policy.
+
+    Args:
+        endpoint (str): OTLP/HTTP traces endpoint, used when no span_exporter is given
+        project_name (str): Phoenix project the spans are recorded under
+        policy (TraceExportPolicy): Sampling, attribute and export limits
+        span_exporter (Optional[SpanExporter]): Exporter to use instead of Phoenix's HTTP exporter
+
+    Returns:
+        TracerProvider: The provider; it is not installed as the global provider
+    """
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import SpanLimits
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    from phoenix.otel import PROJECT_NAME, HTTPSpanExporter, TracerProvider
+
+    # Truncation is intended; the SDK would otherwise log a warning per truncated value on the request path
+    logging.getLogger("opentelemetry.attributes").setLevel(logging.ERROR)
+    tracer_provider = TracerProvider(
+        resource=Resource.create({PROJECT_NAME: project_name}),
+        sampler=ParentBased(TraceIdRatioBased(policy.head_sample_ratio)),
+        span_limits=SpanLimits(max_attributes=policy.max_attributes, max_attribute_length=policy.max_attribute_length),
+        verbose=False,
+    )
+    export_processor = BatchSpanProcessor(
+        span_exporter or HTTPSpanExporter(endpoint=endpoint),
+        max_queue_size=policy.max_queue_size,
+        max_export_batch_size=policy.max_export_batch_size,
+        schedule_delay_millis=policy.schedule_delay_ms,
+    )
+    tracer_provider.add_span_processor(TailSamplingSpanProcessor(export_processor, policy))
+    return tracer_provider
+
+
+_tracer_provider = None
+_tracing_lock = threading.Lock()
+# Tracer of the engine's own spans; None while tracing is off, so atraced() costs one await
+_retrieval_tracer = None
+
+
+def set_retrieval_tracer_provider(tracer_provider: Optional[Any]) -> None:
+    """
+    Record the retrieval engine's spans with tracer_provider, or stop recording them with None.
+    init_tracing() does this for the provider it installs.
+    """
+    global _retrieval_tracer
+    _retrieval_tracer = tracer_provider.get_tracer(__name__) if tracer_provider is not None else None
+
+
+async def atraced(
+    name: str,
+    coro: Awaitable[Any],
+    kind: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    describe: Optional[Callable[[Any], Dict[str, Any]]] = None,
+) -> Any:
+    """
+    Await coro inside a span: a child of the current span, or the root of a new trace.
+
+    Args:
+        name (str): Span name
+        coro (Awaitable): The work the span covers
+        kind (str): OpenInference span kind, e.g. CHAIN, RETRIEVER or RERANKER
+        attributes (Optional[Dict[str, Any]]): Attributes known when the span starts
+        describe (Optional[Callable]): Attributes of the result, added when coro is done
+
+    Returns:
+        Any: The result of coro
+    """
+    tracer = _retrieval_tracer
+    if tracer is None:
+        return await coro
+    with tracer.start_as_current_span(name, attributes={OPENINFERENCE_SPAN_KIND: kind, **(attributes or {})}) as span:
+        result = await coro
+        if describe is not None and span.is_recording():
+            span.set_attributes(describe(result))
+        return result
+
+
+def init_tracing(enabled: Optional[bool] = None, policy: TraceExportPolicy = DEFAULT_TRACE_EXPORT_POLICY) -> Optional[Any]:
+    """
+    Install the Phoenix tracer provider and instrument LlamaIndex and OpenAI, once per process.
+
+    Args:
+        enabled (Optional[bool]): Overrides the TRACING setting
+        policy (TraceExportPolicy): Sampling, attribute and export limits
+
+    Returns:
+        Optional[TracerProvider]: The tracer provider, or None when tracing is disabled
+    """
+    global _tracer_provider
+    if not (TRACING_ENABLED if enabled is None else enabled):
+        return None
+
+    with _tracing_lock:
+        if _tracer_provider is None:
+            from opentelemetry import trace as trace_api
+            from openinference.instrumentation import TraceConfig
+            from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
+            from openinference.instrumentation.openai import OpenAIInstrumentor
+
+            os.environ["PHOENIX_CLIENT_HEADERS"] = f"api_key={PHOENIX_API_KEY}"
+            tracer_provider = build_tracer_provider(PHOENIX_ENDPOINT, PHOENIX_PROJECT_NAME, policy)
+            trace_api.set_tracer_provider(tracer_provider)
+
+            config = TraceConfig(hide_embedding_vectors=policy.hide_embedding_vectors)
+            LlamaIndexInstrumentor().instrument(tracer_provider=tracer_provider, config=config)
+            OpenAIInstrumentor().instrument(tracer_provider=tracer_provider, config=config)
+            set_retrieval_tracer_provider(tracer_provider)
+            _tracer_provider = tracer_provider
+            logger.info(f"Tracing to {PHOENIX_ENDPOINT} as project {PHOENIX_PROJECT_NAME}, "
+                        f"sampling {policy.sample_ratio:.0%} plus traces slower than {policy.slow_ms:.0f} ms or failing")
+    return _tracer_provider
@@ -2,14 +2,6 @@ from typing import List, Optional, Literal
 import os
 from pydantic import BaseModel, Field
 
-from llama_index.core import Settings, Document, VectorStoreIndex, StorageContext
-
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from llama_index.embeddings.cohere import CohereEmbedding
-from llama_index.core.vector_stores import MetadataFilter, MetadataFilters, FilterOperator
-
-from qdrant_client import QdrantClient
-
 from agent.tools.subsidy_report_parameters import RegionEnum, StatusEnum, REGIONS, STATUS
 from agent.tools.utils import check_regions
 
@@ -768,81 +760,62 @@ class CategorieSelectie(BaseModel):
     #     }
 
 
+# The collection and result count the tool has always searched: the 100 closest subsidies, now
+# in rerank order
+TOOL_COLLECTION_NAME = "vindsub_subsidies_2024_v1"
+TOOL_TOP_K = 100
+# Searched for when the tool is called with filters only (SubsidyReportParameters has no free text);
+# a blank query, so the filters alone select the subsidies
+DEFAULT_TOOL_QUERY = " "
+
+
 def query_subsidies(
         include_national: bool = True,
         regions: List[str] = REGIONS,
         status: List[str] = STATUS,
+        user_input: Optional[str] = None,
         ) -> str:
     """Use this tool to query a database of subsidies using descriptive attributes and provide those subsidies. 
     The descriptive attributes must be from provided information and not prior knowledge."""
     
+    # imported here because the retriever imports the models defined in this module
+    from agent.retrievers.subsidy_retriever import get_subsidy_retriever
+
     # input checking
     regions = check_regions(regions)
 
-    filters = []
-
-    query_locations = []
-    if include_national:
-        query_locations.append('National')
-    if regions:
-        query_locations.extend(regions)
-
-    if query_locations:
-        filters.append(MetadataFilter(key="Bereik", operator=FilterOperator.IN, value=query_locations))
-
-    if status:
-        filters.append(MetadataFilter(key="Status", operator=FilterOperator.IN, value=status))
-
-    filters_db = MetadataFilters(filters=filters) if filters else None
-
-    # embed model
-    embed_model = CohereEmbedding(
-        api_key=cohere_api_key,
-        model_name="embed-english-v3.0",
-        input_type="search_query",
+    # the process-wide engine keeps its clients and models between tool calls
+    retriever = get_subsidy_retriever(TOOL_COLLECTION_NAME, similarity_top_k=TOOL_TOP_K, rerank_top_n=TOOL_TOP_K)
+    result = retriever.retrieve(
+        user_input or DEFAULT_TOOL_QUERY,
+        include_national=include_national,
+        regions=regions,
+        status=status,
     )
-    Settings.embed_model = embed_model
-
-    # creates a persistant index to disk
-    client = QdrantClient(url="https://afe80cce-90ed-4adc-9aa5-f830cf036737.eu-west-1-0.aws.cloud.qdrant.io:6333",
-                          api_key=qdrant_api_key,
-                          timeout=3600)
-    
-    query_collection_name = "vindsub_subsidies_2024_v1"
-    vector_store = QdrantVectorStore(
-                query_collection_name, 
-                client=client, 
-                enable_hybrid=True)
-
-    index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-
-    if filters_db:
-        retriever = index.as_retriever(similarity_top_k=100, filters=filters_db)
-    else:
-        retriever = index.as_retriever(similarity_top_k=100)
-
-    # if player_description:
-    #     nodes = retriever.retrieve(player_description)
-    #     nodes = st.session_state.postprocessor.postprocess_nodes(nodes=nodes, query_str=player_description)
-    # else:
-    #     nodes = retriever.retrieve(' ')
+    nodes, _ = result
 
     output_parts = [
         f"""
-        <player_evaluation>
-        The player evaluation done by the scout named <scout_name>{node.metadata['scout']}</scout_name> for the baseball player named <player_name>{node.metadata['player_name']}</player_name> is shown here:
-        date of evaluation: {node.metadata['last_seen']}
-        draft_year: {node.metadata['draft_year']}
-        position: {node.metadata['pos']}
-        dollar_value_range: {node.metadata['value_range']}
-        school_level: {node.metadata['school_level']}
+        <subsidy>
+        title: {node.metadata.get('title', '')}
+        status: {node.metadata.get('Status', '')}
+        bereik: {node.metadata.get('Bereik', '')}
+        deadline: {node.metadata.get('Deadline', '')}
+        minimale_bijdrage: {node.metadata.get('Minimale bijdrage', '')}
+        maximale_bijdrage: {node.metadata.get('Maximale bijdrage', '')}
+        budget: {node.metadata.get('Budget', '')}
         summary: {node.text}
-        </player_evaluation>
+        </subsidy>
         """.strip()
         for node in nodes
     ]
 
     output = '\n\n'.join(output_parts)
-    output_message = f'The following player evaluations were retrieved:\n\n{output}'
-
-    return output_message
\ No newline at end of file
+    output_message = f'The following subsidies were retrieved:\n\n{output}'
+    # tell the agent when the search ran out of time, so it does not present the list as complete
+    if result.metadata.get('degraded'):
+        output_message += ('\n\nNote: the search exceeded its time limit '
+                           f"({', '.join(result.metadata.get('timeouts', []))}), "
+                           'so these results may be incomplete or not ranked by relevance.')
+
+    return output_message
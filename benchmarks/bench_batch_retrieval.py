@@ -0,0 +1,55 @@
+"""
+Throughput of retrieve_batch() against a loop of retrieve() calls.
+
+Each mode gets its own distinct queries so neither is served from the result or
+embedding caches. Needs COHERE_API_KEY and QDRANT_API_KEY.
+
+    python -m benchmarks.bench_batch_retrieval --queries 200
+"""
+import argparse
+import time
+import uuid
+
+from agent.retrievers.subsidy_retriever import get_subsidy_retriever, DEFAULT_COLLECTION_NAME
+
+DESCRIPTIONS = [
+    "Wij ontwikkelen software voor de zorg en zoeken innovatiesubsidie",
+    "Mkb-bedrijf in de maakindustrie dat wil investeren in procesinnovatie",
+    "Startup die zonnepanelen combineert met batterijopslag voor bedrijventerreinen",
+    "Agrarisch bedrijf dat wil overstappen op biologische landbouw",
+]
+
+
+def make_queries(n: int):
+    run_id = uuid.uuid4().hex[:8]
+    return [f"{DESCRIPTIONS[i % len(DESCRIPTIONS)]} ({run_id}-{i})" for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION_NAME)
+    parser.add_argument("--embed-model", default="cohere")
+    parser.add_argument("--rerank-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    engine = get_subsidy_retriever(args.collection, args.embed_model)
+
+    queries = make_queries(args.queries)
+    start = time.perf_counter()
+    for query in queries:
+        engine.retrieve(query)
+    loop_seconds = time.perf_counter() - start
+
+    queries = make_queries(args.queries)
+    start = time.perf_counter()
+    engine.retrieve_batch(queries, rerank_concurrency=args.rerank_concurrency)
+    batch_seconds = time.perf_counter() - start
+
+    print(f"{args.queries} queries on {args.collection}")
+    print(f"retrieve() loop : {args.queries / loop_seconds:8.2f} queries/s")
+    print(f"retrieve_batch(): {args.queries / batch_seconds:8.2f} queries/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Local category filtering across a corpus: nested Categories dicts vs category bitsets.
+
+"payload walk" evaluates the selection against each payload's Categories tree in Python,
+"leaf masks" ORs one precomputed boolean mask per selected leaf, and "bitset" ANDs the
+(words x points) bitset matrix of LocalVectorIndex with the selection's bitset.
+
+    python -m benchmarks.bench_category_bitsets --corpus-size 20000 --leaves 8
+"""
+import argparse
+import random
+import timeit
+
+import numpy as np
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+from agent.retrievers.filters import CATEGORY_LEAF_PATHS, category_bitset, category_leaf_value
+from agent.retrievers.local_backend import bitset_match, bitset_words
+from agent.retrievers.payload import ingest_payload
+from benchmarks.fakes import synthetic_subsidy_nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=20000)
+    parser.add_argument("--leaves", type=int, default=8, help="Selected category leaves")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = [
+        ingest_payload(node_to_metadata_dict(node, remove_text=False, flat_metadata=False))
+        for node in synthetic_subsidy_nodes(args.corpus_size)
+    ]
+    leaves = frozenset(random.Random(0).sample(CATEGORY_LEAF_PATHS, args.leaves))
+
+    leaf_masks = {
+        leaf: np.array([category_leaf_value(payload["Categories"], leaf) is True for payload in payloads])
+        for leaf in CATEGORY_LEAF_PATHS
+    }
+    bits = np.ascontiguousarray(np.stack([bitset_words(int(payload["CategoryBits"], 16)) for payload in payloads]).T)
+
+    def payload_walk():
+        return np.array([
+            any(category_leaf_value(payload["Categories"], leaf) is True for leaf in leaves)
+            for payload in payloads
+        ])
+
+    def leaf_or():
+        mask = np.zeros(len(payloads), dtype=bool)
+        for leaf in leaves:
+            mask |= leaf_masks[leaf]
+        return mask
+
+    def bitset_and():
+        return bitset_match(bits, category_bitset(leaves))
+
+    expected = payload_walk()
+    print(f"{args.corpus_size} subsidies, {args.leaves} selected leaves, {int(expected.sum())} matches")
+    for label, fn in (("payload walk", payload_walk), ("leaf masks", leaf_or), ("bitset", bitset_and)):
+        assert (fn() == expected).all(), label
+        seconds = timeit.timeit(fn, number=args.iterations) / args.iterations
+        print(f"{label:>13}: {seconds * 1000:9.3f} ms per selection")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of category filter construction.
+
+Compares the per-request loop retrieve_subsidies used to run (CategorieSelectie validation,
+model_dump() and three nested loops) with the precompiled leaf table in
+agent.retrievers.filters, both cold (memo cleared) and warm (repeated selection).
+
+    python -m benchmarks.bench_category_filter --iterations 2000
+"""
+import argparse
+import timeit
+
+from qdrant_client.http.models import Filter, FieldCondition, MatchValue
+
+from agent.retrievers.filters import CATEGORY_LEAF_PATHS, compile_category_filter, selected_category_leaves
+from agent.tools.tool_query_subsidies import CategorieSelectie
+
+SELECTION = {
+    "export_internationalisering_ontwikkelingssamenwerking": {
+        "export_en_internationalisering": {"internationalisering": True},
+    },
+    "ict": {"hardware": True, "software": True, "telecommunicatie": False},
+    "ondersteunend_bedrijfsleven": {"ondersteuning_mkb": True},
+    "onderzoek": {
+        "innovatie": {
+            "deelname_bedrijfsleven_aan_onderzoek": True,
+            "procesinnovatie": True,
+            "productinnovatie": True,
+            "programmatuur": True,
+        },
+        "kennisoverdracht": None,
+    },
+    "regionale_ontwikkeling": {"stedelijk_gebied": True},
+}
+
+
+def category_filter_loop(categories: dict):
+    """The category part of the former retrieve_subsidies, kept as the baseline."""
+    category_filters = CategorieSelectie(**categories) if categories else None
+    category_conditions = []
+    if category_filters:
+        for main_category, subcategories in category_filters.model_dump().items():
+            if subcategories is None:
+                continue
+            if isinstance(subcategories, dict):
+                for sub_key, sub_value in subcategories.items():
+                    if isinstance(sub_value, dict):
+                        for nested_key, nested_value in sub_value.items():
+                            if nested_value is True:
+                                category_conditions.append(
+                                    FieldCondition(
+                                        key=f"Categories.{main_category}.{sub_key}.{nested_key}",
+                                        match=MatchValue(value=True)
+                                    )
+                                )
+                    elif sub_value is True:
+                        category_conditions.append(
+                            FieldCondition(
+                                key=f"Categories.{main_category}.{sub_key}",
+                                match=MatchValue(value=True)
+                            )
+                        )
+    return Filter(should=category_conditions) if category_conditions else None
+
+
+def compiled_cold(categories: dict):
+    compile_category_filter.cache_clear()
+    return compile_category_filter(selected_category_leaves(categories))
+
+
+def compiled_warm(categories: dict):
+    return compile_category_filter(selected_category_leaves(categories))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    assert category_filter_loop(SELECTION) == compiled_cold(SELECTION), "compiled filter differs from the loop"
+
+    print(f"{len(CATEGORY_LEAF_PATHS)} category leaves, {args.iterations} iterations")
+    for name, fn in [("pydantic loop", category_filter_loop), ("compiled (cold)", compiled_cold), ("compiled (warm)", compiled_warm)]:
+        seconds = timeit.timeit(lambda: fn(SELECTION), number=args.iterations)
+        print(f"{name:16s}: {seconds / args.iterations * 1e6:8.2f} us/selection")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+The evaluation sweep of agent.retrievers.evaluation run end to end against the offline fakes.
+
+A synthetic corpus with dense and sparse vectors is loaded into an in-memory Qdrant collection
+and a golden set is derived from it: each case asks for a random subsidy by its four topic words
+plus one unrelated word, and half of the cases for regional subsidies filter on one of their
+regions. The golden set is written to --golden when given, as a template for a real one. The sweep covers
+--top-k, --top-n and dense versus hybrid search with FakeReranker, whose billed search units give
+the cost column (one unit per query up to 100 documents, as Cohere bills), and prints the table
+with the Pareto-optimal configurations marked.
+
+    python -m benchmarks.bench_evaluation --cases 200 --top-k 10 25 100 --top-n 5 10 --rerank-ms 30
+"""
+import argparse
+import json
+import random
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.evaluation import (
+    DEFAULT_RECALL_KS,
+    EvalConfiguration,
+    GoldenCase,
+    cheapest_meeting,
+    format_reports,
+    sweep,
+)
+from agent.retrievers.hybrid import HybridSearch, SparseQueryEncoder
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import (
+    FakeReranker,
+    HashEmbedding,
+    HashSparseEncoder,
+    TOPIC_WORDS,
+    apopulate_collection,
+    synthetic_subsidy_nodes,
+)
+
+COLLECTION_NAME = "bench_evaluation"
+
+
+def golden_cases(nodes, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    cases = []
+    for node in rng.sample(nodes, count):
+        topics = [word for word in TOPIC_WORDS if word in node.text]
+        words = topics + [rng.choice([word for word in TOPIC_WORDS if word not in topics])]
+        rng.shuffle(words)
+        bereik = node.metadata["Bereik"]
+        # retrieve() searches national subsidies only unless told otherwise
+        filters = {}
+        if bereik != ["National"]:
+            filters = {"include_national": False}
+            if rng.random() < 0.5:
+                filters["regions"] = [rng.choice(bereik)]
+        cases.append(GoldenCase(" ".join(words), frozenset([node.metadata["title"]]), filters))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--cases", type=int, default=100)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[10, 25, 100])
+    parser.add_argument("--top-n", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--rerank-ms", type=float, default=20.0, help="Fake rerank latency per call")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--golden", help="Also write the generated golden set to this JSONL file")
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim)
+    encoder = SparseQueryEncoder("hash-sparse", encode_fn=HashSparseEncoder())
+    aclient = AsyncQdrantClient(location=":memory:")
+    nodes = synthetic_subsidy_nodes(args.corpus_size)
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, nodes, sparse_encoder=encoder.load()))
+
+    cases = golden_cases(nodes, args.cases)
+    if args.golden:
+        with open(args.golden, "w", encoding="utf-8") as f:
+            for case in cases:
+                f.write(json.dumps({"query": case.query, "filters": case.filters,
+                                    "expected_titles": sorted(case.expected_titles)}, ensure_ascii=False) + "\n")
+
+    def build_engine(configuration: EvalConfiguration) -> SubsidyRetriever:
+        return SubsidyRetriever(
+            configuration.collection_name,
+            embed_model,
+            similarity_top_k=configuration.similarity_top_k,
+            aclient=aclient,
+            reranker=FakeReranker(top_n=configuration.rerank_top_n, latency_seconds=args.rerank_ms / 1000),
+            hybrid=configuration.hybrid,
+            sparse_encoder=encoder,
+        )
+
+    configurations = [
+        EvalConfiguration(COLLECTION_NAME, top_k, top_n, hybrid, embed_model.model_name)
+        for top_k in args.top_k
+        for top_n in args.top_n
+        for hybrid in (None, HybridSearch("rrf"))
+    ]
+    reports = sweep(cases, configurations, build_engine, concurrency=args.concurrency)
+    print(f"{len(cases)} cases over {args.corpus_size} subsidies, * = Pareto-optimal")
+    print(format_reports(reports))
+
+    k = max(DEFAULT_RECALL_KS)
+    best = cheapest_meeting(reports, args.min_recall, k)
+    print(f"\ncheapest with recall@{k} >= {args.min_recall}: {best.configuration.label if best else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
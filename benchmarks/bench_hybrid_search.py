@@ -0,0 +1,102 @@
+"""
+Overhead of hybrid (dense + sparse) search over dense-only search in the SubsidyRetriever.
+
+A synthetic corpus with dense and sparse vectors is loaded into Qdrant and the same queries run
+on a dense-only engine and on hybrid engines with RRF and relative score fusion. "cold" queries
+have not been sparse-encoded before, "warm" ones hit the SparseQueryEncoder cache (the result
+cache is cleared between passes, so both search). The encoder load is timed once, which is what
+every retrieve_subsidies call paid when it built its own QdrantVectorStore(enable_hybrid=True).
+
+By default sparse encodings come from HashSparseEncoder with --sparse-latency-ms of simulated
+inference; --sparse-model encodes with that fastembed model instead (downloaded on first use).
+
+    python -m benchmarks.bench_hybrid_search --corpus-size 5000 --sparse-latency-ms 15
+"""
+import argparse
+import statistics
+import time
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.hybrid import HybridSearch, SparseQueryEncoder
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import (
+    FakeReranker,
+    HashEmbedding,
+    HashSparseEncoder,
+    TOPIC_WORDS,
+    apopulate_collection,
+    synthetic_subsidy_nodes,
+)
+
+COLLECTION_NAME = "bench_hybrid_search"
+
+
+def run_pass(engine: SubsidyRetriever, queries):
+    get_result_cache().clear()
+    elapsed_ms, embed_ms, search_ms = [], [], []
+    for query in queries:
+        result = engine.retrieve(query, include_national=True, regions=["Utrecht"], latency_budget_ms=None)
+        elapsed_ms.append(result.metadata["elapsed_ms"])
+        embed_ms.append(result.metadata["stage_ms"]["embed"])
+        search_ms.append(result.metadata["stage_ms"]["search"])
+    return elapsed_ms, embed_ms, search_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Qdrant server URL (default: in-memory)")
+    parser.add_argument("--corpus-size", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--sparse-latency-ms", type=float, default=15.0)
+    parser.add_argument("--sparse-model", default=None, help="fastembed sparse model to encode with")
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim)
+    if args.sparse_model:
+        encoder = SparseQueryEncoder(args.sparse_model)
+    else:
+        encoder = SparseQueryEncoder("hash-sparse", encode_fn=HashSparseEncoder(latency_seconds=args.sparse_latency_ms / 1000))
+
+    start = time.perf_counter()
+    encode_fn = encoder.load()
+    print(f"sparse encoder load: {(time.perf_counter() - start) * 1000:.1f} ms (once per process)")
+
+    aclient = AsyncQdrantClient(url=args.url) if args.url else AsyncQdrantClient(location=":memory:")
+    run_sync(apopulate_collection(
+        aclient, COLLECTION_NAME, embed_model, synthetic_subsidy_nodes(args.corpus_size), sparse_encoder=encode_fn
+    ))
+
+    engines = [("dense", None), ("hybrid rrf", HybridSearch("rrf")), ("hybrid relative", HybridSearch("relative_score"))]
+    print(f"{'engine':<16} {'pass':<5} {'p50 total':>10} {'p95 total':>10} {'p50 embed':>10} {'p50 search':>11}")
+    for label, hybrid in engines:
+        engine = SubsidyRetriever(
+            COLLECTION_NAME,
+            embed_model,
+            similarity_top_k=args.top_k,
+            aclient=aclient,
+            reranker=FakeReranker(),
+            hybrid=hybrid,
+            sparse_encoder=encoder,
+        )
+        # A fresh query set per engine, so the first pass is cold for the sparse encoder cache
+        queries = [
+            f"{label} {i} " + " ".join(TOPIC_WORDS[(i * 7 + j) % len(TOPIC_WORDS)] for j in range(3))
+            for i in range(args.queries)
+        ]
+        engine.retrieve(queries[0], latency_budget_ms=None)
+        for pass_name in ("cold", "warm"):
+            elapsed_ms, embed_ms, search_ms = run_pass(engine, queries)
+            p95 = statistics.quantiles(elapsed_ms, n=20)[-1]
+            print(f"{label:<16} {pass_name:<5} {statistics.median(elapsed_ms):7.2f} ms {p95:7.2f} ms "
+                  f"{statistics.median(embed_ms):7.2f} ms {statistics.median(search_ms):8.2f} ms")
+
+    print(f"sparse encoder cache: {encoder.hits} hits, {encoder.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
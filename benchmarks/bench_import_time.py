@@ -0,0 +1,80 @@
+"""
+Cold import time of the retriever and UI modules, measured with python -X importtime.
+
+Every module is imported --runs times in a fresh interpreter (so nothing is cached in
+sys.modules, although the OS file cache is warm after the first run). The benchmark reports the
+median cumulative import time of the module and the top-level packages that took the most time
+in the median run. A module whose dependencies are not installed is reported as such.
+
+    python -m benchmarks.bench_import_time --runs 5
+    python -m benchmarks.bench_import_time agent.retrievers.retriever_baseline --top 15
+"""
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_MODULES = [
+    "agent.retrievers.subsidy_retriever",
+    "agent.retrievers.retriever_baseline",
+    "ui.retriever_dashboard_baseline",
+    "ui.retriever_dashboard_baseline_flask",
+]
+
+# "import time:  self [us] | cumulative | imported package", indented by nesting depth
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def import_once(module: str) -> Tuple[Optional[float], Dict[str, float], str]:
+    """
+    Import the module in a fresh interpreter. Returns its cumulative import time in ms (None when
+    the import failed), the self time in ms per top-level package and the error output.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    cumulative_ms = None
+    packages: Dict[str, float] = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us) / 1000
+        if name == module:
+            cumulative_ms = int(cumulative_us) / 1000
+    if completed.returncode != 0:
+        cumulative_ms = None
+    return cumulative_ms, packages, completed.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Heaviest top-level packages to list per module")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [import_once(module) for _ in range(args.runs)]
+        failed = [stderr for cumulative_ms, _, stderr in runs if cumulative_ms is None]
+        if failed:
+            error = failed[0].strip().splitlines()[-1] if failed[0].strip() else "import failed"
+            print(f"{module}: not importable here ({error})")
+            continue
+
+        runs.sort(key=lambda run: run[0])
+        median_ms, packages, _ = runs[len(runs) // 2]
+        print(f"{module}: median {median_ms:.0f} ms, min {runs[0][0]:.0f} ms, max {runs[-1][0]:.0f} ms "
+              f"over {args.runs} runs")
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for package, self_ms in heaviest:
+            print(f"    {package:<32} {self_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
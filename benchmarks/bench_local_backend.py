@@ -0,0 +1,113 @@
+"""
+Dense search latency of the in-process LocalVectorIndex against the Qdrant path.
+
+A synthetic corpus is loaded into Qdrant, exported the way ingest exports it, and loaded into
+a LocalVectorIndex. The same queries and filters then run through both backends of one engine.
+The last column is the largest difference between the two ranked score lists; the synthetic
+embeddings produce many tied scores, so the ids at the top_k cutoff may legitimately differ.
+
+    python -m benchmarks.bench_local_backend --url http://localhost:6333 --corpus-size 5000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.filters import compile_subsidy_filter, subsidy_filter_spec
+from agent.retrievers.local_backend import LocalVectorIndex, save_vector_snapshot, latest_vector_snapshot
+from agent.retrievers.subsidy_retriever import SubsidyRetriever, DENSE_VECTOR_NAME
+from benchmarks.fakes import FakeReranker, HashEmbedding, TOPIC_WORDS, apopulate_collection, synthetic_subsidy_nodes
+
+COLLECTION_NAME = "bench_local_backend"
+
+FILTERS = [
+    ("no filter", dict(include_national=False)),
+    ("national", dict(include_national=True)),
+    ("one region, Open", dict(include_national=False, regions=["Utrecht"], status=["Open"])),
+    ("national + region, 2 categories", dict(
+        include_national=True, regions=["Utrecht"],
+        categories=["ict.software", "onderzoek.innovatie.productinnovatie"],
+    )),
+]
+
+
+async def ascroll_all(aclient: AsyncQdrantClient):
+    records, offset = [], None
+    while True:
+        batch, offset = await aclient.scroll(
+            collection_name=COLLECTION_NAME, limit=256, offset=offset, with_payload=True, with_vectors=[DENSE_VECTOR_NAME]
+        )
+        records.extend(batch)
+        if offset is None:
+            return records
+
+
+def time_searches(search, query_embeddings):
+    latencies = []
+    results = []
+    for query_embedding in query_embeddings:
+        start = time.perf_counter()
+        nodes, _ = search(query_embedding)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([node.score for node in nodes])
+    return statistics.median(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Qdrant server URL (default: in-memory)")
+    parser.add_argument("--corpus-size", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=100)
+    args = parser.parse_args()
+
+    aclient = AsyncQdrantClient(url=args.url) if args.url else AsyncQdrantClient(location=":memory:")
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim)
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, synthetic_subsidy_nodes(args.corpus_size)))
+
+    start = time.perf_counter()
+    if args.url:
+        # Same export and load path as ingest and the "local" backend
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            save_vector_snapshot(QdrantClient(url=args.url), COLLECTION_NAME, snapshot_dir, DENSE_VECTOR_NAME)
+            local_index = LocalVectorIndex.load(latest_vector_snapshot(snapshot_dir, COLLECTION_NAME))
+    else:
+        local_index = LocalVectorIndex.from_records(run_sync(ascroll_all(aclient)), DENSE_VECTOR_NAME)
+    print(f"local index of {len(local_index)} x {args.dim} built in {time.perf_counter() - start:.2f}s\n")
+
+    qdrant_engine = SubsidyRetriever(
+        COLLECTION_NAME, embed_model, similarity_top_k=args.top_k, aclient=aclient, reranker=FakeReranker()
+    )
+    local_engine = SubsidyRetriever(
+        COLLECTION_NAME, embed_model, similarity_top_k=args.top_k, aclient=aclient, reranker=FakeReranker(),
+        backend="local", local_index=local_index,
+    )
+
+    queries = [" ".join(TOPIC_WORDS[(i * 5 + j) % len(TOPIC_WORDS)] for j in range(3)) for i in range(args.queries)]
+    query_embeddings = [embed_model.get_query_embedding(query) for query in queries]
+
+    print(f"{'filter':<34} {'qdrant p50':>11} {'local p50':>10} {'max |dscore|':>13}")
+    for label, kwargs in FILTERS:
+        spec = subsidy_filter_spec(**kwargs)
+        combined_filter = compile_subsidy_filter(spec)
+
+        qdrant_ms, qdrant_results = time_searches(
+            lambda q: run_sync(qdrant_engine._asearch(q, spec, combined_filter, 0)), query_embeddings
+        )
+        local_ms, local_results = time_searches(
+            lambda q: local_engine._search_local(q, spec), query_embeddings
+        )
+        score_diff = max(
+            (abs(a - b) for qdrant_scores, local_scores in zip(qdrant_results, local_results)
+             for a, b in zip(qdrant_scores, local_scores)),
+            default=0.0,
+        )
+        print(f"{label:<34} {qdrant_ms:8.2f} ms {local_ms:7.2f} ms {score_diff:13.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Cost of the retrieval metrics and what they report for a run against the offline fakes.
+
+First every recording helper is called --iterations times and its cost per call is printed.
+Then a synthetic corpus is loaded into an in-memory Qdrant and the same queries run once with
+metrics disabled and once enabled. The benchmark prints the median latency of both runs, the
+per-stage p50/p95 estimated from the histograms, and with --prometheus the full text export.
+
+    python -m benchmarks.bench_metrics --queries 200 --prometheus
+"""
+import argparse
+import statistics
+import time
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers import metrics
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.metrics import (
+    CANDIDATES,
+    PROVIDER_UNITS,
+    RETRIEVALS,
+    STAGE_SECONDS,
+    count,
+    get_metrics_registry,
+    observe_candidates,
+    observe_stage,
+    record_retrieval,
+)
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, TOPIC_WORDS, apopulate_collection, synthetic_subsidy_nodes
+
+COLLECTION_NAME = "bench_metrics"
+
+SAMPLE_METADATA = {
+    "cached": False,
+    "elapsed_ms": 412.0,
+    "stage_ms": {"embed": 85.0, "search": 97.0, "rerank": 230.0},
+    "degraded": False,
+}
+
+
+def per_call_us(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--corpus-size", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--prometheus", action="store_true", help="Print the Prometheus text export")
+    args = parser.parse_args()
+
+    helpers = [
+        ("observe_stage", lambda: observe_stage("search", 0.042)),
+        ("observe_candidates", lambda: observe_candidates("rerank", 87)),
+        ("count", lambda: count(PROVIDER_UNITS, 1, provider="cohere", unit="search_units")),
+        ("record_retrieval (4 stages)", lambda: record_retrieval(SAMPLE_METADATA)),
+    ]
+    for label, helper in helpers:
+        print(f"{label:<28} {per_call_us(helper, args.iterations):6.2f} us per call")
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim)
+    aclient = AsyncQdrantClient(location=":memory:")
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, synthetic_subsidy_nodes(args.corpus_size)))
+    engine = SubsidyRetriever(
+        COLLECTION_NAME,
+        embed_model,
+        similarity_top_k=args.top_k,
+        aclient=aclient,
+        reranker=FakeReranker(),
+    )
+
+    print()
+    for enabled in (False, True):
+        metrics.METRICS_ENABLED = enabled
+        get_metrics_registry().reset()
+        get_result_cache().clear()
+        latencies = []
+        for i in range(args.queries):
+            query = f"{'on' if enabled else 'off'} {i} " + " ".join(
+                TOPIC_WORDS[(i * 3 + j) % len(TOPIC_WORDS)] for j in range(3)
+            )
+            start = time.perf_counter()
+            engine.retrieve(query, latency_budget_ms=None)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"metrics {'enabled ' if enabled else 'disabled'}: p50 {statistics.median(latencies):7.2f} ms per retrieval")
+
+    print(f"\n{'stage':<8} {'count':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for entry in get_metrics_registry().snapshot().get(STAGE_SECONDS, []):
+        histogram = get_metrics_registry().histogram(STAGE_SECONDS, metrics.LATENCY_BUCKETS, **entry["labels"])
+        print(f"{entry['labels']['stage']:<8} {entry['count']:6d} {histogram.quantile(0.5) * 1000:8.2f} "
+              f"{histogram.quantile(0.95) * 1000:8.2f}")
+    for entry in get_metrics_registry().snapshot().get(CANDIDATES, []):
+        print(f"candidates {entry['labels']['stage']}: mean {entry['sum'] / entry['count']:.1f}")
+    for name in (RETRIEVALS, PROVIDER_UNITS):
+        for entry in get_metrics_registry().snapshot().get(name, []):
+            print(f"{name}{entry['labels']}: {entry['value']:.0f}")
+
+    if args.prometheus:
+        print()
+        print(get_metrics_registry().to_prometheus(), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Speed, coverage and accuracy of the rule-based region/status/national extractor.
+
+Each labelled request is run through extract_parameters_rules(). The benchmark reports the time
+per call, the share of requests settled without the LLM, and the share of settled requests that
+match the label. With --live, the requests the rules leave open also go to gpt-4o through
+extract_parameters_llm (needs OPENAI_API_KEY), and its answers and latency are reported.
+
+    python -m benchmarks.bench_parameter_extraction --iterations 2000
+"""
+import argparse
+import time
+
+from agent.retrievers.parameter_rules import extract_parameters_rules
+
+# (request, expected (include_national, regions, status)); None as expectation marks a request
+# the rules should hand to the LLM
+LABELLED_REQUESTS = [
+    ("Ik zoek naar innovatie subsidies voor het MKB in de provincie Overijssel", (None, ["Overijssel"], None)),
+    ("Subsidies voor zonnepanelen in Noord-Brabant en Limburg", (None, ["Noord-Brabant", "Limburg"], None)),
+    ("Welke regelingen zijn er voor een startup in Eindhoven?", (None, ["Noord-Brabant"], None)),
+    ("Geen landelijke subsidies, alleen regionale voor Friesland", (False, ["Friesland"], None)),
+    ("Landelijke subsidies voor onderzoek naar waterstof die nu open zijn", (True, None, ["Open"])),
+    ("Openstaande subsidies voor de zorg in Rotterdam of Den Haag", (None, ["Zuid-Holland"], ["Open"])),
+    ("Welke aangekondigde regelingen komen er voor circulaire bouw?", (None, None, ["Aangekondigd"])),
+    ("Subsidie voor digitalisering in het onderwijs", (None, None, None)),
+    ("Alleen in Utrecht: subsidies voor cultuur en erfgoed", (False, ["Utrecht"], None)),
+    ("Ik wil ook gesloten regelingen zien voor landbouw in Drenthe", (None, ["Drenthe"], ["Gesloten"])),
+    ("Open innovatie projecten met partners uit Zeeland", (None, ["Zeeland"], None)),
+    ("RVO regelingen voor export naar Duitsland", (True, None, None)),
+    ("Subsidies in Groningen en Assen voor aardgasvrije wijken", (None, ["Groningen", "Drenthe"], None)),
+    ("Projecten in Almere en Lelystad rond mobiliteit, status open", (None, ["Flevoland"], ["Open"])),
+    ("Energiebesparing voor sportverenigingen in Gelderland, geen nationale regelingen", (False, ["Gelderland"], None)),
+    ("Innovation subsidies for software companies in Amsterdam, no national schemes", (False, ["Noord-Holland"], None)),
+    ("Regelingen voor de visserij in Holland", None),
+    ("Subsidies buiten Limburg voor toerisme", None),
+    ("Subsidies die niet gesloten zijn voor duurzaamheid", None),
+    ("Landelijke subsidies, maar geen nationale regelingen voor Zeeland", None),
+    ("Een bedrijf in Bergen zoekt subsidie voor zonne-energie", None),
+    ("Veel communicatie gebeurt via beeld en schrift. Doel van dit project is het ontwikkelen van drukwerk "
+     "met geprinte geluidsmodules voor mensen met lichamelijke beperkingen.", (None, None, None)),
+    ("Wij hebben de afgelopen jaren een app voor mantelzorgers ontwikkeld", (None, None, None)),
+    ("Het pilotproject is goed verlopen en we willen nu opschalen", None),
+    ("Ons platform is open voor alle zorgverleners", None),
+    ("We werken samen met TU Delft aan een closed-loop systeem voor waterzuivering", (None, ["Zuid-Holland"], None)),
+    ("Regelingen die nog open staan voor de glastuinbouw", (None, None, ["Open"])),
+    ("Toon ook verlopen subsidies voor het onderwijs", (None, None, ["Gesloten"])),
+    ("Dit project moet leiden tot minder CO2-uitstoot", None),
+    ("Veel mkb-bedrijven kampen met personeelstekort", None),
+    ("subsidie voor houten woningbouw", None),
+    ("Subsidies voor een buurthuis in gouda", (None, ["Zuid-Holland"], None)),
+    ("Een ondernemer uit Ede zoekt subsidie voor verduurzaming", (None, ["Gelderland"], None)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--live", action="store_true", help="Send the ambiguous requests to gpt-4o")
+    args = parser.parse_args()
+
+    settled = 0
+    correct = 0
+    fallbacks = []
+    for request, expected in LABELLED_REQUESTS:
+        parameters = extract_parameters_rules(request)
+        if parameters is None:
+            fallbacks.append(request)
+            outcome = "ok" if expected is None else "MISS (sent to LLM)"
+        else:
+            settled += 1
+            correct += parameters == expected
+            outcome = "ok" if parameters == expected else f"WRONG, expected {expected}"
+        print(f"{outcome:<8} {str(parameters):<48} {request[:70]}")
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for request, _ in LABELLED_REQUESTS:
+            extract_parameters_rules(request)
+    per_call_us = (time.perf_counter() - start) / (args.iterations * len(LABELLED_REQUESTS)) * 1e6
+
+    print(f"\n{len(LABELLED_REQUESTS)} requests: {settled} settled by the rules "
+          f"({settled / len(LABELLED_REQUESTS):.0%}), {correct}/{settled} of those correct, "
+          f"{len(fallbacks)} sent to the LLM")
+    print(f"rules: {per_call_us:.1f} us per request")
+
+    if args.live and fallbacks:
+        from agent.retrievers.retriever_baseline import extract_parameters_llm
+
+        for request in fallbacks:
+            start = time.perf_counter()
+            parameters = extract_parameters_llm(request)
+            print(f"gpt-4o {(time.perf_counter() - start) * 1000:7.0f} ms {str(parameters):<48} {request[:60]}")
+
+
+if __name__ == "__main__":
+    main()
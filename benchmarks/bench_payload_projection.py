@@ -0,0 +1,95 @@
+"""
+Response size and decode time of a top_k search, full payload vs projected payload.
+
+"full" is what searches used to get: with_payload=True on points written by the stock
+QdrantVectorStore, so the Categories tree comes back twice (top-level and inside the node JSON).
+"projected" is the node JSON written by LeanPayloadQdrantVectorStore, fetched with
+payload_fields(). Offline the REST response is simulated from synthetic subsidies; with --live
+the production collection is queried both ways (needs COHERE_API_KEY and QDRANT_API_KEY).
+
+    python -m benchmarks.bench_payload_projection --top-k 100
+"""
+import argparse
+import json
+import time
+from types import SimpleNamespace
+
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+from agent.retrievers.payload import lean_payload, payload_fields, points_to_nodes
+from benchmarks.fakes import synthetic_subsidy_nodes
+
+
+def simulated_response(payloads) -> bytes:
+    points = [{"id": i, "version": 0, "score": 0.5, "payload": payload} for i, payload in enumerate(payloads)]
+    return json.dumps({"result": {"points": points}, "status": "ok", "time": 0.001}).encode("utf-8")
+
+
+def decode(response: bytes):
+    points = [
+        SimpleNamespace(id=point["id"], score=point["score"], payload=point["payload"])
+        for point in json.loads(response)["result"]["points"]
+    ]
+    return points_to_nodes(points)
+
+
+def time_decode(response: bytes, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode(response)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def run_offline(top_k: int, iterations: int):
+    nodes = synthetic_subsidy_nodes(top_k)
+    full_payloads = [node_to_metadata_dict(node, remove_text=False, flat_metadata=False) for node in nodes]
+    fields = payload_fields()
+    projected_payloads = [{key: lean_payload(payload)[key] for key in fields} for payload in full_payloads]
+
+    for label, payloads in (("full", full_payloads), ("projected", projected_payloads)):
+        response = simulated_response(payloads)
+        print(f"{label:>9}: {len(response) / 1024:8.1f} KiB per search, "
+              f"decode + node rebuild {time_decode(response, iterations):6.2f} ms")
+
+
+def run_live(top_k: int, iterations: int):
+    from agent.retrievers.engine_loop import run_sync
+    from agent.retrievers.subsidy_retriever import get_subsidy_retriever, DENSE_VECTOR_NAME
+
+    engine = get_subsidy_retriever()
+    query_embedding = engine.embed_model.get_query_embedding("innovatiesubsidie voor software in de zorg")
+
+    async def search(with_payload):
+        return await engine.aclient.query_points(
+            collection_name=engine.collection_name,
+            query=query_embedding,
+            using=DENSE_VECTOR_NAME,
+            limit=top_k,
+            with_payload=with_payload,
+        )
+
+    for label, with_payload in (("full", True), ("projected", payload_fields())):
+        run_sync(search(with_payload))
+        start = time.perf_counter()
+        for _ in range(iterations):
+            response = run_sync(search(with_payload))
+        elapsed_ms = (time.perf_counter() - start) / iterations * 1000
+        payload_bytes = sum(len(json.dumps(point.payload)) for point in response.points)
+        print(f"{label:>9}: {payload_bytes / 1024:8.1f} KiB payload per search, {elapsed_ms:7.1f} ms per search")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--live", action="store_true", help="Query the production collection instead")
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args.top_k, args.iterations)
+    else:
+        run_offline(args.top_k, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
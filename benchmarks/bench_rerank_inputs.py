@@ -0,0 +1,84 @@
+"""
+Rerank cost, latency and recall with and without the RerankInputPolicy.
+
+Synthetic subsidies with Samenvatting-length texts are loaded into an in-memory Qdrant.
+Every query is written from the topics of one target subsidy, which is the golden answer.
+The same queries run with full rerank documents and with the input policy at several token
+budgets. The benchmark reports, per query:
+- documents and tokens sent to rerank;
+- Cohere billed documents (split per 500 tokens);
+- rerank latency of a FakeReranker that costs --ms-per-1k-tokens;
+- the golden hit rate in the top_n;
+- overlap of the top_n with the full-document top_n.
+
+    python -m benchmarks.bench_rerank_inputs --corpus-size 2000 --sentences 40
+"""
+import argparse
+import random
+import statistics
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.reranking import RerankInputPolicy
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, apopulate_collection, synthetic_subsidy_nodes
+
+COLLECTION_NAME = "bench_rerank_inputs"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--sentences", type=int, default=40, help="Filler sentences per subsidy")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=2.0)
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[128, 256, 384])
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim)
+    nodes = synthetic_subsidy_nodes(args.corpus_size, sentences=args.sentences)
+    aclient = AsyncQdrantClient(location=":memory:")
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, nodes))
+
+    rng = random.Random(1)
+    targets = rng.sample(nodes, args.queries)
+    # The opening sentence lists the subsidy's four topics; the query names three of them
+    queries = [" ".join(target.text.split()[3:6]) for target in targets]
+
+    policies = [("full documents", None)] + [
+        (f"policy {max_tokens} tokens", RerankInputPolicy(max_tokens=max_tokens)) for max_tokens in args.max_tokens
+    ]
+    reference = None
+    print(f"{'rerank input':<20} {'docs':>6} {'tokens':>8} {'billed':>7} {'rerank ms':>10} {'golden@n':>9} {'overlap':>8}")
+    for label, policy in policies:
+        get_result_cache().clear()
+        reranker = FakeReranker(top_n=args.top_n, seconds_per_1k_tokens=args.ms_per_1k_tokens / 1000)
+        engine = SubsidyRetriever(
+            COLLECTION_NAME,
+            embed_model,
+            similarity_top_k=args.top_k,
+            aclient=aclient,
+            reranker=reranker,
+            rerank_inputs=policy,
+        )
+        results = [engine.retrieve(query, latency_budget_ms=None) for query in queries]
+        top_ids = [[node.node.node_id for node in result.nodes_reranked] for result in results]
+        if reference is None:
+            reference = top_ids
+
+        golden = statistics.mean(target.node_id in ids for target, ids in zip(targets, top_ids))
+        overlap = statistics.mean(
+            len(set(ids) & set(ref)) / len(ref) if ref else 1.0 for ids, ref in zip(top_ids, reference)
+        )
+        rerank_ms = statistics.median(result.metadata["stage_ms"]["rerank"] for result in results)
+        print(f"{label:<20} {reranker.documents / len(queries):6.1f} {reranker.tokens / len(queries):8.0f} "
+              f"{reranker.billed_documents / len(queries):7.1f} {rerank_ms:10.2f} {golden:9.2f} {overlap:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Cold versus warm cost of the SubsidyRetriever engine, and the cost of a cache hit.
+
+Cold: build a new engine (embed model, reranker, Qdrant client) and run one search,
+which is what every retrieve_subsidies call used to pay.
+Warm: run the same search on an engine that is already built.
+Cache hit: repeat the warm search, which the result cache answers.
+
+Before every cold and warm sample the result cache and the semantic cache are cleared and the
+engine gets an empty in-memory embedding cache, so each sample embeds, searches and reranks.
+
+Needs COHERE_API_KEY, QDRANT_API_KEY (and OPENAI_API_KEY for --embed-model openai).
+
+    python -m benchmarks.bench_retriever_engine --runs 5
+"""
+import argparse
+import statistics
+import time
+
+from agent.retrievers.embedding_cache import EmbeddingCache
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.subsidy_retriever import SubsidyRetriever, DEFAULT_COLLECTION_NAME
+
+QUERY = "Ik zoek naar innovatie subsidies voor het MKB in de provincie Overijssel"
+
+
+def time_call(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def clear_caches(engine: SubsidyRetriever) -> None:
+    get_result_cache().clear()
+    if engine.semantic_cache is not None:
+        engine.semantic_cache.clear()
+    engine.embedding_cache = EmbeddingCache(":memory:")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION_NAME)
+    parser.add_argument("--embed-model", default="cohere")
+    args = parser.parse_args()
+
+    build_ms, cold_ms, warm_ms, hit_ms = [], [], [], []
+
+    def search():
+        return engine.retrieve(QUERY, regions=["Overijssel"])
+
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        engine = SubsidyRetriever(args.collection, args.embed_model)
+        build_ms.append((time.perf_counter() - start) * 1000)
+        clear_caches(engine)
+        cold_ms.append(build_ms[-1] + time_call(search))
+
+    for _ in range(args.runs):
+        clear_caches(engine)
+        warm_ms.append(time_call(search))
+        # Degraded results are not cached, so only repeats the cache answered count as hits
+        start = time.perf_counter()
+        result = search()
+        if result.metadata["cached"]:
+            hit_ms.append((time.perf_counter() - start) * 1000)
+
+    print(f"collection={args.collection} embed_model={args.embed_model} runs={args.runs}")
+    print(f"engine build only : p50 {statistics.median(build_ms):8.1f} ms")
+    print(f"cold search       : p50 {statistics.median(cold_ms):8.1f} ms")
+    print(f"warm search       : p50 {statistics.median(warm_ms):8.1f} ms")
+    if hit_ms:
+        print(f"cache hit         : p50 {statistics.median(hit_ms):8.3f} ms ({len(hit_ms)}/{args.runs} repeats hit)")
+    else:
+        print(f"cache hit         : none of the {args.runs} repeats hit the result cache")
+
+
+if __name__ == "__main__":
+    main()
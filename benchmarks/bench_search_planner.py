@@ -0,0 +1,111 @@
+"""
+Sweep filter selectivity and compare the search strategies of the SearchPlanner.
+
+A synthetic corpus is loaded into Qdrant. For filters from broad to very narrow, every
+strategy (exact, filtered HNSW, unfiltered + post-filter) is forced in turn and timed, and its
+recall@k is measured against exact search. The planner's own choice is shown per filter.
+
+Point --url at a Qdrant server (e.g. docker run -p 6333:6333 qdrant/qdrant); the in-memory
+client always scans, so its timings don't reflect HNSW.
+
+    python -m benchmarks.bench_search_planner --url http://localhost:6333 --corpus-size 20000
+"""
+import argparse
+import math
+import time
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.filters import compile_subsidy_filter, subsidy_filter_spec
+from agent.retrievers.payload_indexes import create_payload_indexes
+from agent.retrievers.search_planner import (
+    EXACT,
+    FILTERED_HNSW,
+    POST_FILTER,
+    POST_FILTER_MAX_LIMIT,
+    POST_FILTER_OVERSAMPLING,
+    SearchPlan,
+)
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, TOPIC_WORDS, apopulate_collection, synthetic_subsidy_nodes
+
+COLLECTION_NAME = "bench_search_planner"
+
+# From broad to narrow on the synthetic corpus
+SWEEP = [
+    ("national + 3 regions", dict(include_national=True, regions=["Utrecht", "Limburg", "Zeeland"])),
+    ("national", dict(include_national=True)),
+    ("status Open", dict(include_national=False, status=["Open"])),
+    ("one region", dict(include_national=False, regions=["Utrecht"])),
+    ("one region, Open", dict(include_national=False, regions=["Utrecht"], status=["Open"])),
+    ("one region, Open, 2 categories", dict(
+        include_national=False, regions=["Utrecht"], status=["Open"],
+        categories=["ict.software", "onderzoek.innovatie.productinnovatie"],
+    )),
+]
+
+
+def forced_plan(strategy: str, top_k: int, matches: int, total: int) -> SearchPlan:
+    limit = top_k
+    if strategy == POST_FILTER and matches:
+        limit = min(max(math.ceil(top_k / (matches / total) * POST_FILTER_OVERSAMPLING), top_k), POST_FILTER_MAX_LIMIT)
+    return SearchPlan(strategy, limit, matches, total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Qdrant server URL (default: in-memory)")
+    parser.add_argument("--corpus-size", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=100)
+    args = parser.parse_args()
+
+    aclient = AsyncQdrantClient(url=args.url) if args.url else AsyncQdrantClient(location=":memory:")
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim)
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, synthetic_subsidy_nodes(args.corpus_size)))
+    if args.url:
+        create_payload_indexes(QdrantClient(url=args.url), COLLECTION_NAME)
+    else:
+        print("in-memory Qdrant: every strategy is a scan, timings are not representative\n")
+
+    engine = SubsidyRetriever(
+        COLLECTION_NAME,
+        embed_model,
+        similarity_top_k=args.top_k,
+        aclient=aclient,
+        reranker=FakeReranker(),
+    )
+    queries = [" ".join(TOPIC_WORDS[(i * 7 + j) % len(TOPIC_WORDS)] for j in range(3)) for i in range(args.queries)]
+    query_embeddings = [embed_model.get_query_embedding(query) for query in queries]
+
+    print(f"{'filter':<32} {'match':>7} {'plan':>14}  " + "  ".join(f"{s:>22}" for s in (EXACT, FILTERED_HNSW, POST_FILTER)))
+    for label, kwargs in SWEEP:
+        spec = subsidy_filter_spec(**kwargs)
+        combined_filter = compile_subsidy_filter(spec)
+        chosen = run_sync(engine.planner.aplan(combined_filter, args.top_k, 0))
+
+        ground_truth = []
+        cells = []
+        for strategy in (EXACT, FILTERED_HNSW, POST_FILTER):
+            plan = forced_plan(strategy, args.top_k, chosen.matches, chosen.total)
+            hits = 0
+            expected = 0
+            start = time.perf_counter()
+            for i, query_embedding in enumerate(query_embeddings):
+                nodes, _ = run_sync(engine._aexecute_plan(plan, query_embedding, spec, combined_filter))
+                ids = {node.node.node_id for node in nodes}
+                if strategy == EXACT:
+                    ground_truth.append(ids)
+                hits += len(ids & ground_truth[i])
+                expected += len(ground_truth[i])
+            elapsed_ms = (time.perf_counter() - start) / len(query_embeddings) * 1000
+            recall = hits / expected if expected else 1.0
+            cells.append(f"{elapsed_ms:7.2f} ms  recall {recall:4.2f}")
+
+        print(f"{label:<32} {chosen.selectivity:7.1%} {chosen.strategy:>14}  " + "  ".join(f"{c:>22}" for c in cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Hit rate, result agreement and latency of the semantic cache at several similarity thresholds.
+
+A synthetic corpus is loaded into an in-memory Qdrant. Base queries of five topic words run
+first and fill the cache; then every base query comes back rewritten as:
+- "reordered": the same words in another order;
+- "extra word": with a filler word added;
+- "dropped word": with one topic word left out;
+- "other need": with two topic words replaced, which should not be served from the cache.
+Per threshold and rewrite the benchmark reports the semantic hit rate and the mean agreement of
+the served results with a full search and rerank (verify_rate=1), then the p50 latency of the
+rewrites with the cache serving its hits. HashEmbedding is a bag of words, so reordered
+queries are identical to it; real embedders put such rewrites just below 1.0.
+
+    python -m benchmarks.bench_semantic_cache --thresholds 0.8 0.9 0.95 --embed-ms 50 --rerank-ms 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.semantic_cache import SemanticCache
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, TOPIC_WORDS, apopulate_collection, synthetic_subsidy_nodes
+
+COLLECTION_NAME = "bench_semantic_cache"
+
+REWRITES = ("reordered", "extra word", "dropped word", "other need")
+EXTRA_WORDS = ["graag", "subsidie", "regeling", "zoeken"]
+
+
+def rewrite(words, kind: str, rng: random.Random) -> str:
+    words = list(words)
+    if kind == "reordered":
+        rng.shuffle(words)
+    elif kind == "extra word":
+        words.insert(rng.randrange(len(words) + 1), rng.choice(EXTRA_WORDS))
+    elif kind == "dropped word":
+        words.pop(rng.randrange(len(words)))
+    elif kind == "other need":
+        for position in rng.sample(range(len(words)), 2):
+            words[position] = rng.choice([word for word in TOPIC_WORDS if word not in words])
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.8, 0.85, 0.9, 0.95, 0.99])
+    parser.add_argument("--embed-ms", type=float, default=0.0)
+    parser.add_argument("--rerank-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim, latency_seconds=args.embed_ms / 1000)
+    aclient = AsyncQdrantClient(location=":memory:")
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, synthetic_subsidy_nodes(args.corpus_size)))
+
+    rng = random.Random(0)
+    base_words = [rng.sample(TOPIC_WORDS, 5) for _ in range(args.queries)]
+    base_queries = [" ".join(words) for words in base_words]
+    rewritten = {kind: [rewrite(words, kind, rng) for words in base_words] for kind in REWRITES}
+
+    def run(threshold: float, verify_rate: float, queries):
+        get_result_cache().clear()
+        semantic_cache = SemanticCache(threshold=threshold, verify_rate=verify_rate)
+        engine = SubsidyRetriever(
+            COLLECTION_NAME,
+            embed_model,
+            similarity_top_k=args.top_k,
+            aclient=aclient,
+            reranker=FakeReranker(latency_seconds=args.rerank_ms / 1000),
+            semantic_cache=semantic_cache,
+        )
+        for query in base_queries:
+            engine.retrieve(query, latency_budget_ms=None)
+        results, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(engine.retrieve(query, latency_budget_ms=None))
+            latencies.append((time.perf_counter() - start) * 1000)
+        return results, latencies
+
+    print(f"{args.corpus_size} subsidies, {args.queries} base queries, rerank {args.rerank_ms:.0f} ms")
+    print(f"{'threshold':>9} {'rewrite':<13} {'hit rate':>9} {'similarity':>11} {'agreement':>10} {'p50 ms':>8}")
+    for threshold in args.thresholds:
+        for kind in REWRITES:
+            verified, _ = run(threshold, 1.0, rewritten[kind])
+            semantic = [result.metadata["semantic_cache"] for result in verified if "semantic_cache" in result.metadata]
+            _, latencies = run(threshold, 0.0, rewritten[kind])
+
+            similarity = f"{statistics.mean(hit['similarity'] for hit in semantic):11.3f}" if semantic else f"{'-':>11}"
+            agreement = f"{statistics.mean(hit['agreement'] for hit in semantic):10.2f}" if semantic else f"{'-':>10}"
+            print(f"{threshold:9.2f} {kind:<13} {len(semantic) / len(verified):9.2f} {similarity} {agreement} "
+                  f"{statistics.median(latencies):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
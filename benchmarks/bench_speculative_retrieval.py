@@ -0,0 +1,103 @@
+"""
+End-to-end latency of extract-then-retrieve versus retrieve_with_extraction.
+
+A synthetic corpus is loaded into an in-memory Qdrant. Every request names its filters in words
+("alleen in Utrecht", "landelijke", "status open", ...). A stand-in for the LLM extractor reads
+them with the rule-based extractor and then sleeps for --extract-ms. "sequential" extracts first
+and then runs engine.retrieve() with the filters. "concurrent" runs
+engine.retrieve_with_extraction(). The benchmark reports latencies and the share of requests
+served from the speculative candidates.
+
+    python -m benchmarks.bench_speculative_retrieval --extract-ms 800 --embed-ms 150
+"""
+import argparse
+import statistics
+import time
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.parameter_rules import extract_parameters_rules
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.search_planner import SPECULATIVE
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, REGIONS, TOPIC_WORDS, apopulate_collection, synthetic_subsidy_nodes
+
+COLLECTION_NAME = "bench_speculative_retrieval"
+
+# From broad to narrow
+FILTER_PHRASES = [
+    "",
+    "landelijke regelingen",
+    "in {region} of landelijk",
+    "status open, in {region}",
+    "alleen in {region}",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--extract-ms", type=float, default=800.0)
+    parser.add_argument("--embed-ms", type=float, default=150.0)
+    parser.add_argument("--rerank-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim, latency_seconds=args.embed_ms / 1000)
+    aclient = AsyncQdrantClient(location=":memory:")
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, synthetic_subsidy_nodes(args.corpus_size)))
+    engine = SubsidyRetriever(
+        COLLECTION_NAME,
+        embed_model,
+        similarity_top_k=args.top_k,
+        aclient=aclient,
+        reranker=FakeReranker(latency_seconds=args.rerank_ms / 1000),
+    )
+
+    def llm_extractor(user_input: str):
+        time.sleep(args.extract_ms / 1000)
+        return extract_parameters_rules(user_input)
+
+    def requests(mode: str):
+        # The mode is part of the text, so neither mode finds the other's embeddings in the cache
+        return [
+            f"{mode} {i}: subsidie voor {TOPIC_WORDS[i % len(TOPIC_WORDS)]} "
+            + FILTER_PHRASES[i % len(FILTER_PHRASES)].format(region=REGIONS[i % len(REGIONS)])
+            for i in range(args.requests)
+        ]
+
+    def sequential(user_input: str):
+        include_national, regions, status = llm_extractor(user_input)
+        return engine.retrieve(
+            user_input,
+            include_national=True if include_national is None else include_national,
+            regions=regions,
+            status=status,
+            latency_budget_ms=None,
+        )
+
+    def concurrent(user_input: str):
+        return engine.retrieve_with_extraction(user_input, llm_extractor, latency_budget_ms=None)
+
+    print(f"extract {args.extract_ms:.0f} ms, embed {args.embed_ms:.0f} ms, rerank {args.rerank_ms:.0f} ms, "
+          f"{args.corpus_size} subsidies")
+    for label, retrieve in (("sequential", sequential), ("concurrent", concurrent)):
+        get_result_cache().clear()
+        latencies = []
+        speculative = 0
+        for user_input in requests(label):
+            start = time.perf_counter()
+            result = retrieve(user_input)
+            latencies.append((time.perf_counter() - start) * 1000)
+            plan = result.metadata.get("search_plan") or {}
+            speculative += plan.get("strategy") == SPECULATIVE
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(f"{label:>10}: p50 {statistics.median(latencies):7.1f} ms  p95 {p95:7.1f} ms  "
+              f"served from speculation {speculative}/{len(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
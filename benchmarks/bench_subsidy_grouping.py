@@ -0,0 +1,73 @@
+"""
+Rerank input size and diversity with and without grouping the dense hits per subsidy.
+
+Synthetic subsidies are split into --chunks chunks each (as SentenceSplitter does with a long
+Samenvatting) and loaded into an in-memory Qdrant. The same queries run on engines keeping all
+chunks (0) or the best 1 or 2 chunks per subsidy, and per query the benchmark reports the
+documents sent to rerank, the Cohere search units they would cost (one per 100 documents), the
+distinct subsidies among them and the duplicate subsidies in the reranked top_n.
+
+    python -m benchmarks.bench_subsidy_grouping --corpus-size 2000 --chunks 3
+"""
+import argparse
+import math
+import statistics
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.reranking import subsidy_key
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, TOPIC_WORDS, apopulate_collection, chunk_nodes, synthetic_subsidy_nodes
+
+COLLECTION_NAME = "bench_subsidy_grouping"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Subsidies")
+    parser.add_argument("--chunks", type=int, default=3, help="Chunks per subsidy")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=args.dim)
+    aclient = AsyncQdrantClient(location=":memory:")
+    chunks = chunk_nodes(synthetic_subsidy_nodes(args.corpus_size), args.chunks)
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, chunks))
+    print(f"{args.corpus_size} subsidies in {len(chunks)} chunks, top_k {args.top_k}, top_n {args.top_n}")
+
+    queries = [
+        f"regeling {i} " + " ".join(TOPIC_WORDS[(i * 5 + j) % len(TOPIC_WORDS)] for j in range(3))
+        for i in range(args.queries)
+    ]
+
+    print(f"{'chunks/subsidy':>14} {'rerank docs':>12} {'search units':>13} {'subsidies':>10} {'dup in top_n':>13}")
+    for chunks_per_subsidy in (0, 1, 2):
+        reranker = FakeReranker(top_n=args.top_n)
+        engine = SubsidyRetriever(
+            COLLECTION_NAME,
+            embed_model,
+            similarity_top_k=args.top_k,
+            aclient=aclient,
+            reranker=reranker,
+            chunks_per_subsidy=chunks_per_subsidy,
+        )
+        documents, units, subsidies, duplicates = [], [], [], []
+        for query in queries:
+            before = reranker.documents
+            result = engine.retrieve(query, latency_budget_ms=None)
+            documents.append(reranker.documents - before)
+            units.append(math.ceil(documents[-1] / 100))
+            subsidies.append(len({subsidy_key(node) for node in result.nodes_embed}))
+            duplicates.append(len(result.nodes_reranked) - len({subsidy_key(node) for node in result.nodes_reranked}))
+
+        label = chunks_per_subsidy or "all"
+        print(f"{label:>14} {statistics.mean(documents):12.1f} {statistics.mean(units):13.2f} "
+              f"{statistics.mean(subsidies):10.1f} {statistics.mean(duplicates):13.2f}")
+
+
+if __name__ == "__main__":
+    main()
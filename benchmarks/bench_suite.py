@@ -0,0 +1,164 @@
+"""
+Offline latency and throughput of retrieve_subsidies across corpus size, top_k, filter
+selectivity and concurrency, written to JSON so runs can be compared over time.
+
+For every corpus size a synthetic corpus (the metadata layout of create_documents_from_subsidies)
+is loaded into an in-memory Qdrant collection with the HashEmbedding fake. For every top_k a
+SubsidyRetriever with that collection, HashEmbedding and FakeReranker is registered, so
+retrieve_subsidies(..., embed_model="hash-bench") runs the production code path without API keys.
+Each scenario sends --requests distinct queries from --concurrency threads and reports the
+p50/p95/p99 latency per request and the throughput. --embed-ms and --rerank-ms add provider-like
+latency to the fakes; by default only the code's own cost is measured.
+
+Results go to --output (benchmark-results/suite-<time>.json by default) with the arguments, the git
+commit and the Python version. --compare prints the change in p50 and p95 against an earlier file.
+
+    python -m benchmarks.bench_suite --corpus-sizes 1000 10000 --top-k 25 100 --concurrency 1 8
+    python -m benchmarks.bench_suite --compare benchmark-results/suite-20241201-101500.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.filters import payload_matches, subsidy_filter_spec
+from agent.retrievers.result_cache import get_result_cache
+from agent.retrievers.retriever_baseline import retrieve_subsidies
+from agent.retrievers.subsidy_retriever import SubsidyRetriever, register_subsidy_retriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, TOPIC_WORDS, apopulate_collection, synthetic_subsidy_nodes
+
+EMBED_MODEL_NAME = "hash-bench"
+
+# retrieve_subsidies filter arguments, from unfiltered to narrow
+FILTERS = {
+    "none": {"include_national": False},
+    "national": {"include_national": True},
+    "region": {"include_national": False, "regions": ["Utrecht"]},
+    "region+status": {"include_national": False, "regions": ["Utrecht"], "status": ["Open"]},
+    "category": {"include_national": False, "categories": ["ict.software"]},
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentiles(latencies):
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": cuts[49], "p95_ms": cuts[94], "p99_ms": cuts[98]}
+
+
+def run_scenario(collection_name: str, top_k: int, filters: dict, concurrency: int, requests: int, label: str) -> dict:
+    queries = [
+        f"{label} {i} " + " ".join(TOPIC_WORDS[(i * 7 + j) % len(TOPIC_WORDS)] for j in range(3))
+        for i in range(requests)
+    ]
+
+    def timed(query: str) -> float:
+        start = time.perf_counter()
+        retrieve_subsidies(query, collection_name=collection_name, embed_model=EMBED_MODEL_NAME,
+                           similarity_top_k=top_k, latency_budget_ms=None, **filters)
+        return (time.perf_counter() - start) * 1000
+
+    get_result_cache().clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, queries))
+    wall_seconds = time.perf_counter() - start
+    return {**percentiles(latencies), "mean_ms": statistics.mean(latencies), "throughput_rps": requests / wall_seconds}
+
+
+def print_comparison(results: list, previous_path: str) -> None:
+    previous = {
+        scenario["name"]: scenario for scenario in json.loads(Path(previous_path).read_text())["scenarios"]
+    }
+    print(f"\nchange against {previous_path} ({len(previous)} scenarios)")
+    for scenario in results:
+        before = previous.get(scenario["name"])
+        if before is None:
+            continue
+        changes = "  ".join(
+            f"{key} {(scenario[key] - before[key]) / before[key]:+7.1%}" for key in ("p50_ms", "p95_ms") if before[key]
+        )
+        print(f"{scenario['name']:<44} {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[25, 100])
+    parser.add_argument("--filters", nargs="+", choices=list(FILTERS), default=list(FILTERS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--embed-ms", type=float, default=0.0)
+    parser.add_argument("--rerank-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="JSON file to write (default benchmark-results/suite-<time>.json)")
+    parser.add_argument("--compare", help="Earlier JSON result to compare with")
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name=EMBED_MODEL_NAME, embed_dim=args.dim, latency_seconds=args.embed_ms / 1000)
+    aclient = AsyncQdrantClient(location=":memory:")
+
+    results = []
+    print(f"{'scenario':<44} {'select':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for corpus_size in args.corpus_sizes:
+        collection_name = f"bench_suite_{corpus_size}"
+        nodes = synthetic_subsidy_nodes(corpus_size)
+        run_sync(apopulate_collection(aclient, collection_name, embed_model, nodes))
+
+        for top_k in args.top_k:
+            register_subsidy_retriever(SubsidyRetriever(
+                collection_name,
+                embed_model,
+                similarity_top_k=top_k,
+                aclient=aclient,
+                reranker=FakeReranker(latency_seconds=args.rerank_ms / 1000),
+                hybrid=None,
+            ))
+            for filter_name in args.filters:
+                spec = subsidy_filter_spec(**FILTERS[filter_name])
+                selectivity = sum(payload_matches(spec, node.metadata) for node in nodes) / len(nodes)
+                for concurrency in args.concurrency:
+                    name = f"n={corpus_size} top_k={top_k} filter={filter_name} c={concurrency}"
+                    measured = run_scenario(collection_name, top_k, FILTERS[filter_name], concurrency, args.requests, name)
+                    results.append({
+                        "name": name,
+                        "corpus_size": corpus_size,
+                        "top_k": top_k,
+                        "filter": filter_name,
+                        "selectivity": selectivity,
+                        "concurrency": concurrency,
+                        "requests": args.requests,
+                        **measured,
+                    })
+                    print(f"{name:<44} {selectivity:7.1%} {measured['p50_ms']:8.2f} {measured['p95_ms']:8.2f} "
+                          f"{measured['p99_ms']:8.2f} {measured['throughput_rps']:8.1f}")
+
+    output = Path(args.output or f"benchmark-results/suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "arguments": vars(args),
+        "scenarios": results,
+    }, indent=2))
+    print(f"\nwrote {len(results)} scenarios to {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Request-path overhead and exported volume of tracing, from register() defaults to sampled export.
+
+Each request is a real SubsidyRetriever.retrieve() against an in-memory Qdrant collection with the
+offline fakes, traced the way init_tracing() traces production: the engine's root span with its
+search and rerank children, and the LlamaIndex instrumentor's spans of the query embedding. The
+search returns --nodes documents. A --slow-rate share of the requests gets a rerank that takes
+--slow-ms (the policies' slow threshold) and an --error-rate share a rerank that fails. The spans
+go to a LocalOTLPCollector on localhost that waits --collector-ms per export request. The
+configurations:
+- "off": tracing disabled, the baseline for the overhead;
+- "register()": what init_tracing() used to get from phoenix.otel.register(), a SimpleSpanProcessor
+  exporting every span on the request path, with the SDK's default limits (128 attributes per
+  span, values of any length) and embedding vectors included;
+- "batched": a BatchSpanProcessor exporting every trace with full attributes;
+- "batched+truncated": the same with attributes truncated and embedding vectors hidden;
+- "sampled": the default TraceExportPolicy, with a share of the traces plus every slow or failing one;
+- "head-sampled": the default policy with only a --head-ratio share of the traces recorded at all.
+The benchmark reports per request latency and the overhead per span against "off", plus the
+spans, export requests and megabytes the collector received.
+
+    python -m benchmarks.bench_trace_export --requests 200 --collector-ms 50
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from dataclasses import replace
+
+from openinference.instrumentation import TraceConfig
+from openinference.instrumentation.llama_index import LlamaIndexInstrumentor
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from phoenix.otel import PROJECT_NAME, HTTPSpanExporter, TracerProvider
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.embedding_cache import EmbeddingCache
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from agent.retrievers.tracing import DEFAULT_TRACE_EXPORT_POLICY, build_tracer_provider, set_retrieval_tracer_provider
+from benchmarks.fakes import (
+    FakeReranker,
+    HashEmbedding,
+    LocalOTLPCollector,
+    TOPIC_WORDS,
+    apopulate_collection,
+    synthetic_subsidy_nodes,
+)
+
+COLLECTION_NAME = "bench_trace_export"
+EMBED_DIM = 1024
+
+
+class FlakyReranker(FakeReranker):
+    """
+    FakeReranker whose next calls are slow or fail, as set in mode ("slow", "fail" or None).
+    """
+
+    def __init__(self, slow_seconds: float, **kwargs):
+        super().__init__(**kwargs)
+        self.slow_seconds = slow_seconds
+        self.mode = None
+
+    async def arerank(self, query, nodes, texts=None):
+        if self.mode == "fail":
+            raise RuntimeError("rerank failed")
+        if self.mode == "slow":
+            await asyncio.sleep(self.slow_seconds)
+        return await super().arerank(query, nodes, texts)
+
+
+def run_requests(engine, queries, modes):
+    latencies = []
+    for query, mode in zip(queries, modes):
+        engine.reranker.mode = mode
+        start = time.perf_counter()
+        try:
+            engine.retrieve(query, latency_budget_ms=None)
+        except RuntimeError:
+            pass
+        latencies.append((time.perf_counter() - start) * 1000)
+    engine.reranker.mode = None
+    return latencies
+
+
+def traced(tracer_provider, hide_vectors):
+    """
+    Route the engine's spans and the LlamaIndex instrumentor's spans to tracer_provider.
+    """
+    set_retrieval_tracer_provider(tracer_provider)
+    LlamaIndexInstrumentor().instrument(
+        tracer_provider=tracer_provider, config=TraceConfig(hide_embedding_vectors=hide_vectors)
+    )
+
+
+def untraced():
+    set_retrieval_tracer_provider(None)
+    LlamaIndexInstrumentor().uninstrument()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--nodes", type=int, default=100, help="Documents per search and rerank")
+    parser.add_argument("--collector-ms", type=float, default=50.0, help="Delay per export request")
+    parser.add_argument("--slow-rate", type=float, default=0.02)
+    parser.add_argument("--slow-ms", type=float, default=250.0, help="Rerank latency of slow requests")
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--head-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    embed_model = HashEmbedding(model_name="hash-bench", embed_dim=EMBED_DIM)
+    aclient = AsyncQdrantClient(location=":memory:")
+    run_sync(apopulate_collection(aclient, COLLECTION_NAME, embed_model, synthetic_subsidy_nodes(args.corpus_size, sentences=40)))
+    engine = SubsidyRetriever(
+        COLLECTION_NAME,
+        embed_model,
+        similarity_top_k=args.nodes,
+        aclient=aclient,
+        reranker=FlakyReranker(args.slow_ms / 1000),
+        hybrid=None,
+    )
+    # The on-disk cache would answer the queries of earlier runs and skip their embedding spans
+    engine.embedding_cache = EmbeddingCache(":memory:")
+
+    rng = random.Random(1)
+    modes = []
+    for _ in range(args.requests):
+        draw = rng.random()
+        modes.append("slow" if draw < args.slow_rate else "fail" if draw < args.slow_rate + args.error_rate else None)
+
+    def queries(label):
+        # Distinct per configuration, so neither the result cache nor the embedding cache answers
+        return [f"{label} {i} " + " ".join(rng.sample(TOPIC_WORDS, 3)) for i in range(args.requests)]
+
+    # register() keeps the SDK's 128 attributes per span and logs every attribute it drops
+    logging.getLogger("opentelemetry.attributes").setLevel(logging.ERROR)
+    # Qdrant's first searches are slower; warm up before the untraced baseline
+    run_requests(engine, queries("warm-up"), [None] * args.requests)
+
+    policy = replace(DEFAULT_TRACE_EXPORT_POLICY, slow_ms=args.slow_ms)
+
+    # The span tree of one request, as exported under the default limits
+    exporter = InMemorySpanExporter()
+    tracer_provider = build_tracer_provider(policy=replace(policy, sample_ratio=1.0), span_exporter=exporter)
+    traced(tracer_provider, hide_vectors=True)
+    engine.retrieve("span tree " + " ".join(TOPIC_WORDS[:3]), latency_budget_ms=None)
+    untraced()
+    tracer_provider.force_flush()
+    spans = exporter.get_finished_spans()
+    spans_per_request = len(spans)
+    print("span tree: " + ", ".join(f"{span.name} ({len(span.attributes)} attributes)" for span in spans))
+
+    collector = LocalOTLPCollector(latency_seconds=args.collector_ms / 1000)
+
+    def register_like():
+        tracer_provider = TracerProvider(resource=Resource.create({PROJECT_NAME: "bench"}), verbose=False)
+        tracer_provider.add_span_processor(SimpleSpanProcessor(HTTPSpanExporter(endpoint=collector.endpoint)))
+        return tracer_provider
+
+    unbounded = replace(policy, head_sample_ratio=1.0, sample_ratio=1.0, max_attribute_length=None,
+                        hide_embedding_vectors=False)
+    configurations = [
+        ("register()", register_like, False),
+        ("batched", lambda: build_tracer_provider(collector.endpoint, "bench", unbounded), False),
+        ("batched+truncated", lambda: build_tracer_provider(collector.endpoint, "bench", replace(
+            policy, head_sample_ratio=1.0, sample_ratio=1.0)), True),
+        ("sampled", lambda: build_tracer_provider(collector.endpoint, "bench", replace(
+            policy, head_sample_ratio=1.0)), True),
+        ("head-sampled", lambda: build_tracer_provider(collector.endpoint, "bench", replace(
+            policy, head_sample_ratio=args.head_ratio)), True),
+    ]
+
+    print(f"{args.requests} requests, {spans_per_request} spans each, {args.nodes} documents per search, "
+          f"collector {args.collector_ms:.0f} ms per export request")
+    print(f"{'configuration':<18} {'p50 ms':>8} {'p95 ms':>8} {'us/span':>8} {'spans':>7} {'exports':>8} {'MB':>7}")
+
+    baseline = run_requests(engine, queries("off"), modes)
+    baseline_mean = statistics.mean(baseline)
+    print(f"{'off':<18} {statistics.median(baseline):8.2f} {statistics.quantiles(baseline, n=20)[-1]:8.2f}")
+    for label, build, hide_vectors in configurations:
+        tracer_provider = build()
+        collector.reset()
+        traced(tracer_provider, hide_vectors)
+        latencies = run_requests(engine, queries(label), modes)
+        untraced()
+        tracer_provider.force_flush()
+        tracer_provider.shutdown()
+
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        per_span_us = (statistics.mean(latencies) - baseline_mean) * 1000 / spans_per_request
+        print(f"{label:<18} {statistics.median(latencies):8.2f} {p95:8.2f} {per_span_us:8.1f} "
+              f"{collector.spans:7d} {collector.requests:8d} {collector.bytes / 1e6:7.2f}")
+
+    collector.close()
+
+
+if __name__ == "__main__":
+    main()
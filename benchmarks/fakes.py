@@ -0,0 +1,363 @@
+"""
+Offline stand-ins for the hosted services, so benchmarks and stress runs need no API keys.
+
+HashEmbedding is a deterministic feature-hashing embedder (texts sharing words get similar
+vectors), HashSparseEncoder a term-frequency stand-in for the SPLADE encoder, FakeReranker scores
+by word overlap, and apopulate_collection loads nodes into a Qdrant collection laid out like the
+production one (named "text-dense" and "text-sparse-new" vectors, llama_index payload).
+LocalOTLPCollector stands in for the Phoenix collector: an OTLP/HTTP endpoint that counts what it receives.
+"""
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Sequence, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode, NodeRelationship, NodeWithScore, TextNode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from pydantic import Field
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Distance, PointStruct, SparseVector, SparseVectorParams, VectorParams
+
+from agent.retrievers.filters import CATEGORY_LEAF_PATHS
+from agent.retrievers.hybrid import SPARSE_VECTOR_NAME, SparseEncoderFn
+from agent.retrievers.metrics import PROVIDER_UNITS, count
+from agent.retrievers.payload import ingest_payload
+from agent.retrievers.reranking import approximate_tokens
+from agent.retrievers.subsidy_retriever import DENSE_VECTOR_NAME
+from agent.tools.subsidy_report_parameters import REGIONS, STATUS
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+TOPIC_WORDS = [
+    "innovatie", "software", "zorg", "energie", "zonnepanelen", "batterij", "landbouw", "biologisch",
+    "export", "onderzoek", "onderwijs", "cultuur", "mobiliteit", "waterstof", "circulair", "bouw",
+    "mkb", "startup", "digitalisering", "duurzaamheid", "natuur", "visserij", "toerisme", "vakmanschap",
+]
+FILLER_WORDS = [
+    "aanvraag", "voorwaarden", "kosten", "begroting", "projectplan", "samenwerking", "looptijd",
+    "beoordeling", "vergoeding", "cofinanciering", "haalbaarheid", "rapportage", "verantwoording",
+]
+# Tokens Cohere rerank bills as one document, query included
+COHERE_DOCUMENT_TOKENS = 500
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Deterministic embedder: every word is hashed (salted with the model name) onto one signed
+    dimension and the sum is L2-normalized. An optional per-call latency simulates the API.
+    """
+
+    embed_dim: int = Field(default=256, gt=0)
+    latency_seconds: float = Field(default=0.0, ge=0.0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.embed_dim
+        for token in tokenize(text):
+            digest = hashlib.blake2b(f"{self.model_name}\x1f{token}".encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.embed_dim] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_query_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._aget_query_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return [self._embed(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return [self._embed(text) for text in texts]
+
+
+class HashSparseEncoder:
+    """
+    Sparse encoder with the fastembed_sparse_encoder signature: every word is hashed onto a
+    vocabulary id and weighted 1 + log(term frequency). latency_seconds per call simulates model inference.
+    """
+
+    def __init__(self, vocabulary_size: int = 1 << 20, latency_seconds: float = 0.0):
+        self.vocabulary_size = vocabulary_size
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def _token_id(self, token: str) -> int:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.vocabulary_size
+
+    def __call__(self, texts: List[str]) -> Tuple[List[List[int]], List[List[float]]]:
+        self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        indices, values = [], []
+        for text in texts:
+            counts = Counter(self._token_id(token) for token in tokenize(text))
+            indices.append(list(counts))
+            values.append([1.0 + math.log(count) for count in counts.values()])
+        return indices, values
+
+
+class FakeReranker:
+    """
+    Drop-in for CohereReranker that scores nodes by the share of query words they contain.
+    Latency is latency_seconds per call plus seconds_per_1k_tokens of document text;
+    billed_documents counts documents the way Cohere bills them (split per COHERE_DOCUMENT_TOKENS).
+    """
+
+    def __init__(
+        self,
+        top_n: int = 10,
+        model: str = "fake-rerank",
+        latency_seconds: float = 0.0,
+        seconds_per_1k_tokens: float = 0.0,
+    ):
+        self.top_n = top_n
+        self.model = model
+        self.latency_seconds = latency_seconds
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.calls = 0
+        self.documents = 0
+        self.tokens = 0
+        self.billed_documents = 0
+
+    async def arerank(self, query: str, nodes: List[NodeWithScore], texts: Optional[List[str]] = None) -> List[NodeWithScore]:
+        self.calls += 1
+        self.documents += len(nodes)
+        if not nodes:
+            return []
+
+        if texts is None:
+            texts = [node.node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        document_tokens = [approximate_tokens(text) for text in texts]
+        query_length = approximate_tokens(query)
+        self.tokens += sum(document_tokens)
+        billed_documents = sum(math.ceil((t + query_length) / COHERE_DOCUMENT_TOKENS) for t in document_tokens)
+        self.billed_documents += billed_documents
+        # Cohere bills one search unit per 100 documents
+        count(PROVIDER_UNITS, math.ceil(billed_documents / 100), provider="fake", unit="search_units")
+        latency = self.latency_seconds + sum(document_tokens) / 1000 * self.seconds_per_1k_tokens
+        if latency:
+            await asyncio.sleep(latency)
+
+        query_tokens = set(tokenize(query))
+        scored = []
+        for node, text in zip(nodes, texts):
+            tokens = set(tokenize(text))
+            overlap = len(query_tokens & tokens)
+            score = overlap / math.sqrt(len(query_tokens) * len(tokens)) if query_tokens and tokens else 0.0
+            scored.append(NodeWithScore(node=node.node, score=score))
+        scored.sort(key=lambda n: n.score, reverse=True)
+        return scored[:self.top_n]
+
+
+async def apopulate_collection(
+    aclient: AsyncQdrantClient,
+    collection_name: str,
+    embed_model: HashEmbedding,
+    nodes: Sequence[BaseNode],
+    batch_size: int = 256,
+    sparse_encoder: Optional[SparseEncoderFn] = None,
+) -> None:
+    """
+    (Re)create a collection and upsert the nodes with their embeddings and the payload
+    embed_documents writes (lean llama_index node JSON plus the category bitset).
+    With a sparse_encoder the points also get the sparse vector hybrid search uses.
+    """
+    if await aclient.collection_exists(collection_name=collection_name):
+        await aclient.delete_collection(collection_name=collection_name)
+    await aclient.create_collection(
+        collection_name=collection_name,
+        vectors_config={DENSE_VECTOR_NAME: VectorParams(size=embed_model.embed_dim, distance=Distance.COSINE)},
+        sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams()} if sparse_encoder else None,
+    )
+
+    for start in range(0, len(nodes), batch_size):
+        batch = nodes[start:start + batch_size]
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        embeddings = await embed_model.aget_text_embedding_batch(texts)
+        vectors = [{DENSE_VECTOR_NAME: embedding} for embedding in embeddings]
+        if sparse_encoder:
+            for vector, indices, values in zip(vectors, *sparse_encoder(texts)):
+                vector[SPARSE_VECTOR_NAME] = SparseVector(indices=indices, values=values)
+        await aclient.upsert(
+            collection_name=collection_name,
+            points=[
+                PointStruct(
+                    id=node.node_id,
+                    vector=vector,
+                    payload=ingest_payload(node_to_metadata_dict(node, remove_text=False, flat_metadata=False)),
+                )
+                for node, vector in zip(batch, vectors)
+            ],
+        )
+
+
+def synthetic_subsidy_nodes(count: int, seed: int = 0, sentences: int = 0) -> List[TextNode]:
+    """
+    Generate subsidy-like nodes with the metadata layout of create_documents_from_subsidies
+    (display fields, Status, Bereik and a nested Categories dict with every CategorieSelectie
+    leaf filled in) and its region and status values, reproducible for a given seed. sentences
+    adds that many sentences of procedural filler, half on the subsidy's own topics, for
+    Samenvatting-length texts.
+    """
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(count):
+        topics = rng.sample(TOPIC_WORDS, 4)
+        bereik = ["National"] if rng.random() < 0.4 else rng.sample(REGIONS, rng.randint(1, 2))
+
+        selected = set(rng.sample(CATEGORY_LEAF_PATHS, rng.randint(1, 4)))
+        categories: dict = {}
+        for path in CATEGORY_LEAF_PATHS:
+            *parents, leaf = path.split(".")
+            level = categories
+            for parent in parents:
+                level = level.setdefault(parent, {})
+            level[leaf] = path in selected
+
+        minimum = rng.choice([0, 5000, 25000])
+        metadata = {
+            "title": f"Regeling {i} {topics[0]} {topics[1]}",
+            "Afkorting": f"R{i}",
+            "Laatste wijziging": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "Status": rng.choice(STATUS),
+            "Deadline": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "Minimale bijdrage": f"€ {minimum}",
+            "Maximale bijdrage": f"€ {minimum + rng.choice([50000, 250000, 1000000])}",
+            "Budget": f"€ {rng.randint(1, 50)} miljoen",
+            "Aanvraagtermijn": rng.choice(["Doorlopend", "Tender", "Op volgorde van binnenkomst"]),
+            "Bereik": bereik,
+            "Indienprocedure": "Aanvragen via het digitale loket.",
+            "Categories": categories,
+        }
+        nodes.append(
+            TextNode(
+                id_=f"00000000-0000-4000-8000-{i:012d}",
+                text=(
+                    f"Samenvatting: subsidie voor {' '.join(topics)} bij bedrijven en instellingen. "
+                    f"De regeling ondersteunt projecten rond {topics[0]} en {topics[1]}, "
+                    f"met aandacht voor {topics[2]} en {topics[3]}."
+                ) + "".join(
+                    f" De {rng.choice(FILLER_WORDS)} voor {rng.choice(topics + TOPIC_WORDS[:4])} wordt getoetst op "
+                    f"{rng.choice(FILLER_WORDS)} en {rng.choice(FILLER_WORDS)}."
+                    for _ in range(sentences)
+                ),
+                metadata=metadata,
+                excluded_embed_metadata_keys=list(metadata.keys()),
+                excluded_llm_metadata_keys=list(metadata.keys()),
+            )
+        )
+    return nodes
+
+
+def chunk_nodes(nodes: Sequence[TextNode], chunks_per_node: int, seed: int = 0) -> List[TextNode]:
+    """
+    Split every node into chunks_per_node chunks the way SentenceSplitter splits a Samenvatting:
+    each chunk keeps the metadata and points to its node as source document.
+    """
+    rng = random.Random(seed)
+    chunks = []
+    for node in nodes:
+        for c in range(chunks_per_node):
+            topics = rng.sample(TOPIC_WORDS, 2)
+            chunk = TextNode(
+                id_=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{node.node_id}#{c}")),
+                text=f"{node.text} Deel {c}: {topics[0]} en {topics[1]}." if c else node.text,
+                metadata=node.metadata,
+                excluded_embed_metadata_keys=node.excluded_embed_metadata_keys,
+                excluded_llm_metadata_keys=node.excluded_llm_metadata_keys,
+            )
+            chunk.relationships[NodeRelationship.SOURCE] = node.as_related_node_info()
+            chunks.append(chunk)
+    return chunks
+
+
+class LocalOTLPCollector:
+    """
+    OTLP/HTTP traces endpoint on localhost that counts export requests, bytes and spans, with an
+    optional delay per request to stand in for the round trip to a hosted collector.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+            ExportTraceServiceRequest,
+            ExportTraceServiceResponse,
+        )
+
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+        self.bytes = 0
+        self.spans = 0
+        self._lock = threading.Lock()
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = ExportTraceServiceRequest()
+                request.ParseFromString(body)
+                spans = sum(
+                    len(scope_spans.spans)
+                    for resource_spans in request.resource_spans
+                    for scope_spans in resource_spans.scope_spans
+                )
+                with collector._lock:
+                    collector.requests += 1
+                    collector.bytes += len(body)
+                    collector.spans += spans
+                if collector.latency_seconds:
+                    time.sleep(collector.latency_seconds)
+
+                response = ExportTraceServiceResponse().SerializeToString()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self._server.server_address[1]}/v1/traces"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = self.bytes = self.spans = 0
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,115 @@
+"""
+Stress run: mixed cohere/openai-shaped searches from many threads at once.
+
+Two engines with different embedding dimensions share one in-memory Qdrant and the
+process-wide caches. Every result is checked to come from the collection of the engine
+that served it, and the global llama_index Settings must stay untouched.
+Runs fully offline on the fakes in benchmarks.fakes.
+
+    python -m benchmarks.stress_mixed_embedders --threads 32 --requests 2000
+"""
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from llama_index.core import Settings
+from qdrant_client import AsyncQdrantClient
+
+from agent.retrievers.embedding_cache import EmbeddingCache
+from agent.retrievers.engine_loop import run_sync
+from agent.retrievers.subsidy_retriever import SubsidyRetriever
+from benchmarks.fakes import FakeReranker, HashEmbedding, TOPIC_WORDS, apopulate_collection, synthetic_subsidy_nodes
+
+# Dimensions of embed-english-v3.0 and text-embedding-3-large
+EMBEDDERS = {"cohere": 1024, "openai": 3072}
+
+
+def build_engines(aclient: AsyncQdrantClient, corpus_size: int):
+    engines = {}
+    for name, dim in EMBEDDERS.items():
+        collection_name = f"stress_{name}"
+        embed_model = HashEmbedding(model_name=f"hash-{name}", embed_dim=dim)
+
+        nodes = synthetic_subsidy_nodes(corpus_size, seed=dim)
+        for node in nodes:
+            node.metadata["collection"] = collection_name
+            node.excluded_embed_metadata_keys.append("collection")
+        run_sync(apopulate_collection(aclient, collection_name, embed_model, nodes))
+
+        engine = SubsidyRetriever(
+            collection_name=collection_name,
+            embed_model=embed_model,
+            similarity_top_k=50,
+            aclient=aclient,
+            reranker=FakeReranker(top_n=10),
+        )
+        engine.embedding_cache = EmbeddingCache(":memory:")
+        engines[name] = engine
+    return engines
+
+
+def one_request(engine: SubsidyRetriever, query: str, regions):
+    result = engine.retrieve(query, include_national=True, regions=regions)
+    wrong = [n for n in result.nodes_embed if n.node.metadata.get("collection") != engine.collection_name]
+    if wrong:
+        raise AssertionError(f"{len(wrong)} nodes from another collection in a {engine.collection_name} result")
+    if any(len(n.node.metadata.get("Bereik", [])) == 0 for n in result.nodes_embed):
+        raise AssertionError("node without Bereik in result")
+    return engine.embed_model_name, result.metadata["elapsed_ms"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    aclient = AsyncQdrantClient(location=":memory:")
+    engines = build_engines(aclient, args.corpus_size)
+
+    rng = random.Random(args.seed)
+    jobs = []
+    for i in range(args.requests):
+        engine = engines[rng.choice(list(EMBEDDERS))]
+        # Unique queries, so every request goes through embed, search and rerank
+        query = f"{' '.join(rng.sample(TOPIC_WORDS, 3))} {i}"
+        regions = rng.sample(["Utrecht", "Gelderland", "Limburg"], rng.randint(0, 2))
+        jobs.append((engine, query, regions))
+
+    served = Counter()
+    errors = []
+    latencies = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(one_request, *job) for job in jobs]
+        for future in as_completed(futures):
+            try:
+                embed_model_name, elapsed_ms = future.result()
+                served[embed_model_name] += 1
+                latencies.append(elapsed_ms)
+            except Exception as e:
+                errors.append(repr(e))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{args.requests} requests from {args.threads} threads in {seconds:.2f}s "
+          f"({args.requests / seconds:.1f} requests/s)")
+    print(f"served per embedder: {dict(served)}")
+    if latencies:
+        print(f"engine latency p50 {latencies[len(latencies) // 2]:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms")
+    print(f"global Settings.embed_model set: {Settings._embed_model is not None}")
+    print(f"errors: {len(errors)}")
+    for error in errors[:10]:
+        print(f"  {error}")
+
+    if errors or Settings._embed_model is not None:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ import time
 import pickle
 from datetime import datetime
 
-from llama_index.core import Settings, Document, VectorStoreIndex, StorageContext
+from llama_index.core import Document, VectorStoreIndex, StorageContext
 from llama_index.vector_stores.qdrant import QdrantVectorStore
 from llama_index.embeddings.cohere import CohereEmbedding
 from llama_index.embeddings.openai import OpenAIEmbedding
@@ -19,6 +19,11 @@ from llama_index.core.node_parser import SentenceSplitter
 from qdrant_client import QdrantClient
 
 from agent.tools.tool_query_subsidies import CategorieSelectie
+from agent.retrievers.collection_versions import write_collection_epoch
+from agent.retrievers.payload import ingest_payload
+from agent.retrievers.payload_indexes import create_payload_indexes
+from agent.retrievers.local_backend import save_vector_snapshot
+from agent.retrievers.subsidy_retriever import DENSE_VECTOR_NAME
 
 from agent.prompts.prompts import SYSTEM_PROMPT_CATEGORY_EXTRACTOR
 
@@ -233,9 +238,23 @@ def create_documents_from_subsidies(subsidies: list) -> list[Document]:
             print("="*50 + "\n")
     return documents
 
-def embed_documents(documents: list[Document], query_collection_name: str) -> None:
+class LeanPayloadQdrantVectorStore(QdrantVectorStore):
+    """
+    QdrantVectorStore that leaves the Categories tree out of the stored node JSON and adds
+    the category bitset. Categories stay in the top-level payload for filtering, but searches
+    don't pull them back.
+    """
+
+    def _build_points(self, nodes, sparse_vector_name):
+        points, ids = super()._build_points(nodes, sparse_vector_name)
+        for point in points:
+            point.payload = ingest_payload(point.payload)
+        return points, ids
+
+def embed_documents(documents: list[Document], query_collection_name: str, snapshot_dir: str = None) -> None:
     """
     Embed the documents using Cohere embeddings with retry logic and batch processing.
+    When snapshot_dir is given, the embedded collection is also exported there for the local search backend.
     """
 
     COHERE_API_KEY = os.getenv('COHERE_API_KEY')
@@ -277,12 +296,6 @@ def embed_documents(documents: list[Document], query_collection_name: str) -> No
     print('Starting embedding')
     start = time.time()
 
-    # Settings for LlamaIndex
-    Settings.embed_model = embed_model
-    Settings.chunk_size = chunk_size
-    Settings.chunk_overlap = chunk_overlap
-    Settings.text_splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
     # Add batch processing
     batch_size = 50  # Adjust this number based on your needs
     max_retries = 5
@@ -294,7 +307,7 @@ def embed_documents(documents: list[Document], query_collection_name: str) -> No
         
         for attempt in range(max_retries):
             try:
-                vector_store = QdrantVectorStore(
+                vector_store = LeanPayloadQdrantVectorStore(
                     query_collection_name, 
                     client=client, 
                     enable_hybrid=True, 
@@ -303,13 +316,21 @@ def embed_documents(documents: list[Document], query_collection_name: str) -> No
                 
                 storage_context = StorageContext.from_defaults(vector_store=vector_store)
 
+                # Pass the embed model explicitly instead of setting the global llama_index Settings
                 index = VectorStoreIndex.from_documents(
                     batch,
                     storage_context=storage_context,
+                    embed_model=embed_model,
                     transformations=[SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)]
                 )
                 
                 print(f"Successfully processed batch {i//batch_size + 1}")
+
+                # The first batch creates the collection; index the filter fields right away
+                # so the remaining points are indexed as they are inserted
+                if i == 0:
+                    created = create_payload_indexes(client, query_collection_name)
+                    print(f"Created {created} payload indexes")
                 break  # Success, move to next batch
                 
             except Exception as e:
@@ -325,6 +346,13 @@ def embed_documents(documents: list[Document], query_collection_name: str) -> No
                     print(f"Unexpected error: {str(e)}")
                     raise
 
+    # Stamp a new epoch so search results cached against the old collection are invalidated
+    epoch = write_collection_epoch(client, query_collection_name)
+    print(f"Collection {query_collection_name} stamped with epoch {epoch}")
+
+    if snapshot_dir:
+        save_vector_snapshot(client, query_collection_name, snapshot_dir, vector_name=DENSE_VECTOR_NAME)
+
 def save_documents(documents: list[Document], save_dir: str) -> None:
     """
     Save documents to a specified directory with timestamp.
@@ -423,7 +451,7 @@ def main():
             print("\nStarting embedding process...")
             embedding_start = time.time()
             try:
-                embed_documents(documents, query_collection_name)
+                embed_documents(documents, query_collection_name, snapshot_dir=save_dir)
                 embedding_time = time.time() - embedding_start
                 print("Successfully completed embedding process!")
             except Exception as e:
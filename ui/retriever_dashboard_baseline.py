@@ -1,14 +1,24 @@
 import streamlit as st
-from agent.retrievers.retriever_baseline import retrieve_subsidies
+from agent.retrievers.retriever_baseline import retrieve_subsidies_fan_out
 from agent.tools.subsidy_report_parameters import REGIONS
 from agent.tools.tool_query_subsidies import CategorieSelectie
+from agent.retrievers.tracing import init_tracing
 import traceback
 import logging
 
+# Registers once per process; Streamlit reruns of this script find it done
+init_tracing()
+
 # Set up logging at the top of your file
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# (collection_name, embed_model) pairs compared side by side; add a pair to compare another embedder
+COMPARISON_CONFIGURATIONS = [
+    ("vindsub_subsidies_2024_v1_cohere", "cohere"),
+    ("vindsub_subsidies_2024_v1_openai", "openai"),
+]
+
 def display_node(node):
     """Helper function to display a single node's information"""
     metadata = node.node.metadata
@@ -409,37 +419,29 @@ def main():
                             formatted_categories[main_category] = subcategories if subcategories else None
 
                     logger.debug(f"Formatted categories:\n\n{formatted_categories}")                   
-                    # Retrieve both sets of results
-                    results, nodes_embed = retrieve_subsidies(
+                    # Retrieve all result sets concurrently
+                    result_sets = retrieve_subsidies_fan_out(
                         user_input,
+                        COMPARISON_CONFIGURATIONS,
                         include_national=include_national,
                         regions=selected_regions,
                         categories=formatted_categories,
                         status=selected_status
                     )
                     
-                    results2, nodes_embed2 = retrieve_subsidies(
-                        user_input,
-                        include_national=include_national,
-                        regions=selected_regions,
-                        categories=formatted_categories,
-                        status=selected_status,
-                        collection_name="vindsub_subsidies_2024_v1_openai",
-                        embed_model="openai"
-                    )
-                    
-                    # Create two columns for side-by-side comparison
-                    col_left, col_right = st.columns(2)
+                    # Create one column per result set for side-by-side comparison
+                    columns = st.columns(len(result_sets))
                     
-                    with col_left:
-                        st.subheader(f"🎯 Resultaten Set 1: Top {len(results)}")
-                        for node in results:
-                            display_node(node)
-                            
-                    with col_right:
-                        st.subheader(f"🎯 Resultaten Set 2: Top {len(results2)}")
-                        for node in results2:
-                            display_node(node)
+                    for set_number, (column, result_set) in enumerate(zip(columns, result_sets), start=1):
+                        with column:
+                            st.subheader(f"🎯 Resultaten Set {set_number}: Top {len(result_set.nodes_reranked)}")
+                            st.caption(f"{result_set.embed_model} · {result_set.metadata['elapsed_ms']:.0f} ms")
+                            if result_set.metadata.get("unreranked"):
+                                st.warning("Herrangschikking duurde te lang; resultaten staan in volgorde van vectorovereenkomst.")
+                            elif result_set.metadata.get("degraded"):
+                                st.warning(f"Zoeken duurde te lang ({', '.join(result_set.metadata['timeouts'])}).")
+                            for node in result_set.nodes_reranked:
+                                display_node(node)
                         
                 except Exception as e:
                     error_msg = f"Error: {str(e)}\n{traceback.format_exc()}"
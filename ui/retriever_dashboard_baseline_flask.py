@@ -1,6 +1,9 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from agent.retrievers.retriever_baseline import retrieve_subsidies
+from agent.retrievers.metrics import get_metrics_registry
+from agent.retrievers.tracing import init_tracing
 
+init_tracing()
 app = Flask(__name__)
 
 # Create templates directory at src/ui/templates/
@@ -17,8 +20,9 @@ def search():
         if not user_input:
             return jsonify({'error': 'Voer eerst een zoekopdracht in.'}), 400
 
-        # Retrieve results
-        results = retrieve_subsidies(user_input)
+        # Retrieve results (the process-wide engine is reused across requests)
+        result = retrieve_subsidies(user_input)
+        results, _ = result
         
         # Process results for display
         processed_results = []
@@ -39,14 +43,22 @@ def search():
                 'indienprocedure': metadata.get('Indienprocedure', 'N/A')
             })
         
+        # A search that ran out of time is shown with a warning instead of as a complete answer
         return jsonify({
             'results': processed_results,
-            'count': len(processed_results)
+            'count': len(processed_results),
+            'degraded': result.metadata.get('degraded', False),
+            'timeouts': result.metadata.get('timeouts', [])
         })
 
     except Exception as e:
         return jsonify({'error': f'Er is een fout opgetreden: {str(e)}'}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Per-stage retrieval metrics for a Prometheus scraper
+    return Response(get_metrics_registry().to_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     # Create the templates directory
     import os
@@ -138,6 +150,9 @@ if __name__ == '__main__':
                 
                 if (response.ok) {
                     resultsCount.innerHTML = `<h3>🎯 Gevonden resultaten: ${data.count}</h3>`;
+                    if (data.degraded) {
+                        resultsCount.innerHTML += `<div class="alert alert-warning">De zoekopdracht duurde te lang; deze resultaten zijn mogelijk onvolledig of niet optimaal gesorteerd.</div>`;
+                    }
                     
                     data.results.forEach(result => {
                         const resultHtml = `